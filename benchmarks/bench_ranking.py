@@ -0,0 +1,83 @@
+"""
+Micro-benchmark for the stage 2 ranking parser and aggregator.
+
+Runs fully offline:
+
+    python benchmarks/bench_ranking.py --review-kb 8 --reviewers 4 16 64
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.council import calculate_aggregate_rankings, parse_ranking_from_text  # noqa: E402
+
+FILLER = (
+    "Ответ {label} предоставляет хорошие детали, но в том, что касается примеров, "
+    "ответ в целом слабее. Response {label} covers the basics but misses edge cases. "
+)
+
+
+def make_review(labels, size_kb, russian=True, rng=random):
+    """Build a review of roughly size_kb kilobytes ending with a ranking section."""
+    body = []
+    while sum(len(part) for part in body) < size_kb * 1024:
+        body.append(FILLER.format(label=rng.choice(labels)))
+    order = labels[:]
+    rng.shuffle(order)
+    header = "ФИНАЛЬНЫЙ РЕЙТИНГ:" if russian else "FINAL RANKING:"
+    word = "Ответ" if russian else "Response"
+    ranking = "\n".join(f"{i}. {word} {label}" for i, label in enumerate(order, start=1))
+    return "".join(body) + "\n\n" + header + "\n" + ranking
+
+
+def bench_parser(size_kb, repeat):
+    labels = [chr(65 + i) for i in range(4)]
+    rng = random.Random(1)
+    reviews = [make_review(labels, size_kb, russian=i % 2 == 0, rng=rng) for i in range(32)]
+
+    def run():
+        for review in reviews:
+            parse_ranking_from_text(review)
+
+    best = min(timeit.repeat(run, number=1, repeat=repeat)) / len(reviews)
+    print(f"parse_ranking_from_text  {size_kb:>4} KB review: {best * 1e6:9.1f} us/review")
+
+
+def bench_aggregate(reviewers, repeat):
+    labels = [chr(65 + i) for i in range(min(reviewers, 26))]
+    label_to_model = {f"Response {label}": f"vendor/model-{label}" for label in labels}
+    rng = random.Random(2)
+    stage2_results = []
+    for _ in range(reviewers):
+        order = [f"Response {label}" for label in labels]
+        rng.shuffle(order)
+        stage2_results.append({"ranking": "", "parsed_ranking": order})
+
+    best = min(timeit.repeat(
+        lambda: calculate_aggregate_rankings(stage2_results, label_to_model),
+        number=1,
+        repeat=repeat
+    ))
+    print(f"calculate_aggregate_rankings {reviewers:>4} reviewers x {len(labels):>2} answers: {best * 1e3:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--review-kb", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--reviewers", type=int, nargs="+", default=[4, 16, 64, 256])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for size_kb in args.review_kb:
+        bench_parser(size_kb, args.repeat)
+    for reviewers in args.reviewers:
+        bench_aggregate(reviewers, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
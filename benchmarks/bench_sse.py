@@ -0,0 +1,91 @@
+"""
+Benchmark for the SSE transport: many concurrent council streams in one process.
+
+Runs fully offline; every stream gets token deltas of several models at a fixed rate:
+
+    python benchmarks/bench_sse.py --streams 1000 3000 --events 200 --rate 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.sse import numbered, sse_stats, sse_stream  # noqa: E402
+
+
+async def council_events(count, rate, models=4):
+    """Token deltas of `models` answers interleaved, with a complete answer every 50 events."""
+    for i in range(count):
+        await asyncio.sleep(1 / rate)
+        model = f"model-{i % models}"
+        if i % 50 == 49:
+            yield {"stage": "stage1", "model": model, "response": "ответ " * 200}
+        else:
+            yield {"stage": "stage1", "type": "delta", "model": model, "delta": "токен "}
+
+
+async def per_event(events):
+    """The previous framing: one json.dumps and one write per event."""
+    event_id = 0
+    async for event in events:
+        event_id += 1
+        yield f"id: {event_id}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+
+
+def asgi_send(sink, stats, layers=3):
+    """An ASGI send behind `layers` middleware send wrappers, ending in one write syscall."""
+    async def write(message):
+        os.write(sink, message["body"])
+        stats["writes"] += 1
+        stats["bytes"] += len(message["body"])
+
+    send = write
+    for _ in range(layers):
+        async def wrapper(message, inner=send):
+            await inner(message)
+        send = wrapper
+    return send
+
+
+async def client(chunks, send):
+    async for chunk in chunks:
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+
+async def bench(name, transport, streams, events, rate):
+    stats = {"writes": 0, "bytes": 0}
+    sink = os.open(os.devnull, os.O_WRONLY)
+    start = time.perf_counter()
+    send = asgi_send(sink, stats)
+    await asyncio.gather(*(client(transport(council_events(events, rate)), send) for _ in range(streams)))
+    elapsed = time.perf_counter() - start
+    os.close(sink)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{name:<10} {streams:>5} streams: {elapsed:6.2f} s (ideal {events / rate:.2f} s), "
+        f"{stats['writes'] / streams:6.1f} writes/stream, {stats['bytes'] / streams / 1024:7.1f} KB/stream, "
+        f"peak RSS {rss:6.0f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--streams", type=int, nargs="+", default=[1000, 3000])
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=200, help="events per second of each stream")
+    args = parser.parse_args()
+
+    print(f"encoder: {sse_stats()['encoder']}")
+    for streams in args.streams:
+        asyncio.run(bench("per-event", per_event, streams, args.events, args.rate))
+        asyncio.run(bench("sse", lambda events: sse_stream(numbered(events)), streams, args.events, args.rate))
+
+
+if __name__ == "__main__":
+    main()
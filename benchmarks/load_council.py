@@ -0,0 +1,216 @@
+"""
+Load generator for /council and /council/stream.
+
+By default starts benchmarks/mock_polzaai.py and the backend (uvicorn main:app)
+on free local ports, with the backend pointed at the mock, so it runs fully
+offline. Requests are sent open-loop at the target rate and the report shows
+p50/p95/p99 of end-to-end latency, time to first event, time per stage, and
+the backend's peak RSS:
+
+    python benchmarks/load_council.py --rps 5 --duration 30 --mode both
+    python benchmarks/load_council.py --rps 20 --workers 4 --mode stream
+    python benchmarks/load_council.py --backend-url http://127.0.0.1:8000 --mode stream
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+STAGES = ("stage1", "stage2", "stage3")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Peak resident set size of a process in MB (Linux /proc), or None if unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} did not come up in {timeout:.0f}s")
+                await asyncio.sleep(0.2)
+
+
+async def run_blocking(client: httpx.AsyncClient, url: str, query: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    response = await client.post(f"{url}/council", json={"query": query, "include_timings": True})
+    result: Dict[str, Any] = {"status": response.status_code, "e2e": time.perf_counter() - start}
+    if response.status_code == 200:
+        timings = response.json().get("timings") or {}
+        result["stages"] = timings.get("stages", {})
+    return result
+
+
+async def run_stream(client: httpx.AsyncClient, url: str, query: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    result: Dict[str, Any] = {"stages": {}}
+    stage_started: Dict[str, float] = {}
+    async with client.stream("POST", f"{url}/council/stream", json={"query": query}) as response:
+        result["status"] = response.status_code
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            now = time.perf_counter()
+            result.setdefault("first_event", now - start)
+            event = json.loads(line[5:])
+            stage, status = event.get("stage"), event.get("status")
+            if status == "started":
+                stage_started[stage] = now
+            elif status == "completed" and stage in stage_started:
+                result["stages"][stage] = now - stage_started[stage]
+            elif stage == "error":
+                result["status"] = f"error:{status}"
+    result["e2e"] = time.perf_counter() - start
+    return result
+
+
+async def drive(url: str, mode: str, rps: float, duration: float, unique: bool) -> List[Dict[str, Any]]:
+    """Send requests at `rps` (Poisson arrivals) for `duration` seconds and collect results."""
+    run = run_stream if mode == "stream" else run_blocking
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    results: List[Dict[str, Any]] = []
+
+    async with httpx.AsyncClient(timeout=600, limits=limits) as client:
+        async def one(i: int) -> None:
+            query = f"Вопрос для нагрузочного теста #{i if unique else 0}"
+            try:
+                results.append(await run(client, url, query))
+            except Exception as e:
+                results.append({"status": f"exception:{type(e).__name__}"})
+
+        tasks = []
+        end = time.perf_counter() + duration
+        i = 0
+        while time.perf_counter() < end:
+            tasks.append(asyncio.create_task(one(i)))
+            i += 1
+            await asyncio.sleep(random.expovariate(rps))
+        await asyncio.gather(*tasks)
+    return results
+
+
+def report(mode: str, results: List[Dict[str, Any]], wall: float) -> None:
+    ok = [r for r in results if r.get("status") == 200]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r.get("status"))] = statuses.get(str(r.get("status")), 0) + 1
+
+    print(f"\n== {mode}: {len(results)} requests, {len(ok) / wall:.2f} ok/s, statuses {statuses}")
+    rows = [("end-to-end", [r["e2e"] for r in ok])]
+    if mode == "stream":
+        rows.append(("first event", [r["first_event"] for r in ok if "first_event" in r]))
+    for stage in STAGES:
+        rows.append((stage, [r["stages"][stage] for r in ok if stage in r.get("stages", {})]))
+
+    print(f"{'':<12} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8}   (seconds)")
+    for name, values in rows:
+        cells = [percentile(values, pct) for pct in (50, 95, 99)]
+        text = " ".join(f"{c:8.3f}" if c is not None else f"{'-':>8}" for c in cells)
+        print(f"{name:<12} {len(values):>5} {text}")
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    processes: List[subprocess.Popen] = []
+    backend: Optional[subprocess.Popen] = None
+    url = args.backend_url
+
+    try:
+        if url is None:
+            mock_port, backend_port = free_port(), free_port()
+            mock_cmd = [
+                sys.executable, os.path.join(ROOT, "benchmarks", "mock_polzaai.py"),
+                "--port", str(mock_port), "--latency-scale", str(args.latency_scale)
+            ]
+            if args.profile:
+                mock_cmd += ["--profile", args.profile]
+            processes.append(subprocess.Popen(mock_cmd))
+
+            env = {
+                **os.environ,
+                "POLZAAI_API_URL": f"http://127.0.0.1:{mock_port}/api/v1/chat/completions",
+                "POLZAAI_API_KEY": "offline-benchmark",
+                "POLZAAI_HTTP2": "false",
+                "COUNCIL_CACHE_BACKEND": args.cache,
+                "COUNCIL_WORKERS": str(args.workers),
+            }
+            backend = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(backend_port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL
+            )
+            processes.append(backend)
+            url = f"http://127.0.0.1:{backend_port}"
+            await wait_ready(f"http://127.0.0.1:{mock_port}/docs")
+        await wait_ready(f"{url}/")
+
+        modes = ["blocking", "stream"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            start = time.perf_counter()
+            results = await drive(url, mode, args.rps, args.duration, not args.same_query)
+            report(mode, results, time.perf_counter() - start)
+
+        if backend is not None:
+            rss = peak_rss_mb(backend.pid)
+            print(f"\nbackend peak RSS: {rss:.1f} MB" if rss is not None else "\nbackend peak RSS: n/a")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["blocking", "stream", "both"], default="both")
+    parser.add_argument("--rps", type=float, default=2.0, help="Target request rate")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to send requests for")
+    parser.add_argument("--backend-url", help="Use a running backend instead of starting mock + backend")
+    parser.add_argument("--profile", help="Latency/error profile for the mock (see mock_polzaai.py)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply mock latencies")
+    parser.add_argument("--cache", default="none", help="COUNCIL_CACHE_BACKEND of the started backend")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes of the started backend (peak RSS is the supervisor's)")
+    parser.add_argument("--same-query", action="store_true",
+                        help="Send one query repeatedly (exercises cache/coalescing)")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Offline stand-in for the PolzaAI chat-completions endpoint.
+
+Serves POST /api/v1/chat/completions with per-model latency distributions,
+error and 429 rates, and streamed chunks with configurable timing, so the
+backend can be load-tested without network access or API credits:
+
+    python benchmarks/mock_polzaai.py --port 8900 --profile profile.json
+    POLZAAI_API_URL=http://127.0.0.1:8900/api/v1/chat/completions uvicorn main:app
+
+A profile file is a JSON object mapping model identifiers (or "default") to
+overrides of DEFAULT_PROFILE.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Latencies are lognormal: median seconds and sigma of the underlying normal
+DEFAULT_PROFILE = {
+    "latency_median": 1.5,    # whole answer, non-streaming
+    "latency_sigma": 0.4,
+    "ttfb_median": 0.4,       # first streamed chunk
+    "ttfb_sigma": 0.3,
+    "chunk_interval": 0.02,   # seconds between streamed chunks
+    "chunks": 40,             # streamed chunks per answer
+    "error_rate": 0.0,        # share of requests answered with 500
+    "rate_limit_rate": 0.0,   # share of requests answered with 429
+    "retry_after": 1,         # Retry-After of the 429s
+}
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "google/gemini-3-flash-preview": {"latency_median": 1.2, "ttfb_median": 0.3},
+    "anthropic/claude-3.5-haiku": {"latency_median": 1.6, "ttfb_median": 0.5},
+    "openai/gpt-4o-mini": {"latency_median": 1.4, "ttfb_median": 0.4},
+    "x-ai/grok-4-fast": {"latency_median": 1.0, "ttfb_median": 0.3, "latency_sigma": 0.6},
+}
+
+# Multiplies every latency, e.g. 0.1 for quick smoke runs
+LATENCY_SCALE = 1.0
+
+_LABEL_RE = re.compile(r"^Response ([A-Z]):", re.MULTILINE)
+
+app = FastAPI(title="PolzaAI mock")
+
+
+def profile_for(model: str) -> Dict[str, Any]:
+    """Return the effective profile of a model."""
+    return {**DEFAULT_PROFILE, **PROFILES.get("default", {}), **PROFILES.get(model, {})}
+
+
+def _lognormal(median: float, sigma: float) -> float:
+    return random.lognormvariate(0, sigma) * median * LATENCY_SCALE if median > 0 else 0.0
+
+
+def _answer(model: str, prompt: str) -> str:
+    """Plausible answer text; ranking prompts get a well-formed final ranking."""
+    labels = _LABEL_RE.findall(prompt)
+    body = f"Ответ модели {model}. " + "Содержательный текст ответа. " * 30
+    if "ФИНАЛЬНЫЙ РЕЙТИНГ" in prompt and labels:
+        random.shuffle(labels)
+        ranking = "\n".join(f"{i}. Ответ {label}" for i, label in enumerate(labels, start=1))
+        return body + "\n\nФИНАЛЬНЫЙ РЕЙТИНГ:\n" + ranking
+    return body
+
+
+def _usage(prompt: str, answer: str) -> Dict[str, int]:
+    prompt_tokens = len(prompt.encode("utf-8")) // 4
+    completion_tokens = len(answer.encode("utf-8")) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    profile = profile_for(model)
+    prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+
+    roll = random.random()
+    if roll < profile["rate_limit_rate"]:
+        await asyncio.sleep(_lognormal(0.05, 0.2))
+        return JSONResponse(
+            {"error": {"message": "Rate limit exceeded"}},
+            status_code=429,
+            headers={"Retry-After": str(profile["retry_after"])}
+        )
+    if roll < profile["rate_limit_rate"] + profile["error_rate"]:
+        await asyncio.sleep(_lognormal(profile["ttfb_median"], profile["ttfb_sigma"]))
+        return JSONResponse({"error": {"message": "Internal error"}}, status_code=500)
+
+    answer = _answer(model, prompt)
+    usage = _usage(prompt, answer)
+
+    if not body.get("stream"):
+        await asyncio.sleep(_lognormal(profile["latency_median"], profile["latency_sigma"]))
+        return {
+            "id": "mock",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}}],
+            "usage": usage,
+        }
+
+    # Headers go out right away; the first chunk arrives after the TTFB delay
+    ttfb = _lognormal(profile["ttfb_median"], profile["ttfb_sigma"])
+    chunks = max(int(profile["chunks"]), 1)
+    size = -(-len(answer) // chunks)
+    include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+    async def events():
+        await asyncio.sleep(ttfb)
+        for start in range(0, len(answer), size):
+            chunk = {"choices": [{"index": 0, "delta": {"content": answer[start:start + size]}}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            await asyncio.sleep(profile["chunk_interval"] * LATENCY_SCALE)
+        if include_usage:
+            yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def main():
+    global LATENCY_SCALE
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--profile", help="JSON file with per-model overrides of DEFAULT_PROFILE")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            for model, overrides in json.load(f).items():
+                PROFILES[model] = {**PROFILES.get(model, {}), **overrides}
+    LATENCY_SCALE = args.latency_scale
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Offline stand-in for a Redis server, for SHARED_STATE_BACKEND=redis without one.
+
+Speaks RESP2 and implements the commands the backend's shared state uses
+(strings with NX/PX, sorted sets, lists, expiry, WATCH/MULTI/EXEC), in memory
+in one process:
+
+    python benchmarks/mock_redis.py --port 6390
+    COUNCIL_WORKERS=4 SHARED_STATE_BACKEND=redis SHARED_STATE_REDIS_URL=redis://127.0.0.1:6390/0 \
+        uvicorn main:app --workers 4
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# key -> (bytes, list or {member: score}, expiry in ms since the epoch or None)
+_data: Dict[bytes, Tuple[Any, Optional[float]]] = {}
+
+# Times each key was written or expired, for WATCH
+_versions: Dict[bytes, int] = {}
+
+# Commands that change the key in their first argument (DEL: in every argument)
+_WRITES = {
+    b"SET", b"DEL", b"PEXPIRE", b"EXPIRE", b"ZADD", b"ZREM", b"ZREMRANGEBYSCORE", b"RPUSH",
+}
+
+WRONGTYPE = ValueError("WRONGTYPE Operation against a key holding the wrong kind of value")
+
+
+def _now_ms() -> float:
+    return time.time() * 1000
+
+
+def _lookup(key: bytes, kind: type) -> Any:
+    entry = _data.get(key)
+    if entry is None:
+        return None
+    value, expires = entry
+    if expires is not None and expires <= _now_ms():
+        del _data[key]
+        _versions[key] = _versions.get(key, 0) + 1
+        return None
+    if not isinstance(value, kind):
+        raise WRONGTYPE
+    return value
+
+
+def _score(raw: bytes) -> Tuple[float, bool]:
+    """Parse a ZREMRANGEBYSCORE bound: (value, exclusive)."""
+    text = raw.decode()
+    exclusive = text.startswith("(")
+    text = text.lstrip("(")
+    return float(text.replace("+inf", "inf")), exclusive
+
+
+def _range(items: List[Any], start: int, stop: int) -> List[Any]:
+    """Slice with Redis semantics: inclusive stop, negative indexes from the end."""
+    size = len(items)
+    start = max(start + size if start < 0 else start, 0)
+    stop = stop + size if stop < 0 else min(stop, size - 1)
+    return items[start:stop + 1]
+
+
+def _format_score(score: float) -> bytes:
+    if score == float("inf"):
+        return b"inf"
+    if score == float("-inf"):
+        return b"-inf"
+    return repr(score).encode()
+
+
+def execute(args: List[bytes]) -> Any:
+    """Run one command; returns the reply (bytes, int, list, None, or an Exception for errors)."""
+    command = args[0].upper()
+    if command in _WRITES:
+        for key in args[1:] if command == b"DEL" else args[1:2]:
+            _versions[key] = _versions.get(key, 0) + 1
+    if command == b"PING":
+        return "PONG"
+    if command in (b"CLIENT", b"SELECT", b"FLUSHDB"):
+        if command == b"FLUSHDB":
+            for key in _data:
+                _versions[key] = _versions.get(key, 0) + 1
+            _data.clear()
+        return "OK"
+    if command == b"ECHO":
+        return args[1]
+    if command == b"DBSIZE":
+        return len(_data)
+
+    if command == b"GET":
+        return _lookup(args[1], bytes)
+    if command == b"SET":
+        key, value = args[1], args[2]
+        expires = None
+        only_new = False
+        options = [arg.upper() for arg in args[3:]]
+        for i, option in enumerate(options):
+            if option == b"NX":
+                only_new = True
+            elif option == b"PX":
+                expires = _now_ms() + int(args[3 + i + 1])
+            elif option == b"EX":
+                expires = _now_ms() + int(args[3 + i + 1]) * 1000
+        if only_new and _lookup(key, object) is not None:
+            return None
+        _data[key] = (value, expires)
+        return "OK"
+    if command == b"DEL":
+        return sum(1 for key in args[1:] if _lookup(key, object) is not None and _data.pop(key, None))
+    if command == b"EXISTS":
+        return sum(1 for key in args[1:] if _lookup(key, object) is not None)
+    if command in (b"PEXPIRE", b"EXPIRE"):
+        if _lookup(args[1], object) is None:
+            return 0
+        milliseconds = int(args[2]) * (1 if command == b"PEXPIRE" else 1000)
+        _data[args[1]] = (_data[args[1]][0], _now_ms() + milliseconds)
+        return 1
+
+    if command == b"ZADD":
+        members = _lookup(args[1], dict)
+        if members is None:
+            members = {}
+            _data[args[1]] = (members, None)
+        options = args[2:]
+        only_existing = bool(options) and options[0].upper() == b"XX"
+        if only_existing:
+            options = options[1:]
+        added = 0
+        for score, member in zip(options[::2], options[1::2]):
+            if only_existing and member not in members:
+                continue
+            added += member not in members
+            members[member] = float(score)
+        return added
+    if command == b"ZREM":
+        members = _lookup(args[1], dict) or {}
+        return sum(1 for member in args[2:] if members.pop(member, None) is not None)
+    if command == b"ZCARD":
+        return len(_lookup(args[1], dict) or {})
+    if command == b"ZREMRANGEBYSCORE":
+        members = _lookup(args[1], dict) or {}
+        (low, low_open), (high, high_open) = _score(args[2]), _score(args[3])
+        removed = [
+            member for member, score in members.items()
+            if (score > low if low_open else score >= low) and (score < high if high_open else score <= high)
+        ]
+        for member in removed:
+            del members[member]
+        return len(removed)
+    if command == b"ZRANGE":
+        members = _lookup(args[1], dict) or {}
+        ordered = sorted(members.items(), key=lambda item: (item[1], item[0]))
+        selected = _range(ordered, int(args[2]), int(args[3]))
+        if b"WITHSCORES" in [arg.upper() for arg in args[4:]]:
+            return [part for member, score in selected for part in (member, _format_score(score))]
+        return [member for member, _ in selected]
+
+    if command == b"RPUSH":
+        items = _lookup(args[1], list)
+        if items is None:
+            items = []
+            _data[args[1]] = (items, None)
+        items.extend(args[2:])
+        return len(items)
+    if command == b"LRANGE":
+        return _range(_lookup(args[1], list) or [], int(args[2]), int(args[3]))
+
+    return ValueError(f"ERR unknown command '{command.decode()}'")
+
+
+def encode(reply: Any) -> bytes:
+    if isinstance(reply, Exception):
+        return b"-" + str(reply).encode() + b"\r\n"
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, str):
+        return b"+" + reply.encode() + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(encode(item) for item in reply)
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, e.g. from telnet
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+def _execute_safely(args: List[bytes]) -> Any:
+    try:
+        return execute(args)
+    except (ValueError, IndexError) as e:
+        return e if str(e).startswith(("ERR", "WRONGTYPE")) else ValueError(f"ERR {e}")
+
+
+async def serve_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # Per connection: versions of the WATCHed keys, and the commands queued after MULTI
+    watched: Dict[bytes, int] = {}
+    queued: Optional[List[List[bytes]]] = None
+    try:
+        while True:
+            args = await read_command(reader)
+            if args is None:
+                break
+            if not args:
+                continue
+            command = args[0].upper()
+            if command == b"WATCH":
+                for key in args[1:]:
+                    _lookup(key, object)  # an expired key counts as changed from here on
+                    watched[key] = _versions.get(key, 0)
+                reply: Any = "OK"
+            elif command == b"UNWATCH":
+                watched.clear()
+                reply = "OK"
+            elif command == b"MULTI":
+                queued = []
+                reply = "OK"
+            elif command == b"DISCARD":
+                queued = None
+                watched.clear()
+                reply = "OK"
+            elif command == b"EXEC":
+                if queued is None:
+                    reply = ValueError("ERR EXEC without MULTI")
+                else:
+                    for key in watched:
+                        _lookup(key, object)
+                    changed = any(_versions.get(key, 0) != version for key, version in watched.items())
+                    # Runs without awaiting, so nothing else interleaves
+                    reply = None if changed else [_execute_safely(queued_args) for queued_args in queued]
+                    queued = None
+                    watched.clear()
+            elif queued is not None:
+                queued.append(args)
+                reply = "QUEUED"
+            else:
+                reply = _execute_safely(args)
+            writer.write(encode(reply))
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main_async(host: str, port: int) -> None:
+    server = await asyncio.start_server(serve_client, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional
+from contextlib import asynccontextmanager
 import asyncio
+import logging
+import math
+import re
 import sys
 import os
-import json
 from dotenv import load_dotenv
 
 # Load environment variables from .env files
@@ -14,19 +17,68 @@ load_dotenv('.env.local')
 load_dotenv('.env')
 load_dotenv('services/.env')
 
-# Log API key availability for debugging
+# Add the current directory to the path so we can import council module
+sys.path.append(os.path.dirname(__file__))
+
+# Logs and traces go through a queue to a background thread (services.tracing)
+from services.tracing import bind_run, setup_logging, stop_logging
+setup_logging()
+logger = logging.getLogger("main")
+
+# Log API key availability for debugging (never the key itself)
 POLZAAI_API_KEY = os.getenv("POLZAAI_API_KEY")
 if POLZAAI_API_KEY:
-    print(f"POLZAAI_API_KEY loaded successfully: {POLZAAI_API_KEY[:10]}...")
+    logger.info("POLZAAI_API_KEY loaded")
 else:
-    print("WARNING: POLZAAI_API_KEY not found in environment variables")
-
-# Add the current directory to the path so we can import council module
-sys.path.append(os.path.dirname(__file__))
+    logger.warning("POLZAAI_API_KEY not found in environment variables")
 
 from services.council import run_full_council, format_for_frontend, run_full_council_stream
+from services.polzaai import start_client, close_client, probe_model
+from services.cache import cache_stats
+from services.config import (
+    COUNCIL_COALESCE,
+    CLIENT_DISCONNECT_POLL_INTERVAL,
+    SEMANTIC_CACHE_MODE,
+    COUNCIL_BATCH_MAX_QUERIES,
+    COUNCIL_BATCH_CONCURRENCY,
+)
+from services.singleflight import InFlightRun, coalesced_stream, run_key, is_in_flight
+from services.ratelimit import UpstreamOverloaded, check_admission, limiter_stats
+from services.metrics import CLIENT_DISCONNECTS, CallbackGauge, render_metrics
+from services.jobs import get_runner, start_jobs, stop_jobs
+from services.batch import run_batch
+from services.health import admission_models, health_stats, start_probes, stop_probes
+from services.review import REVIEW_STRATEGIES
+from services.semantic_cache import find_near_duplicate, get_semantic_cache, semantic_cache_stats
+from services.conversations import close_conversations, get_conversation_store
+from services.sse import dumps, numbered, sse_stats, sse_stream
+from services.shared import close_shared_state
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open one pooled PolzaAI client for the whole app and close it on shutdown
+    await start_client()
+    await start_jobs()
+    await start_probes(probe_model)
+    # Map the near-duplicate index and rebuild its LSH bands before the first request
+    await asyncio.to_thread(get_semantic_cache)
+    try:
+        yield
+    finally:
+        await stop_probes()
+        await stop_jobs()
+        await close_conversations()
+        await close_shared_state()
+        await close_client()
+        stop_logging()
 
-app = FastAPI(title="LLM Council API", description="API for running LLM council deliberations")
+
+app = FastAPI(
+    title="LLM Council API",
+    description="API for running LLM council deliberations",
+    lifespan=lifespan
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -34,52 +86,312 @@ app.add_middleware(
     allow_origins=["https://sovet.creomatica.ru"],  # Production CORS настройки
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],  # Разрешить указанные методы
-    allow_headers=["Content-Type", "Authorization"],  # Разрешить указанные заголовки
+    allow_headers=["Content-Type", "Authorization", "Last-Event-ID", "X-Run-ID"],  # Разрешить указанные заголовки
+    expose_headers=["X-Run-ID"],
 )
 
+# Run ids accepted from clients; anything else gets a fresh id
+RUN_ID_RE = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+
+
+class RunIdMiddleware:
+    """
+    Bind every request to a run id for its logs and trace (see services.tracing).
+
+    The id comes from the X-Run-ID request header if it is well-formed, so a
+    client or proxy can correlate its own logs, and is echoed in the X-Run-ID
+    response header.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = dict(scope["headers"]).get(b"x-run-id", b"").decode("latin-1")
+        run_id = bind_run(requested if RUN_ID_RE.fullmatch(requested) else None)
+
+        async def send_with_run_id(message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-run-id", run_id.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_with_run_id)
+
+
+app.add_middleware(RunIdMiddleware)
+
 class CouncilRequest(BaseModel):
     query: str
+    # Stages that may be served from the response cache (None = all, [] = bypass cache)
+    cache_stages: Optional[List[str]] = None
+    # Add per-stage and per-call timings to the /council response
+    include_timings: bool = False
+    # Stage 2 review strategy: all, judge, sample or tournament (None = REVIEW_STRATEGY)
+    review_strategy: Optional[str] = None
+    # Conversation this question continues (from POST /conversations); None = one-shot
+    conversation_id: Optional[str] = None
+
+class CouncilBatchRequest(BaseModel):
+    queries: List[str]
+    cache_stages: Optional[List[str]] = None
+    # Council runs in parallel for this batch (capped by COUNCIL_BATCH_CONCURRENCY)
+    concurrency: Optional[int] = None
+    review_strategy: Optional[str] = None
 
 class CouncilResponse(BaseModel):
     opinions: List[Dict[str, str]]
     reviews: List[Dict[str, str]]
     consensus: str
+    timings: Optional[Dict[str, Any]] = None
+    # Set when the result was served from a near-duplicate past query
+    near_duplicate: Optional[Dict[str, Any]] = None
+
+# Cache and admission counters, read at scrape time
+CallbackGauge(
+    "council_cache_stats",
+    "Council response cache counters (size, hits, misses, evictions, sets).",
+    ("counter",),
+    lambda: {
+        (name,): value for name, value in cache_stats().items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+)
+CallbackGauge(
+    "council_admission_requests",
+    "Upstream admission limiter counters (active, waiting, admitted, rejected).",
+    ("limiter", "counter"),
+    lambda: {
+        (limiter, name): value
+        for limiter, stats in limiter_stats().items()
+        for name, value in stats.items()
+    }
+)
+
+# Open SSE streams (/council/stream and job event streams)
+CallbackGauge(
+    "council_sse_streams",
+    "Open Server-Sent Events streams.",
+    (),
+    lambda: {(): sse_stats()["active_streams"]}
+)
+
+# Breaker state (0 closed, 1 half-open, 2 open), EWMA latency and error rate per model
+_BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+CallbackGauge(
+    "council_model_health",
+    "Model health: breaker state (0 closed, 1 half-open, 2 open), EWMA latency and error rate.",
+    ("model", "field"),
+    lambda: {
+        key: value
+        for model, health in health_stats().items()
+        for key, value in (
+            ((model, "state"), _BREAKER_STATES[health["state"]]),
+            ((model, "latency"), health["latency"]),
+            ((model, "error_rate"), health["error_rate"]),
+        )
+        if value is not None
+    }
+)
+
+def check_review_strategy(review_strategy: Optional[str]) -> None:
+    if review_strategy is not None and review_strategy not in REVIEW_STRATEGIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown review_strategy: {review_strategy} (expected one of {', '.join(REVIEW_STRATEGIES)})"
+        )
+
+async def check_conversation(conversation_id: Optional[str]) -> None:
+    if conversation_id is not None and await get_conversation_store().get(conversation_id, with_turns=False) is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+def overloaded_error(e: UpstreamOverloaded) -> HTTPException:
+    """503 with Retry-After for requests the upstream admission control rejected."""
+    return HTTPException(
+        status_code=503,
+        detail=f"Council is overloaded, please retry later: {str(e)}",
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
+async def wait_disconnected(http_request: Request) -> None:
+    """Return once the HTTP client has gone away."""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(CLIENT_DISCONNECT_POLL_INTERVAL)
+
+async def until_disconnected(
+    events: AsyncIterator[Dict[str, Any]],
+    http_request: Request,
+    endpoint: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Relay events until the client disconnects, then stop following the run.
+
+    `events` must be a run subscription (InFlightRun.subscribe, coalesced_stream
+    or run_batch): leaving it cancels the run once nobody else follows it, and
+    with it every outstanding upstream request.
+    """
+    disconnect = asyncio.create_task(wait_disconnected(http_request))
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(events.__anext__())
+            done, _ = await asyncio.wait({pending, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if pending not in done:
+                CLIENT_DISCONNECTS.inc(endpoint=endpoint)
+                logger.info("Client disconnected from %s, leaving the council run", endpoint)
+                return
+            try:
+                event = pending.result()
+            except StopAsyncIteration:
+                return
+            pending = None
+            yield event
+    except (asyncio.CancelledError, GeneratorExit):
+        # The server noticed the disconnect first and is tearing the response down
+        CLIENT_DISCONNECTS.inc(endpoint=endpoint)
+        raise
+    finally:
+        disconnect.cancel()
+        if pending is not None and not pending.done():
+            pending.cancel()
+        await asyncio.gather(disconnect, *([pending] if pending else []), return_exceptions=True)
+        # Leaving the subscription is what cancels the run
+        await events.aclose()
 
 @app.get("/")
 async def root():
     return {"message": "LLM Council API is running!"}
 
-@app.post("/council", response_model=CouncilResponse)
+@app.get("/council/cache/stats")
+async def council_cache_stats():
+    """Hit/miss/eviction counters of the council response cache and the near-duplicate index."""
+    return {**cache_stats(), "semantic": semantic_cache_stats()}
+
+@app.get("/council/health")
+async def council_health():
+    """Circuit breaker state, EWMA latency and error rate of every council and standby model."""
+    return health_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus metrics: upstream latency/TTFB/status/tokens, stage durations, cache and admission.
+
+    Metrics are per worker process; with COUNCIL_WORKERS > 1 every sample has a
+    'worker' label (the pid) and a scrape shows the worker that served it.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/council", response_model=CouncilResponse, response_model_exclude_none=True)
 async def council_deliberation(request: CouncilRequest):
+    check_review_strategy(request.review_strategy)
+    await check_conversation(request.conversation_id)
     try:
+        if SEMANTIC_CACHE_MODE == "serve" and request.conversation_id is None:
+            # A paraphrase of a question the council already answered
+            match = await find_near_duplicate(request.query, request.cache_stages, request.review_strategy)
+            if match is not None:
+                return {
+                    **match["result"],
+                    "near_duplicate": {key: value for key, value in match.items() if key != "result"}
+                }
+
+        # Refuse up front instead of dropping council members when upstream is saturated
+        check_admission(admission_models())
+
         # Run the full council process
-        stage1_results, stage2_results, stage3_result, metadata = await run_full_council(request.query)
+        stage1_results, stage2_results, stage3_result, metadata = await run_full_council(
+            request.query,
+            cache_stages=request.cache_stages,
+            review_strategy=request.review_strategy,
+            conversation_id=request.conversation_id
+        )
         
         # Format the results for frontend
         formatted_results = format_for_frontend(stage1_results, stage2_results, stage3_result)
+        if request.include_timings:
+            formatted_results["timings"] = metadata.get("timings")
         
         return formatted_results
+    except UpstreamOverloaded as e:
+        raise overloaded_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error running council deliberation: {str(e)}")
 
 @app.post("/council/stream")
-async def council_deliberation_stream(request: CouncilRequest):
+async def council_deliberation_stream(request: CouncilRequest, http_request: Request):
     """
     Streaming version of council deliberation.
     Returns events as they become available via Server-Sent Events.
     """
     query = request.query
+    cache_stages = request.cache_stages
+    review_strategy = request.review_strategy
+    conversation_id = request.conversation_id
+    check_review_strategy(review_strategy)
+    await check_conversation(conversation_id)
+
+    # The stored answer to a paraphrase of this question, streamed first as a preview
+    # (follow-up questions depend on their conversation, so they never match)
+    match = await find_near_duplicate(query, cache_stages, review_strategy) if conversation_id is None else None
+    preview = {"stage": "preview", "status": "near_duplicate", **match} if match else None
+    served = preview is not None and SEMANTIC_CACHE_MODE == "serve"
+
+    # Joining an in-flight run costs no upstream capacity; new runs must be admitted
+    if not served and not (COUNCIL_COALESCE and is_in_flight(run_key(query, cache_stages, review_strategy, conversation_id))):
+        try:
+            check_admission(admission_models())
+        except UpstreamOverloaded as e:
+            raise overloaded_error(e)
     
     async def event_generator():
         try:
+            if preview is not None:
+                yield preview
+                if served:
+                    yield {'stage': 'done', 'status': 'completed'}
+                    return
+
             # Stream events from our council functions
-            async for event in run_full_council_stream(query):
-                # Format as Server-Sent Event
-                yield f"data: {json.dumps(event)}\n\n"
+            if COUNCIL_COALESCE:
+                # Identical concurrent requests subscribe to a single upstream run
+                events = coalesced_stream(
+                    run_key(query, cache_stages, review_strategy, conversation_id),
+                    lambda: run_full_council_stream(
+                        query,
+                        cache_stages=cache_stages,
+                        review_strategy=review_strategy,
+                        conversation_id=conversation_id
+                    )
+                )
+            else:
+                # Driven in its own task so the run can be cancelled as soon as we leave
+                events = InFlightRun(run_full_council_stream(
+                    query,
+                    cache_stages=cache_stages,
+                    review_strategy=review_strategy,
+                    conversation_id=conversation_id
+                )).subscribe()
+
+            # A client that went away cancels the upstream work nobody else is waiting for
+            async for event in until_disconnected(events, http_request, "/council/stream"):
+                yield event
             
             # Send final event to indicate completion
-            yield f"data: {json.dumps({'stage': 'done', 'status': 'completed'})}\n\n"
+            yield {'stage': 'done', 'status': 'completed'}
             
+        except UpstreamOverloaded as e:
+            # Upstream saturated mid-run: tell the client when to retry
+            error_event = {
+                'stage': 'error',
+                'status': 'overloaded',
+                'message': str(e),
+                'retry_after': math.ceil(e.retry_after)
+            }
+            yield error_event
         except Exception as e:
             # Send error event
             error_event = {
@@ -87,19 +399,151 @@ async def council_deliberation_stream(request: CouncilRequest):
                 'status': 'error',
                 'message': str(e)
             }
-            yield f"data: {json.dumps(error_event)}\n\n"
+            yield error_event
     
+    # Framed as Server-Sent Events with ids, heartbeats and a bounded client buffer
     return StreamingResponse(
-        event_generator(),
+        sse_stream(numbered(event_generator())),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # Let nginx flush token deltas immediately
             "Access-Control-Allow-Origin": "https://sovet.creomatica.ru",
             "Access-Control-Allow-Headers": "Cache-Control"
         }
     )
 
+@app.post("/council/batch")
+async def council_batch(request: CouncilBatchRequest, http_request: Request):
+    """
+    Run the council for many queries and stream one NDJSON line per query as it
+    completes, then a summary line. Batch runs yield upstream capacity to
+    interactive requests; disconnecting cancels the runs still in progress.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    if len(request.queries) > COUNCIL_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many queries: {len(request.queries)} > {COUNCIL_BATCH_MAX_QUERIES}"
+        )
+    check_review_strategy(request.review_strategy)
+    concurrency = min(request.concurrency or COUNCIL_BATCH_CONCURRENCY, COUNCIL_BATCH_CONCURRENCY)
+
+    async def line_generator():
+        counts: Dict[str, int] = {}
+        results = run_batch(request.queries, request.cache_stages, concurrency, request.review_strategy)
+        async for item in until_disconnected(results, http_request, "/council/batch"):
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+            yield dumps(item) + b"\n"
+        yield dumps({"done": True, "total": len(request.queries), **counts}) + b"\n"
+
+    return StreamingResponse(
+        line_generator(),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+@app.post("/council/jobs", status_code=202)
+async def create_council_job(request: CouncilRequest):
+    """
+    Start a council run in the background and return its id right away.
+    Follow it with GET /council/jobs/{id}/events or poll GET /council/jobs/{id}.
+    """
+    check_review_strategy(request.review_strategy)
+    await check_conversation(request.conversation_id)
+    try:
+        check_admission(admission_models())
+        job = get_runner().submit(
+            request.query,
+            cache_stages=request.cache_stages,
+            review_strategy=request.review_strategy,
+            conversation_id=request.conversation_id
+        )
+    except UpstreamOverloaded as e:
+        raise overloaded_error(e)
+    return {
+        "id": job.id,
+        "status": job.status,
+        "events_url": f"/council/jobs/{job.id}/events",
+    }
+
+@app.get("/council/jobs/{job_id}")
+async def get_council_job(job_id: str):
+    """Job status, and the result in the /council format once it has completed."""
+    job = await get_runner().lookup(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.summary()
+
+@app.get("/council/jobs/{job_id}/events")
+async def council_job_events(
+    job_id: str,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Server-Sent Events of a job, replayed from the start or resumed after Last-Event-ID
+    (header, as sent by EventSource on reconnect, or ?last_event_id=). Disconnecting
+    doesn't stop the job.
+    """
+    job = await get_runner().lookup(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    resume_from = last_event_id or 0
+    if last_event_id_header and last_event_id_header.strip().isdigit():
+        resume_from = int(last_event_id_header)
+
+    return StreamingResponse(
+        sse_stream(job.follow(resume_from)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+            "Access-Control-Allow-Origin": "https://sovet.creomatica.ru",
+            "Access-Control-Allow-Headers": "Cache-Control, Last-Event-ID"
+        }
+    )
+
+@app.post("/conversations", status_code=201)
+async def create_conversation():
+    """
+    Start a conversation. Pass its id as conversation_id to /council, /council/stream
+    or /council/jobs to ask questions that build on the earlier answers.
+    """
+    return await get_conversation_store().create()
+
+@app.get("/conversations")
+async def list_conversations(
+    limit: int = 50,
+    before: Optional[float] = None,
+    before_id: Optional[str] = None
+):
+    """
+    Conversations, most recently updated first. For the next page, pass the
+    returned next_before and next_before_id as ?before=&before_id=.
+    """
+    limit = max(1, min(limit, 200))
+    cursor = (before, before_id or "") if before is not None else None
+    conversations = await get_conversation_store().list(limit, cursor)
+    last = conversations[-1] if len(conversations) == limit else None
+    return {
+        "conversations": conversations,
+        "next_before": last["updated_at"] if last else None,
+        "next_before_id": last["id"] if last else None,
+    }
+
+@app.get("/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str):
+    """A conversation with its title, summary and every turn in the /council format."""
+    conversation = await get_conversation_store().get(conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
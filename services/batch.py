@@ -0,0 +1,112 @@
+"""Batch council runs: many queries over a bounded number of parallel low-priority runs."""
+
+import asyncio
+import logging
+import math
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .config import COUNCIL_BATCH_CONCURRENCY, COUNCIL_BATCH_RETRIES
+from .council import format_for_frontend, run_full_council
+from .metrics import BATCH_QUERIES
+from .ratelimit import UpstreamOverloaded, use_batch_priority
+from .tracing import bind_run, current_run_id
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_query(
+    index: int,
+    query: str,
+    cache_stages: Optional[List[str]],
+    review_strategy: Optional[str] = None,
+    run_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Run the council for one query of a batch.
+
+    Admission rejections are retried after their Retry-After, since a batch
+    waits for capacity rather than failing fast like interactive requests.
+
+    Returns:
+        Result line: index, query, status, and either 'result' in the /council
+        format with 'timings' or 'error'
+    """
+    item: Dict[str, Any] = {"index": index, "query": query}
+    bind_run(run_id)
+    attempt = 0
+    while True:
+        try:
+            stage1_results, stage2_results, stage3_result, metadata = await run_full_council(
+                query, cache_stages=cache_stages, review_strategy=review_strategy
+            )
+            break
+        except UpstreamOverloaded as e:
+            if attempt >= COUNCIL_BATCH_RETRIES:
+                item.update(status="overloaded", error=str(e), retry_after=math.ceil(e.retry_after))
+                BATCH_QUERIES.inc(status="overloaded")
+                return item
+            attempt += 1
+            await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            logger.warning("Batch query %s failed: %s", index, e)
+            item.update(status="error", error=str(e))
+            BATCH_QUERIES.inc(status="error")
+            return item
+
+    if not stage1_results:
+        item.update(status="error", error=stage3_result.get("response"))
+        BATCH_QUERIES.inc(status="error")
+        return item
+
+    item["status"] = "completed"
+    item["result"] = format_for_frontend(stage1_results, stage2_results, stage3_result)
+    item["timings"] = metadata.get("timings")
+    BATCH_QUERIES.inc(status="completed")
+    return item
+
+
+async def run_batch(
+    queries: List[str],
+    cache_stages: Optional[List[str]] = None,
+    concurrency: int = COUNCIL_BATCH_CONCURRENCY,
+    review_strategy: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the council for every query, at most `concurrency` at a time.
+
+    Upstream requests of the batch go through the shared admission limiters as
+    batch traffic, so they give way to interactive requests. Closing the
+    generator cancels the runs still in progress.
+
+    Args:
+        queries: Questions to run the council for
+        cache_stages: Stages that may be served from cache (None = all, [] = bypass)
+        concurrency: Council runs in parallel
+        review_strategy: Stage 2 review strategy (None = REVIEW_STRATEGY)
+
+    Yields:
+        One result per query in completion order (see _run_query); 'index' is
+        the query's position in `queries`
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    pending = iter(enumerate(queries))
+    # Each query is a run of its own, traced as <batch run id>.<index>
+    batch_run_id = current_run_id() or bind_run()
+
+    async def worker() -> None:
+        # Inherited by the tasks each council run creates
+        use_batch_priority()
+        # Workers share one iterator, so each query is taken exactly once
+        for index, query in pending:
+            results.put_nowait(
+                await _run_query(index, query, cache_stages, review_strategy, f"{batch_run_id}.{index}")
+            )
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(max(concurrency, 1), len(queries)))]
+    try:
+        for _ in range(len(queries)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
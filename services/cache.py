@@ -0,0 +1,325 @@
+"""Per-stage response cache for council runs."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .config import (
+    COUNCIL_CACHE_BACKEND,
+    COUNCIL_CACHE_TTL,
+    COUNCIL_CACHE_MAX_ENTRIES,
+    COUNCIL_CACHE_PATH,
+    COUNCIL_WORKERS,
+)
+from .health import chairman_model, council_members
+from .shared import SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+# Stages whose results can be stored and served from the cache
+CACHE_STAGES = ("stage1", "stage2", "stage3")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(user_query: str) -> str:
+    """
+    Normalize a query so trivially different spellings share a cache entry.
+
+    Args:
+        user_query: The user's question
+
+    Returns:
+        NFKC-normalized, case-folded query with collapsed whitespace
+    """
+    text = unicodedata.normalize("NFKC", user_query).casefold()
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def _digest(*parts: Any) -> str:
+    """Stable SHA-256 hex digest of JSON-serializable parts."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stage_key(
+    stage: str,
+    user_query: str,
+    prompt_templates: List[str],
+    *upstream: Any
+) -> str:
+    """
+    Build the cache key of one stage.
+
+    The key covers the normalized query, the council composition of the current
+    run (which may differ from COUNCIL_MODELS while a breaker is open), the prompt
+    templates and the results of the stages it depends on, so a re-run stage 1
+    never pairs with reviews cached for different answers.
+
+    Args:
+        stage: Stage name ("stage1", "stage2" or "stage3")
+        user_query: The user's question
+        prompt_templates: Prompt templates used by the pipeline
+        *upstream: Results of the earlier stages this stage was computed from
+
+    Returns:
+        Hex cache key
+    """
+    return _digest(
+        stage,
+        normalize_query(user_query),
+        council_members(),
+        chairman_model(),
+        _digest(*prompt_templates),
+        *upstream
+    )
+
+
+class CacheBackend:
+    """Base class for cache backends. Values must be JSON-serializable."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.sets = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return cache counters.
+
+        Returns:
+            Dict with backend name, size, hits, misses, evictions and sets
+        """
+        return {
+            "backend": type(self).__name__,
+            "size": self.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "sets": self.sets,
+        }
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache with per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        self.sets += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(CacheBackend):
+    """On-disk cache in a SQLite file; survives restarts. Queries run in a worker thread."""
+
+    def __init__(self, path: str, max_entries: int, ttl: float) -> None:
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS council_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS council_cache_accessed ON council_cache (accessed_at)"
+        )
+        self._conn.commit()
+        self._lock = asyncio.Lock()
+        # Kept up to date by the worker thread, so size() never touches the connection
+        self._count = self._conn.execute("SELECT COUNT(*) FROM council_cache").fetchone()[0]
+
+    def _get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM council_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = row
+        if expires_at < now:
+            self._conn.execute("DELETE FROM council_cache WHERE key = ?", (key,))
+            self._conn.commit()
+            self._count -= 1
+            self.evictions += 1
+            self.misses += 1
+            return None
+
+        self._conn.execute("UPDATE council_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        self.hits += 1
+        return json.loads(value)
+
+    def _set(self, key: str, value: Any) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO council_cache (key, value, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + self.ttl, now)
+        )
+        self.sets += 1
+
+        # Drop expired rows first, then the least recently used ones over the limit
+        expired = self._conn.execute(
+            "DELETE FROM council_cache WHERE expires_at < ?", (now,)
+        ).rowcount
+        overflow = self._conn.execute(
+            "DELETE FROM council_cache WHERE key IN ("
+            "SELECT key FROM council_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        self._count = self._conn.execute("SELECT COUNT(*) FROM council_cache").fetchone()[0]
+        self._conn.commit()
+        self.evictions += expired + overflow
+
+    async def get(self, key: str) -> Optional[Any]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, value)
+
+    def size(self) -> int:
+        return self._count
+
+
+class SharedCache(CacheBackend):
+    """Cache in the workers' shared state (SHARED_STATE_BACKEND), so a result is computed once for all of them."""
+
+    def __init__(self, shared: SharedState, ttl: float) -> None:
+        super().__init__()
+        self.shared = shared
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.shared.get(f"cache:{key}")
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def set(self, key: str, value: Any) -> None:
+        await self.shared.set(f"cache:{key}", json.dumps(value, ensure_ascii=False), self.ttl)
+        self.sets += 1
+
+    def size(self) -> Optional[int]:
+        # Expiry is left to the backend, which doesn't count entries by prefix
+        return None
+
+
+def _build_cache() -> Optional[CacheBackend]:
+    """
+    Create the configured cache backend.
+
+    Returns:
+        Cache backend, or None when caching is disabled
+    """
+    if COUNCIL_CACHE_BACKEND == "sqlite":
+        return SQLiteCache(COUNCIL_CACHE_PATH, COUNCIL_CACHE_MAX_ENTRIES, COUNCIL_CACHE_TTL)
+    if COUNCIL_CACHE_BACKEND == "shared":
+        shared = get_shared_state()
+        if shared is not None:
+            return SharedCache(shared, COUNCIL_CACHE_TTL)
+        logger.warning("COUNCIL_CACHE_BACKEND=shared without shared state; using a per-worker memory cache")
+        return MemoryCache(COUNCIL_CACHE_MAX_ENTRIES, COUNCIL_CACHE_TTL)
+    if COUNCIL_CACHE_BACKEND == "memory":
+        if COUNCIL_WORKERS > 1:
+            logger.warning("COUNCIL_CACHE_BACKEND=memory with %d workers: each worker caches on its own", COUNCIL_WORKERS)
+        return MemoryCache(COUNCIL_CACHE_MAX_ENTRIES, COUNCIL_CACHE_TTL)
+    return None
+
+
+_cache: Optional[CacheBackend] = None
+_cache_built = False
+
+
+def get_cache() -> Optional[CacheBackend]:
+    """
+    Return the process-wide cache backend, creating it on first use.
+
+    Returns:
+        Cache backend, or None when COUNCIL_CACHE_BACKEND is "none"
+    """
+    global _cache, _cache_built
+    if not _cache_built:
+        _cache = _build_cache()
+        _cache_built = True
+    return _cache
+
+
+def set_cache(cache: Optional[CacheBackend]) -> None:
+    """
+    Replace the process-wide cache backend.
+
+    Args:
+        cache: Backend to use from now on, or None to disable caching
+    """
+    global _cache, _cache_built
+    _cache = cache
+    _cache_built = True
+
+
+def cache_stats() -> Dict[str, Any]:
+    """
+    Return counters of the active cache backend.
+
+    Returns:
+        Dict with cache counters, or {'backend': None} when disabled
+    """
+    cache = get_cache()
+    if cache is None:
+        return {"backend": None}
+    return cache.stats()
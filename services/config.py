@@ -21,6 +21,241 @@ COUNCIL_MODELS = [
 # Chairman model - synthesizes final response
 CHAIRMAN_MODEL = "google/gemini-3-flash-preview"
 
+# Standby models (comma-separated PolzaAI identifiers) that stand in for council
+# members whose circuit breaker is open, and the council size to keep up with them
+COUNCIL_STANDBY_MODELS = [
+    model.strip() for model in os.getenv("COUNCIL_STANDBY_MODELS", "").split(",") if model.strip()
+]
+COUNCIL_MIN_SIZE = int(os.getenv("COUNCIL_MIN_SIZE", "3"))
+
 # PolzaAI API endpoint
-POLZAAI_API_URL = "https://api.polza.ai/api/v1/chat/completions"
+POLZAAI_API_URL = os.getenv("POLZAAI_API_URL", "https://api.polza.ai/api/v1/chat/completions")
+
+
+# Shared HTTP client settings for PolzaAI (one pooled client per process)
+POLZAAI_MAX_CONNECTIONS = int(os.getenv("POLZAAI_MAX_CONNECTIONS", "100"))
+POLZAAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("POLZAAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+POLZAAI_KEEPALIVE_EXPIRY = float(os.getenv("POLZAAI_KEEPALIVE_EXPIRY", "60"))
+POLZAAI_CONNECT_TIMEOUT = float(os.getenv("POLZAAI_CONNECT_TIMEOUT", "10"))
+POLZAAI_HTTP2 = os.getenv("POLZAAI_HTTP2", "true").lower() in ("1", "true", "yes")
+# Ask for the 'usage' chunk at the end of streamed answers (stream_options.include_usage)
+POLZAAI_STREAM_USAGE = os.getenv("POLZAAI_STREAM_USAGE", "true").lower() in ("1", "true", "yes")
+
+# Forward upstream token deltas through /council/stream (False = whole answers only)
+COUNCIL_STREAM_TOKENS = os.getenv("COUNCIL_STREAM_TOKENS", "true").lower() in ("1", "true", "yes")
+
+# Stage gating: move on once QUORUM successful answers arrived or DEADLINE seconds passed.
+# 0 disables the corresponding limit (wait for every model).
+STAGE1_QUORUM = int(os.getenv("STAGE1_QUORUM", "0"))
+STAGE1_DEADLINE = float(os.getenv("STAGE1_DEADLINE", "0"))
+STAGE2_QUORUM = int(os.getenv("STAGE2_QUORUM", "0"))
+STAGE2_DEADLINE = float(os.getenv("STAGE2_DEADLINE", "0"))
+
+# What to do with answers that arrive after their stage was closed in streaming mode:
+# "drop" cancels them, "attach" still streams them with status "late"
+STRAGGLER_POLICY = os.getenv("STRAGGLER_POLICY", "drop")
+
+# Multi-worker serving: COUNCIL_WORKERS uvicorn worker processes (docker/supervisord.conf
+# passes it to --workers). Upstream rate limits, in-flight run claims, the response cache
+# and job events are then shared through SHARED_STATE_BACKEND: "sqlite" (a WAL-mode file at
+# SHARED_STATE_PATH, one host), "redis" (SHARED_STATE_REDIS_URL, needs the redis package)
+# or "none" (every worker on its own). Admission leases of a worker that died expire
+# after SHARED_LEASE_TTL seconds. Workers waiting for a lease, or following a run of the
+# same question in another worker, poll every SHARED_POLL_INTERVAL seconds.
+COUNCIL_WORKERS = max(1, int(os.getenv("COUNCIL_WORKERS", "1")))
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "sqlite" if COUNCIL_WORKERS > 1 else "none").lower()
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "council_shared.sqlite3")
+SHARED_STATE_REDIS_URL = os.getenv("SHARED_STATE_REDIS_URL", "redis://localhost:6379/0")
+SHARED_LEASE_TTL = float(os.getenv("SHARED_LEASE_TTL", "600"))
+SHARED_POLL_INTERVAL = float(os.getenv("SHARED_POLL_INTERVAL", "0.1"))
+
+# Council response cache: "memory" (LRU + TTL), "sqlite" (on-disk), "shared" (in
+# SHARED_STATE_BACKEND, seen by every worker) or "none"
+COUNCIL_CACHE_BACKEND = os.getenv(
+    "COUNCIL_CACHE_BACKEND", "shared" if SHARED_STATE_BACKEND != "none" else "memory"
+).lower()
+COUNCIL_CACHE_TTL = float(os.getenv("COUNCIL_CACHE_TTL", "86400"))
+COUNCIL_CACHE_MAX_ENTRIES = int(os.getenv("COUNCIL_CACHE_MAX_ENTRIES", "1000"))
+COUNCIL_CACHE_PATH = os.getenv("COUNCIL_CACHE_PATH", "council_cache.sqlite3")
+
+# Near-duplicate index of past council results (needs NumPy): "off", "preview" (stream the
+# closest stored result while a fresh run proceeds) or "serve" (answer from it). Queries match
+# when the MinHash estimate of their character-shingle Jaccard similarity reaches
+# SEMANTIC_CACHE_THRESHOLD; SEMANTIC_CACHE_BANDS x SEMANTIC_CACHE_ROWS hashes per query.
+SEMANTIC_CACHE_MODE = os.getenv("SEMANTIC_CACHE_MODE", "off").lower()
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.7"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "604800"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "200000"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "council_semantic_cache")
+SEMANTIC_CACHE_SHINGLE_SIZE = int(os.getenv("SEMANTIC_CACHE_SHINGLE_SIZE", "3"))
+SEMANTIC_CACHE_BANDS = int(os.getenv("SEMANTIC_CACHE_BANDS", "16"))
+SEMANTIC_CACHE_ROWS = int(os.getenv("SEMANTIC_CACHE_ROWS", "4"))
+
+# Let identical concurrent /council/stream requests share one upstream run
+COUNCIL_COALESCE = os.getenv("COUNCIL_COALESCE", "true").lower() in ("1", "true", "yes")
+
+# How often /council/stream checks whether its client is still connected (seconds)
+CLIENT_DISCONNECT_POLL_INTERVAL = float(os.getenv("CLIENT_DISCONNECT_POLL_INTERVAL", "1"))
+
+# SSE transport (/council/stream, /council/jobs/{id}/events): a heartbeat comment after
+# SSE_HEARTBEAT_INTERVAL seconds without events keeps proxies from closing idle streams
+# (0 = off); token deltas are collected for SSE_FLUSH_INTERVAL seconds and written as one
+# chunk (0 = write each at once). A client SSE_CLIENT_BUFFER events behind gets
+# SSE_SLOW_CLIENT_POLICY: "drop_deltas" (skip its token deltas) or "disconnect".
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+SSE_FLUSH_INTERVAL = float(os.getenv("SSE_FLUSH_INTERVAL", "0.05"))
+SSE_CLIENT_BUFFER = int(os.getenv("SSE_CLIENT_BUFFER", "1000"))
+SSE_SLOW_CLIENT_POLICY = os.getenv("SSE_SLOW_CLIENT_POLICY", "drop_deltas").lower()
+
+# Logging goes through a bounded in-memory queue to a background thread (records beyond
+# LOG_QUEUE_SIZE are dropped, never waited for). LOG_FORMAT: "json" (one object per line)
+# or "text". Span-style run traces go to TRACE_PATH as JSONL, rotated at TRACE_MAX_BYTES
+# with TRACE_BACKUP_COUNT old files (off unless a path is set, so importing the app
+# never creates a file in the working directory). TRACE_SAMPLE_RATE is the share of
+# runs traced in full; errors and cancellations of the other runs are still written.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "5"))
+
+# Conversations (multi-turn councils) in a SQLite file. Follow-up questions get the last
+# CONVERSATION_RECENT_TURNS turns plus a summary of the earlier ones (compacted in the
+# background by CONVERSATION_MODEL to CONVERSATION_SUMMARY_TOKENS), within
+# CONVERSATION_CONTEXT_TOKENS. CONVERSATION_MODEL also writes the titles.
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "council_conversations.sqlite3")
+CONVERSATION_MODEL = os.getenv("CONVERSATION_MODEL", "google/gemini-2.5-flash")
+CONVERSATION_RECENT_TURNS = int(os.getenv("CONVERSATION_RECENT_TURNS", "3"))
+CONVERSATION_CONTEXT_TOKENS = int(os.getenv("CONVERSATION_CONTEXT_TOKENS", "4000"))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "1000"))
+
+# Background council jobs (POST /council/jobs): worker pool size, queued jobs allowed,
+# events kept per job for resuming with Last-Event-ID, and how long finished jobs are kept
+COUNCIL_JOB_WORKERS = int(os.getenv("COUNCIL_JOB_WORKERS", "4"))
+COUNCIL_JOB_MAX_QUEUE = int(os.getenv("COUNCIL_JOB_MAX_QUEUE", "100"))
+COUNCIL_JOB_EVENT_BUFFER = int(os.getenv("COUNCIL_JOB_EVENT_BUFFER", "4096"))
+COUNCIL_JOB_TTL = float(os.getenv("COUNCIL_JOB_TTL", "3600"))
+
+# Batch council runs (POST /council/batch): queries per request, council runs in
+# parallel per batch, and retries of a query the upstream admission control refused
+COUNCIL_BATCH_MAX_QUERIES = int(os.getenv("COUNCIL_BATCH_MAX_QUERIES", "1000"))
+COUNCIL_BATCH_CONCURRENCY = int(os.getenv("COUNCIL_BATCH_CONCURRENCY", "4"))
+COUNCIL_BATCH_RETRIES = int(os.getenv("COUNCIL_BATCH_RETRIES", "3"))
+
+# Admission control in front of PolzaAI.
+# Global cap on concurrent upstream requests and on requests waiting for a slot.
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "64"))
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "256"))
+# How long a request may wait for a slot/token before the server reports it is overloaded
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "10"))
+# Share of each limiter's concurrency that batch requests may use; they are also held
+# back while any interactive request is waiting for a slot
+BATCH_MAX_SHARE = float(os.getenv("BATCH_MAX_SHARE", "0.5"))
+
+# Per-model limits: token-bucket rate (requests/s), burst, concurrent requests, wait queue.
+DEFAULT_MODEL_LIMITS = {
+    "rate": float(os.getenv("MODEL_RATE_LIMIT", "5")),
+    "burst": float(os.getenv("MODEL_RATE_BURST", "10")),
+    "max_concurrent": int(os.getenv("MODEL_MAX_CONCURRENCY", "16")),
+    "max_queue": int(os.getenv("MODEL_MAX_QUEUE", "64")),
+}
+
+# Overrides by PolzaAI model identifier, merged over DEFAULT_MODEL_LIMITS
+MODEL_LIMITS = {
+    "google/gemini-3-flash-preview": {},
+    "anthropic/claude-3.5-haiku": {},
+    "openai/gpt-4o-mini": {},
+    "x-ai/grok-4-fast": {},
+}
+
+# Resilience policy per council member: retries with jittered exponential backoff
+# for retryable failures, and hedging (a duplicate request once the first one is
+# slower than the given latency percentile of recent calls; 0 disables hedging).
+DEFAULT_RESILIENCE_POLICY = {
+    "max_retries": int(os.getenv("RETRY_MAX_RETRIES", "2")),
+    "backoff_base": float(os.getenv("RETRY_BACKOFF_BASE", "0.5")),
+    "backoff_max": float(os.getenv("RETRY_BACKOFF_MAX", "8")),
+    "retry_statuses": [408, 409, 425, 429, 500, 502, 503, 504],
+    "hedge_percentile": float(os.getenv("HEDGE_PERCENTILE", "0")),
+    "hedge_min_delay": float(os.getenv("HEDGE_MIN_DELAY", "2")),
+    "hedge_min_samples": int(os.getenv("HEDGE_MIN_SAMPLES", "20")),
+}
+
+# Overrides by PolzaAI model identifier, merged over DEFAULT_RESILIENCE_POLICY
+MODEL_RESILIENCE_POLICY = {
+    "google/gemini-3-flash-preview": {},
+    "anthropic/claude-3.5-haiku": {},
+    "openai/gpt-4o-mini": {},
+    "x-ai/grok-4-fast": {},
+}
+
+# Model health registry: EWMA of latency and error rate per model (HEALTH_EWMA_ALPHA is
+# the weight of the newest call) and a circuit breaker that opens after BREAKER_FAILURES
+# consecutive failures, or an error rate of BREAKER_ERROR_RATE over at least
+# BREAKER_MIN_SAMPLES calls. After BREAKER_COOLDOWN seconds one trial request decides
+# whether it closes again. Calls whose first byte (first token when streaming) takes
+# longer than HEALTH_SLOW_CALL seconds count as failures (0 = never).
+# HEALTH_PROBE_INTERVAL > 0 sends background probes to models waiting for their trial
+# and to idle standby models.
+MODEL_HEALTH_ENABLED = os.getenv("MODEL_HEALTH_ENABLED", "true").lower() in ("1", "true", "yes")
+HEALTH_EWMA_ALPHA = float(os.getenv("HEALTH_EWMA_ALPHA", "0.2"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "3"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_SAMPLES = int(os.getenv("BREAKER_MIN_SAMPLES", "10"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+HEALTH_SLOW_CALL = float(os.getenv("HEALTH_SLOW_CALL", "0"))
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "0"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "15"))
+
+# Overall time budget per stage in seconds; retries and hedges must fit inside it (0 = none)
+STAGE_BUDGETS = {
+    "stage1": float(os.getenv("STAGE1_BUDGET", "0")),
+    "stage2": float(os.getenv("STAGE2_BUDGET", "0")),
+    "stage3": float(os.getenv("STAGE3_BUDGET", "0")),
+}
+
+# Token budget for the whole stage 2 (review) and stage 3 (chairman) prompt, estimated
+# locally; answers and reviews that don't fit are shortened to excerpts (0 = no budget)
+PROMPT_TOKEN_BUDGETS = {
+    "stage2": int(os.getenv("STAGE2_PROMPT_TOKENS", "0")),
+    "stage3": int(os.getenv("STAGE3_PROMPT_TOKENS", "0")),
+}
+# How answers and reviews are shortened: "head", "tail" or "head_tail"
+PROMPT_EXCERPT_STRATEGIES = {
+    "answer": os.getenv("PROMPT_ANSWER_EXCERPT", "head_tail"),
+    "review": os.getenv("PROMPT_REVIEW_EXCERPT", "head_tail"),
+}
+# Consensus check over stage 1 answers (TF-IDF cosine of CONSENSUS_SHINGLE_SIZE-character
+# shingles, hashed into CONSENSUS_FEATURES features, NumPy used when installed). When every pair
+# of answers is at least CONSENSUS_THRESHOLD similar, CONSENSUS_ACTION decides: "skip"
+# stage 2, "shrink" it to CONSENSUS_REVIEWERS reviewers, or "none" (only record the score).
+# Either way the chairman then gets a compact prompt of CONSENSUS_PROMPT_TOKENS.
+CONSENSUS_THRESHOLD = float(os.getenv("CONSENSUS_THRESHOLD", "0.8"))
+CONSENSUS_ACTION = os.getenv("CONSENSUS_ACTION", "none")
+CONSENSUS_REVIEWERS = int(os.getenv("CONSENSUS_REVIEWERS", "1"))
+CONSENSUS_SHINGLE_SIZE = int(os.getenv("CONSENSUS_SHINGLE_SIZE", "4"))
+CONSENSUS_FEATURES = int(os.getenv("CONSENSUS_FEATURES", "16384"))
+CONSENSUS_PROMPT_TOKENS = int(os.getenv("CONSENSUS_PROMPT_TOKENS", "8000"))
+
+# Speculative chairman: draft the synthesis from the stage 1 answers while stage 2 runs.
+# The draft is kept if the reviews' average ranks differ by at most
+# SPECULATIVE_MAX_RANK_SPREAD places (no clear winner or loser), otherwise it is cancelled
+# and the full synthesis runs.
+COUNCIL_SPECULATIVE_CHAIRMAN = os.getenv("COUNCIL_SPECULATIVE_CHAIRMAN", "false").lower() in ("1", "true", "yes")
+SPECULATIVE_MAX_RANK_SPREAD = float(os.getenv("SPECULATIVE_MAX_RANK_SPREAD", "1.0"))
+
+# Stage 2 review strategy (default for requests that don't pick one): "all" (every member
+# ranks every answer, N prompts with N answers each), "judge" (REVIEW_JUDGE_MODEL alone,
+# the run's chairman if empty), "sample" (REVIEW_SAMPLE_SIZE random members) or
+# "tournament" (REVIEW_TOURNAMENT_ROUNDS rounds of head-to-head pairs, about N * rounds
+# small prompts, each judged by a member who wrote neither answer).
+REVIEW_STRATEGY = os.getenv("REVIEW_STRATEGY", "all")
+REVIEW_JUDGE_MODEL = os.getenv("REVIEW_JUDGE_MODEL", "")
+REVIEW_SAMPLE_SIZE = int(os.getenv("REVIEW_SAMPLE_SIZE", "2"))
+REVIEW_TOURNAMENT_ROUNDS = int(os.getenv("REVIEW_TOURNAMENT_ROUNDS", "2"))
 
+# UTF-8 bytes per token for the local token estimate, and the smallest excerpt allowed
+PROMPT_BYTES_PER_TOKEN = float(os.getenv("PROMPT_BYTES_PER_TOKEN", "4"))
+PROMPT_MIN_ITEM_TOKENS = int(os.getenv("PROMPT_MIN_ITEM_TOKENS", "200"))
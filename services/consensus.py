@@ -0,0 +1,145 @@
+"""Local agreement check over stage 1 answers: TF-IDF cosine similarity of character shingles."""
+
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Sequence
+
+from .config import (
+    CONSENSUS_THRESHOLD,
+    CONSENSUS_ACTION,
+    CONSENSUS_SHINGLE_SIZE,
+    CONSENSUS_FEATURES,
+)
+from .metrics import CONSENSUS_DECISIONS
+
+try:
+    import numpy as np
+except ImportError:
+    # Pure-Python fallback below; same hashed features and scores, slower on long answers
+    np = None
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = CONSENSUS_SHINGLE_SIZE) -> List[str]:
+    """
+    Split a text into lowercase character shingles.
+
+    Punctuation is dropped and words are joined by single spaces. Character
+    shingles match inflected forms ("Париж", "Парижем") that word shingles miss.
+
+    Args:
+        text: Answer text
+        size: Shingle length in characters
+
+    Returns:
+        Shingles in text order (with repeats)
+    """
+    normalized = " ".join(_WORD_RE.findall(text.lower()))
+    return [normalized[i:i + size] for i in range(len(normalized) - size + 1)]
+
+
+def _feature(shingle: str) -> int:
+    # Both similarity paths use the hashed features, so installing NumPy never flips a decision
+    return zlib.crc32(shingle.encode("utf-8")) % CONSENSUS_FEATURES
+
+
+def _idf(counts: Sequence[Counter]) -> Dict[int, float]:
+    # Smoothed IDF: terms every answer uses still count, distinctive ones count more
+    n = len(counts)
+    document_frequency: Counter = Counter()
+    for terms in counts:
+        document_frequency.update(terms.keys())
+    return {term: math.log((1 + n) / (1 + df)) + 1 for term, df in document_frequency.items()}
+
+
+def _similarity_numpy(counts: Sequence[Counter], idf: Dict[int, float]) -> List[List[float]]:
+    # One row per answer, one column per feature
+    matrix = np.zeros((len(counts), CONSENSUS_FEATURES))
+    for row, terms in enumerate(counts):
+        columns = np.fromiter(terms.keys(), dtype=np.int64, count=len(terms))
+        weights = np.fromiter(
+            (tf * idf[term] for term, tf in terms.items()), dtype=float, count=len(terms)
+        )
+        matrix[row, columns] = weights
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    return (matrix @ matrix.T).tolist()
+
+
+def _similarity_python(counts: Sequence[Counter], idf: Dict[int, float]) -> List[List[float]]:
+    vectors = []
+    for terms in counts:
+        vector = {term: tf * idf[term] for term, tf in terms.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        vectors.append({term: w / norm for term, w in vector.items()})
+    return [
+        [sum(w * b.get(term, 0.0) for term, w in a.items()) for b in vectors]
+        for a in vectors
+    ]
+
+
+def similarity_matrix(texts: Sequence[str]) -> List[List[float]]:
+    """
+    Compute pairwise TF-IDF cosine similarity of texts.
+
+    Shingles are hashed into CONSENSUS_FEATURES features. Uses NumPy when it is
+    installed and sparse vectors otherwise; both give the same scores.
+
+    Args:
+        texts: Answer texts
+
+    Returns:
+        Symmetric matrix of similarities in [0, 1] (1 on the diagonal for non-empty texts)
+    """
+    counts = [Counter(_feature(shingle) for shingle in shingles(text)) for text in texts]
+    idf = _idf(counts)
+    if np is not None:
+        return _similarity_numpy(counts, idf)
+    return _similarity_python(counts, idf)
+
+
+def check_consensus(stage1_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Decide whether stage 1 answers agree closely enough to cut peer review short.
+
+    The score is the lowest pairwise similarity, so a single dissenting answer
+    keeps the full review. With agreement, CONSENSUS_ACTION decides what the
+    pipeline does: "skip" stage 2, "shrink" it to fewer reviewers, or "none"
+    (only record the score for tuning CONSENSUS_THRESHOLD).
+
+    Args:
+        stage1_results: Results from Stage 1
+
+    Returns:
+        Dict with 'agreed', 'action' (what the pipeline does), 'score', 'mean',
+        'threshold' and 'representative' (model whose answer is closest to the rest)
+    """
+    texts = [result["response"] for result in stage1_results]
+    if len(texts) < 2:
+        decision = {
+            "agreed": False, "action": "none", "score": None, "mean": None,
+            "threshold": CONSENSUS_THRESHOLD, "representative": None
+        }
+        CONSENSUS_DECISIONS.inc(decision="too_few_answers")
+        return decision
+
+    matrix = similarity_matrix(texts)
+    n = len(texts)
+    pairs = [matrix[i][j] for i in range(n) for j in range(i + 1, n)]
+    # Medoid: the answer with the highest total similarity to the others
+    representative = max(range(n), key=lambda i: sum(matrix[i][j] for j in range(n) if j != i))
+
+    agreed = min(pairs) >= CONSENSUS_THRESHOLD
+    action = CONSENSUS_ACTION if agreed else "none"
+    CONSENSUS_DECISIONS.inc(decision=action if agreed else "disagree")
+    return {
+        "agreed": agreed,
+        "action": action,
+        "score": round(min(pairs), 4),
+        "mean": round(sum(pairs) / len(pairs), 4),
+        "threshold": CONSENSUS_THRESHOLD,
+        "representative": stage1_results[representative]["model"]
+    }
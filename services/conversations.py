@@ -0,0 +1,357 @@
+"""Conversations: append-only council turns in SQLite and the context of follow-up questions."""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from typing import Any, Awaitable, Dict, List, Optional, Set, Tuple
+
+from .config import (
+    CONVERSATION_DB_PATH,
+    CONVERSATION_MODEL,
+    CONVERSATION_RECENT_TURNS,
+    CONVERSATION_CONTEXT_TOKENS,
+    CONVERSATION_SUMMARY_TOKENS,
+)
+from .polzaai import query_model
+from .prompts import excerpt, fit_to_budget
+
+logger = logging.getLogger(__name__)
+
+# Compaction prompt: earlier turns are folded into a running summary
+SUMMARY_PROMPT_TEMPLATE = """Сожми историю разговора пользователя с советом AI-моделей в краткое изложение не длиннее {max_words} слов. Сохрани темы, факты, выводы и договорённости, на которые могут ссылаться следующие вопросы. Не добавляй ничего от себя.
+
+Предыдущее изложение:
+{summary}
+
+Новые реплики:
+{turns}
+
+Краткое изложение:"""
+
+
+def _turn_text(query: str, result: Dict[str, Any]) -> str:
+    """One turn as context: the question and the council's final answer."""
+    return f"Вопрос: {query}\nОтвет совета: {result.get('consensus', '')}"
+
+
+class ConversationStore:
+    """
+    Conversations and their turns in a SQLite file (WAL mode). Queries run in a worker thread.
+
+    Turns are append-only and clustered by conversation (WITHOUT ROWID table
+    keyed by conversation and turn number), so loading a conversation or its
+    latest turns reads one contiguous range however large the store grows.
+    The conversation row keeps the turn count, the last update time (indexed,
+    for keyset-paginated listing) and the summary of the turns compacted so far.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "id TEXT PRIMARY KEY, title TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "turn_count INTEGER NOT NULL DEFAULT 0, summary TEXT NOT NULL DEFAULT '', "
+            "summary_turns INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Listing pages on (updated_at, id), so ties in updated_at are neither skipped nor repeated
+        self._conn.execute("DROP INDEX IF EXISTS conversations_updated")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS conversations_updated_id ON conversations (updated_at, id)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "conversation_id TEXT NOT NULL, turn INTEGER NOT NULL, query TEXT NOT NULL, "
+            "result TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (conversation_id, turn)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._lock = asyncio.Lock()
+        # Title and compaction tasks, kept referenced until they finish
+        self._tasks: Set[asyncio.Task] = set()
+        self._compacting: Set[str] = set()
+
+    async def _run(self, function: Any, *args: Any) -> Any:
+        async with self._lock:
+            return await asyncio.to_thread(function, *args)
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _create(self) -> Dict[str, Any]:
+        now = time.time()
+        conversation = {"id": uuid.uuid4().hex, "title": None, "created_at": now, "updated_at": now, "turn_count": 0}
+        self._conn.execute(
+            "INSERT INTO conversations (id, created_at, updated_at) VALUES (?, ?, ?)",
+            (conversation["id"], now, now)
+        )
+        self._conn.commit()
+        return conversation
+
+    def _list(self, limit: int, before: Optional[Tuple[float, str]]) -> List[Dict[str, Any]]:
+        updated_at, conversation_id = before if before is not None else (float("inf"), "")
+        rows = self._conn.execute(
+            "SELECT id, title, created_at, updated_at, turn_count FROM conversations "
+            "WHERE (updated_at, id) < (?, ?) ORDER BY updated_at DESC, id DESC LIMIT ?",
+            (updated_at, conversation_id, limit)
+        ).fetchall()
+        return [
+            {"id": row[0], "title": row[1], "created_at": row[2], "updated_at": row[3], "turn_count": row[4]}
+            for row in rows
+        ]
+
+    def _get(self, conversation_id: str, with_turns: bool) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT id, title, created_at, updated_at, turn_count, summary, summary_turns "
+            "FROM conversations WHERE id = ?",
+            (conversation_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        conversation = dict(zip(
+            ("id", "title", "created_at", "updated_at", "turn_count", "summary", "summary_turns"), row
+        ))
+        if with_turns:
+            conversation["turns"] = [
+                {"turn": turn, "query": query, "result": json.loads(result), "created_at": created_at}
+                for turn, query, result, created_at in self._conn.execute(
+                    "SELECT turn, query, result, created_at FROM turns "
+                    "WHERE conversation_id = ? ORDER BY turn",
+                    (conversation_id,)
+                )
+            ]
+        return conversation
+
+    def _turns_after(self, conversation_id: str, after: int, upto: int) -> List[Tuple[str, Dict[str, Any]]]:
+        return [
+            (query, json.loads(result))
+            for query, result in self._conn.execute(
+                "SELECT query, result FROM turns WHERE conversation_id = ? AND turn > ? AND turn <= ? "
+                "ORDER BY turn",
+                (conversation_id, after, upto)
+            )
+        ]
+
+    def _append(self, conversation_id: str, query: str, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._conn:
+            # Take the write lock before reading the count, so workers sharing the file
+            # (COUNCIL_WORKERS > 1) can't both pick the same turn number
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT turn_count, summary_turns FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            turn = row[0] + 1
+            self._conn.execute(
+                "INSERT INTO turns (conversation_id, turn, query, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, turn, query, json.dumps(result, ensure_ascii=False), now)
+            )
+            self._conn.execute(
+                "UPDATE conversations SET turn_count = ?, updated_at = ? WHERE id = ?",
+                (turn, now, conversation_id)
+            )
+        return {"turn": turn, "summary_turns": row[1]}
+
+    def _set_title(self, conversation_id: str, title: str) -> None:
+        self._conn.execute("UPDATE conversations SET title = ? WHERE id = ?", (title, conversation_id))
+        self._conn.commit()
+
+    def _set_summary(self, conversation_id: str, summary: str, summary_turns: int) -> None:
+        # Never move backwards if an older compaction finishes late
+        self._conn.execute(
+            "UPDATE conversations SET summary = ?, summary_turns = ? WHERE id = ? AND summary_turns < ?",
+            (summary, summary_turns, conversation_id, summary_turns)
+        )
+        self._conn.commit()
+
+    async def create(self) -> Dict[str, Any]:
+        """
+        Start a new conversation.
+
+        Returns:
+            Dict with 'id', 'title' (None until the first turn), 'created_at',
+            'updated_at' and 'turn_count'
+        """
+        return await self._run(self._create)
+
+    async def list(
+        self,
+        limit: int = 50,
+        before: Optional[Tuple[float, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        List conversations, most recently updated first (ties by id, descending).
+
+        Args:
+            limit: Conversations to return
+            before: (updated_at, id) of the last conversation on the previous page;
+                only conversations listed after it are returned. An empty id
+                returns everything updated strictly before updated_at
+
+        Returns:
+            Conversation summaries without turns
+        """
+        return await self._run(self._list, limit, before)
+
+    async def get(self, conversation_id: str, with_turns: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Load a conversation.
+
+        Args:
+            conversation_id: Conversation id
+            with_turns: Include every turn with its /council-format result
+
+        Returns:
+            Conversation dict, or None if there is no such conversation
+        """
+        return await self._run(self._get, conversation_id, with_turns)
+
+    async def context(self, conversation_id: str) -> Optional[str]:
+        """
+        Build the context of a follow-up question.
+
+        The summary of the compacted turns and the turns after it (the last
+        CONVERSATION_RECENT_TURNS, or a few more while a compaction is pending)
+        share the CONVERSATION_CONTEXT_TOKENS budget; answers that don't fit
+        are excerpted.
+
+        Args:
+            conversation_id: Conversation id
+
+        Returns:
+            Context text ("" for a conversation without turns), or None if there
+            is no such conversation
+        """
+        conversation = await self._run(self._get, conversation_id, False)
+        if conversation is None:
+            return None
+        after = max(conversation["summary_turns"], conversation["turn_count"] - 2 * CONVERSATION_RECENT_TURNS)
+        turns = await self._run(self._turns_after, conversation_id, after, conversation["turn_count"])
+
+        items = [(_turn_text(query, result), "head_tail") for query, result in turns]
+        if conversation["summary"]:
+            items.insert(0, (conversation["summary"], "head"))
+        texts, _ = fit_to_budget(items, CONVERSATION_CONTEXT_TOKENS)
+        if conversation["summary"]:
+            texts[0] = f"Краткое содержание ранее:\n{texts[0]}"
+        return "\n\n".join(texts)
+
+    async def append_turn(self, conversation_id: str, query: str, result: Dict[str, Any]) -> Optional[int]:
+        """
+        Append a finished council run to a conversation.
+
+        Once more than CONVERSATION_RECENT_TURNS turns follow the summary, the
+        older ones are folded into it in the background.
+
+        Args:
+            conversation_id: Conversation id
+            query: The user's question
+            result: Result in the /council format (see format_for_frontend)
+
+        Returns:
+            Number of the new turn (from 1), or None if there is no such conversation
+        """
+        appended = await self._run(self._append, conversation_id, query, result)
+        if appended is None:
+            return None
+        if appended["turn"] - appended["summary_turns"] > CONVERSATION_RECENT_TURNS:
+            if conversation_id not in self._compacting:
+                self._compacting.add(conversation_id)
+                self._spawn(self._compact(conversation_id, appended["turn"] - CONVERSATION_RECENT_TURNS))
+        return appended["turn"]
+
+    def generate_title(self, conversation_id: str, title: Awaitable[str]) -> None:
+        """
+        Store a conversation title once it is generated, without waiting for it.
+
+        Args:
+            conversation_id: Conversation id
+            title: Awaitable producing the title (e.g. generate_conversation_title)
+        """
+        async def save() -> None:
+            try:
+                await self._run(self._set_title, conversation_id, await title)
+            except Exception as e:
+                logger.warning("Conversation title generation failed: %s", e)
+
+        self._spawn(save())
+
+    async def _compact(self, conversation_id: str, upto: int) -> None:
+        """Fold the turns up to `upto` into the conversation summary."""
+        try:
+            conversation = await self._run(self._get, conversation_id, False)
+            turns = await self._run(self._turns_after, conversation_id, conversation["summary_turns"], upto)
+            if not turns:
+                return
+            texts, _ = fit_to_budget(
+                [(_turn_text(query, result), "head_tail") for query, result in turns],
+                CONVERSATION_CONTEXT_TOKENS
+            )
+
+            summary = ""
+            prompt = SUMMARY_PROMPT_TEMPLATE.format(
+                max_words=CONVERSATION_SUMMARY_TOKENS // 4,
+                summary=conversation["summary"] or "(нет)",
+                turns="\n\n".join(texts)
+            )
+            try:
+                response = await query_model(CONVERSATION_MODEL, [{"role": "user", "content": prompt}], timeout=60.0)
+                if response is not None:
+                    summary = (response.get("content") or "").strip()
+            except Exception as e:
+                logger.warning("Conversation summary failed, keeping excerpts: %s", e)
+            if not summary:
+                # Extractive fallback: the previous summary and excerpts of the new turns
+                parts, _ = fit_to_budget(
+                    [(conversation["summary"], "head")] + [(text, "head_tail") for text in texts],
+                    CONVERSATION_SUMMARY_TOKENS
+                )
+                summary = "\n\n".join(part for part in parts if part)
+
+            await self._run(
+                self._set_summary, conversation_id, excerpt(summary, CONVERSATION_SUMMARY_TOKENS, "head"), upto
+            )
+        except Exception as e:
+            logger.warning("Conversation compaction failed: %s", e)
+        finally:
+            self._compacting.discard(conversation_id)
+
+    async def close(self) -> None:
+        """Cancel pending title/compaction tasks and close the database."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._conn.close()
+
+
+_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """
+    Return the process-wide conversation store, opening it on first use.
+
+    Returns:
+        Conversation store at CONVERSATION_DB_PATH
+    """
+    global _store
+    if _store is None:
+        _store = ConversationStore(CONVERSATION_DB_PATH)
+    return _store
+
+
+async def close_conversations() -> None:
+    """Close the conversation store if it was opened."""
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
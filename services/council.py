@@ -1,80 +1,170 @@
 """3-stage LLM Council orchestration."""
 
-from typing import List, Dict, Any, Tuple, AsyncIterator
-from .polzaai import query_models_parallel, query_model
-from .config import COUNCIL_MODELS, CHAIRMAN_MODEL
+import logging
+import re
+from typing import List, Dict, Any, Tuple, AsyncIterator, Optional
+from .polzaai import query_model
+from .pipeline import GraphRun, StageNode, execute_graph
+from .metrics import SPECULATION_OUTCOMES, SPECULATION_SECONDS, new_run_timings
+from .prompts import estimate_tokens, fit_to_budget, new_prompt_report, record_prompt
+from .resilience import new_run_report
+from .health import chairman_model, council_members, new_run_council
+from .consensus import check_consensus
+from .review import plan_reviews
+from .semantic_cache import get_semantic_cache
+from .conversations import get_conversation_store
+from .config import (
+    COUNCIL_STREAM_TOKENS,
+    STAGE1_QUORUM,
+    STAGE1_DEADLINE,
+    STAGE2_QUORUM,
+    STAGE2_DEADLINE,
+    STAGE_BUDGETS,
+    PROMPT_TOKEN_BUDGETS,
+    PROMPT_EXCERPT_STRATEGIES,
+    CONSENSUS_REVIEWERS,
+    CONSENSUS_PROMPT_TOKENS,
+    COUNCIL_SPECULATIVE_CHAIRMAN,
+    SPECULATIVE_MAX_RANK_SPREAD,
+    REVIEW_STRATEGY,
+    REVIEW_JUDGE_MODEL,
+    CONVERSATION_MODEL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Question of a follow-up turn: the conversation so far (see services.conversations), then the question.
+# Every stage sees the question in this form.
+CONVERSATION_PROMPT_TEMPLATE = """Это продолжение разговора. Ниже — контекст предыдущих вопросов и ответов совета, затем новый вопрос пользователя. Отвечай на новый вопрос с учётом контекста.
+
+Контекст разговора:
+{context}
+
+Новый вопрос: {user_query}"""
+
+# Stage 2 prompt: each council member reviews and ranks the anonymized answers.
+# The static instructions come first so upstream prefix caching can reuse them across runs.
+RANKING_PROMPT_TEMPLATE = """Ты оцениваешь различные ответы разных моделей на вопрос пользователя. Вопрос и анонимизированные ответы приведены в конце этого сообщения.
 
+Твоя задача:
+1. Сначала оцени каждый ответ отдельно. Для каждого ответа объясни, что он делает хорошо и что плохо.
+2. Затем, в самом конце своего ответа, предоставь финальный рейтинг.
 
-def extract_short_model_name(full_model_name: str) -> str:
-    """
-    Extract short model name for frontend compatibility.
-    
-    Args:
-        full_model_name: Full model identifier like "google/gemini-3-flash-preview"
-        
-    Returns:
-        Short name like "GEMINI" for frontend
-    """
-    model_mapping = {
-        "google/gemini": "GEMINI",
-        "google/gemini-": "GEMINI",
-        "openai/gpt": "GPT",
-        "openai/": "GPT",
-        "x-ai/grok": "GROK",
-        "x-ai/": "GROK",
-        "anthropic/claude": "CLAUDE",
-        "anthropic/": "CLAUDE"
-    }
-    
-    # Find matching prefix
-    for prefix, short_name in model_mapping.items():
-        if full_model_name.startswith(prefix):
-            return short_name
-    
-    # Fallback: use uppercase first part
-    return full_model_name.split('/')[0].upper()
+Длинные ответы могут быть сокращены: пропущенная часть отмечена как "[…фрагмент сокращён…]". Не снижай оценку за само сокращение.
 
+ВАЖНО: Твой финальный рейтинг ДОЛЖЕН быть отформатирован ТОЧНО И СТРОГО следующим образом:
+- Начни со строки "ФИНАЛЬНЫЙ РЕЙТИНГ:" (все буквы заглавные, с двоеточием)
+- Затем перечисли ответы от лучшего к худшему как нумерованный список
+- Каждая строка должна быть: номер, точка, пробел, затем ТОЛЬКО метка ответа (например, "1. Ответ А")
+- Не добавляй никакой другой текст или объяснения в разделе рейтинга
 
-async def stage1_collect_responses(user_query: str) -> List[Dict[str, Any]]:
-    """
-    Stage 1: Collect individual responses from all council models.
+Пример правильного формата для ВСЕГО твоего ответа:
 
-    Args:
-        user_query: The user's question
+Ответ А предоставляет хорошие детали по X, но упускает Y...
+Ответ B точен, но не хватает глубины по Z...
+Ответ C предлагает наиболее полный ответ...
 
-    Returns:
-        List of dicts with 'model' and 'response' keys
-    """
-    messages = [{"role": "user", "content": user_query}]
+ФИНАЛЬНЫЙ РЕЙТИНГ:
+1. Ответ C
+2. Ответ A
+3. Ответ B
 
-    # Query all models in parallel
-    responses = await query_models_parallel(COUNCIL_MODELS, messages)
+Вопрос: {user_query}
 
-    # Format results
-    stage1_results = []
-    for model, response in responses.items():
-        if response is not None:  # Only include successful responses
-            stage1_results.append({
-                "model": model,
-                "response": response.get('content', '')
-            })
+Вот ответы от разных моделей (анонимизированы):
 
-    return stage1_results
+{responses_text}
 
+Теперь предоставь свою оценку и рейтинг:"""
 
-async def stage2_collect_rankings(
-    user_query: str,
-    stage1_results: List[Dict[str, Any]]
-) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+# Stage 2 prompt of the "tournament" review strategy: one head-to-head comparison.
+# Answers keep their council-wide labels, so the verdict parses like a two-line ranking.
+PAIRWISE_PROMPT_TEMPLATE = """Ты сравниваешь два ответа разных моделей на вопрос пользователя. Вопрос и анонимизированные ответы приведены в конце этого сообщения.
+
+Кратко объясни, какой ответ точнее и полезнее и почему. Длинные ответы могут быть сокращены: пропущенная часть отмечена как "[…фрагмент сокращён…]". Не снижай оценку за само сокращение.
+
+ВАЖНО: в самом конце своего ответа напиши строку "ФИНАЛЬНЫЙ РЕЙТИНГ:" и затем две строки: "1. " с меткой лучшего ответа и "2. " с меткой худшего, например:
+
+ФИНАЛЬНЫЙ РЕЙТИНГ:
+1. Ответ C
+2. Ответ A
+
+Вопрос: {user_query}
+
+{responses_text}
+
+Теперь предоставь своё сравнение и рейтинг:"""
+
+# Stage 3 prompt: the chairman synthesizes answers and reviews into one response.
+# Static instructions first, as for the stage 2 prompt.
+CHAIRMAN_PROMPT_TEMPLATE = """Ты — Председатель Совета LLM. Несколько AI-моделей предоставили ответы на вопрос пользователя и затем ранжировали ответы друг друга. Вопрос, ответы и ранжирование приведены ниже.
+
+Твоя задача как Председателя — синтезировать всю эту информацию в один единственный, комплексный, точный ответ на исходный вопрос пользователя. Рассмотри:
+- Индивидуальные ответы и их инсайты
+- Взаимное ранжирование и то, что оно раскрывает о качестве ответов
+- Любые паттерны согласия или разногласия
+
+Длинные ответы и рецензии могут быть сокращены: пропущенная часть отмечена как "[…фрагмент сокращён…]".
+
+Исходный вопрос: {user_query}
+
+ЭТАП 1 — Индивидуальные ответы:
+{stage1_text}
+
+ЭТАП 2 — Взаимное ранжирование:
+{stage2_text}
+
+Предоставь чёткий, хорошо аргументированный финальный ответ, который представляет коллективную мудрость совета:"""
+
+# Compact stage 3 prompt used when the stage 1 answers already agree (see services.consensus)
+CONSENSUS_CHAIRMAN_PROMPT_TEMPLATE = """Ты — Председатель Совета LLM. Несколько AI-моделей ответили на вопрос пользователя, и их ответы практически совпадают. Вопрос и ответы приведены ниже; первым идёт ответ, наиболее близкий к остальным.
+
+Твоя задача как Председателя — дать один точный и полный ответ на исходный вопрос, опираясь на общий ответ совета и дополняя его деталями, которые есть только в отдельных ответах.
+
+Длинные ответы и рецензии могут быть сокращены: пропущенная часть отмечена как "[…фрагмент сокращён…]".
+
+Исходный вопрос: {user_query}
+
+Ответы совета:
+{stage1_text}
+
+Рецензии (если рецензирование проводилось):
+{stage2_text}
+
+Предоставь финальный ответ совета:"""
+
+# Speculative stage 3 prompt: a draft synthesis from the stage 1 answers alone, written
+# while stage 2 runs and kept if the reviews don't change the picture
+DRAFT_CHAIRMAN_PROMPT_TEMPLATE = """Ты — Председатель Совета LLM. Несколько AI-моделей предоставили ответы на вопрос пользователя. Вопрос и ответы приведены ниже.
+
+Твоя задача как Председателя — синтезировать эти ответы в один единственный, комплексный, точный ответ на исходный вопрос пользователя. Рассмотри:
+- Индивидуальные ответы и их инсайты
+- Любые паттерны согласия или разногласия
+- Сильные и слабые стороны каждого ответа
+
+Длинные ответы могут быть сокращены: пропущенная часть отмечена как "[…фрагмент сокращён…]".
+
+Исходный вопрос: {user_query}
+
+Ответы совета:
+{stage1_text}
+
+Предоставь чёткий, хорошо аргументированный финальный ответ, который представляет коллективную мудрость совета:"""
+
+# Final answer used when the chairman model fails
+CHAIRMAN_ERROR_RESPONSE = "Error: Unable to generate final synthesis."
+
+
+def anonymize_responses(stage1_results: List[Dict[str, Any]]) -> Tuple[Dict[str, str], str]:
     """
-    Stage 2: Each model ranks the anonymized responses.
+    Label stage 1 answers anonymously for peer review.
 
     Args:
-        user_query: The original user query
         stage1_results: Results from Stage 1
 
     Returns:
-        Tuple of (rankings list, label_to_model mapping)
+        Tuple of (label_to_model mapping, responses text for the ranking prompt)
     """
     # Create anonymized labels for responses (Response A, Response B, etc.)
     labels = [chr(65 + i) for i in range(len(stage1_results))]  # A, B, C, ...
@@ -91,150 +181,237 @@ async def stage2_collect_rankings(
         for label, result in zip(labels, stage1_results)
     ])
 
-    ranking_prompt = f"""Ты оцениваешь различные ответы на следующий вопрос:
-Вопрос: {user_query}
+    return label_to_model, responses_text
 
-Вот ответы от разных моделей (анонимизированы):
 
-{responses_text}
+def _prompt_text_budget(budget: int, overhead: int) -> int:
+    """Tokens left for answers/reviews once the template and question are accounted for."""
+    if not budget:
+        return 0
+    # Never 0 here (that would disable the budget); fit_to_budget's minimum excerpt applies
+    return max(budget - overhead, 1)
 
-Твоя задача:
-1. Сначала оцени каждый ответ отдельно. Для каждого ответа объясни, что он делает хорошо и что плохо.
-2. Затем, в самом конце своего ответа, предоставь финальный рейтинг.
-
-ВАЖНО: Твой финальный рейтинг ДОЛЖЕН быть отформатирован ТОЧНО И СТРОГО следующим образом:
-- Начни со строки "ФИНАЛЬНЫЙ РЕЙТИНГ:" (все буквы заглавные, с двоеточием)
-- Затем перечисли ответы от лучшего к худшему как нумерованный список
-- Каждая строка должна быть: номер, точка, пробел, затем ТОЛЬКО метка ответа (например, "1. Ответ А")
-- Не добавляй никакой другой текст или объяснения в разделе рейтинга
-
-Пример правильного формата для ВСЕГО твоего ответа:
-
-Ответ А предоставляет хорошие детали по X, но упускает Y...
-Ответ B точен, но не хватает глубины по Z...
-Ответ C предлагает наиболее полный ответ...
 
-ФИНАЛЬНЫЙ РЕЙТИНГ:
-1. Ответ C
-2. Ответ A
-3. Ответ B
+def build_ranking_prompt(
+    user_query: str,
+    stage1_results: List[Dict[str, Any]]
+) -> Tuple[Dict[str, str], str]:
+    """
+    Build the stage 2 ranking prompt within the stage 2 token budget.
 
-Теперь предоставь свою оценку и рейтинг:"""
+    Answers that don't fit are shortened with the PROMPT_EXCERPT_STRATEGIES["answer"]
+    strategy; the size of the prompt is reported to the metrics and the run.
 
-    messages = [{"role": "user", "content": ranking_prompt}]
+    Args:
+        user_query: The original user query
+        stage1_results: Results from Stage 1
 
-    # Get rankings from all council models in parallel
-    responses = await query_models_parallel(COUNCIL_MODELS, messages)
+    Returns:
+        Tuple of (label_to_model mapping, ranking prompt)
+    """
+    budget = PROMPT_TOKEN_BUDGETS["stage2"]
+    _, headers = anonymize_responses([{**result, "response": ""} for result in stage1_results])
+    overhead = estimate_tokens(RANKING_PROMPT_TEMPLATE.format(user_query=user_query, responses_text=headers))
 
-    # Format results
-    stage2_results = []
-    for model, response in responses.items():
-        if response is not None:
-            full_text = response.get('content', '')
-            parsed = parse_ranking_from_text(full_text)
-            stage2_results.append({
-                "model": model,
-                "ranking": full_text,
-                "parsed_ranking": parsed
-            })
+    texts, truncated = fit_to_budget(
+        [(result["response"], PROMPT_EXCERPT_STRATEGIES["answer"]) for result in stage1_results],
+        _prompt_text_budget(budget, overhead)
+    )
+    label_to_model, responses_text = anonymize_responses([
+        {**result, "response": text} for result, text in zip(stage1_results, texts)
+    ])
 
-    return stage2_results, label_to_model
+    ranking_prompt = RANKING_PROMPT_TEMPLATE.format(
+        user_query=user_query,
+        responses_text=responses_text
+    )
+    record_prompt("stage2", ranking_prompt, budget, len(texts), len(truncated))
+    return label_to_model, ranking_prompt
 
 
-async def stage3_synthesize_final(
+def build_pairwise_prompt(
     user_query: str,
     stage1_results: List[Dict[str, Any]],
-    stage2_results: List[Dict[str, Any]]
-) -> Dict[str, Any]:
+    pair: Tuple[int, int]
+) -> str:
     """
-    Stage 3: Chairman synthesizes final response.
+    Build a "tournament" comparison prompt for two answers within the stage 2 token budget.
 
     Args:
         user_query: The original user query
-        stage1_results: Individual model responses from Stage 1
-        stage2_results: Rankings from Stage 2
+        stage1_results: Results from Stage 1
+        pair: Indices of the two answers, in the order they are shown
 
     Returns:
-        Dict with 'model' and 'response' keys
+        Comparison prompt; the answers carry the same labels as in build_ranking_prompt
     """
-    # Build comprehensive context for chairman
+    budget = PROMPT_TOKEN_BUDGETS["stage2"]
+    labels = [f"Response {chr(65 + index)}" for index in pair]
+    headers = "\n\n".join(f"{label}:\n" for label in labels)
+    overhead = estimate_tokens(PAIRWISE_PROMPT_TEMPLATE.format(user_query=user_query, responses_text=headers))
+
+    texts, truncated = fit_to_budget(
+        [(stage1_results[index]["response"], PROMPT_EXCERPT_STRATEGIES["answer"]) for index in pair],
+        _prompt_text_budget(budget, overhead)
+    )
+    pairwise_prompt = PAIRWISE_PROMPT_TEMPLATE.format(
+        user_query=user_query,
+        responses_text="\n\n".join(f"{label}:\n{text}" for label, text in zip(labels, texts))
+    )
+    record_prompt("stage2", pairwise_prompt, budget, len(texts), len(truncated))
+    return pairwise_prompt
+
+
+def _chairman_sections(
+    stage1_texts: List[Tuple[str, str]],
+    stage2_texts: List[Tuple[str, str]]
+) -> Tuple[str, str]:
+    """Format (model, text) pairs of answers and reviews for the chairman prompt."""
     stage1_text = "\n\n".join([
-        f"Model: {result['model']}\nResponse: {result['response']}"
-        for result in stage1_results
+        f"Model: {model}\nResponse: {text}"
+        for model, text in stage1_texts
     ])
 
     stage2_text = "\n\n".join([
-        f"Model: {result['model']}\nRanking: {result['ranking']}"
-        for result in stage2_results
+        f"Model: {model}\nRanking: {text}"
+        for model, text in stage2_texts
     ])
+    return stage1_text, stage2_text
 
-    chairman_prompt = f"""Ты — Председатель Совета LLM. Несколько AI-моделей предоставили ответы на вопрос пользователя и затем ранжировали ответы друг друга.
 
-Исходный вопрос: {user_query}
+def build_chairman_prompt(
+    user_query: str,
+    stage1_results: List[Dict[str, Any]],
+    stage2_results: List[Dict[str, Any]],
+    consensus: Optional[Dict[str, Any]] = None,
+    draft: bool = False
+) -> str:
+    """
+    Build the chairman prompt within the stage 3 token budget.
 
-ЭТАП 1 — Индивидуальные ответы:
-{stage1_text}
+    Answers and reviews share the budget; those that don't fit are shortened with
+    their PROMPT_EXCERPT_STRATEGIES entry ("head_tail" keeps a review's final ranking).
+    When the consensus check agreed and cut stage 2 short, the compact
+    CONSENSUS_CHAIRMAN_PROMPT_TEMPLATE is used within CONSENSUS_PROMPT_TOKENS,
+    with the representative answer first. A speculative draft uses
+    DRAFT_CHAIRMAN_PROMPT_TEMPLATE, which has no reviews.
 
-ЭТАП 2 — Взаимное ранжирование:
-{stage2_text}
+    Args:
+        user_query: The original user query
+        stage1_results: Individual model responses from Stage 1
+        stage2_results: Rankings from Stage 2
+        consensus: Result of check_consensus for the stage 1 answers, if any
+        draft: Build the prompt of a speculative draft from the answers alone
 
-Твоя задача как Председателя — синтезировать всю эту информацию в один единственный, комплексный, точный ответ на исходный вопрос пользователя. Рассмотри:
-- Индивидуальные ответы и их инсайты
-- Взаимное ранжирование и то, что оно раскрывает о качестве ответов
-- Любые паттерны согласия или разногласия
+    Returns:
+        Chairman prompt
+    """
+    stage = "stage3"
+    template = CHAIRMAN_PROMPT_TEMPLATE
+    budget = PROMPT_TOKEN_BUDGETS["stage3"]
+    if draft:
+        stage = "draft"
+        template = DRAFT_CHAIRMAN_PROMPT_TEMPLATE
+        stage2_results = []
+    elif consensus and consensus["action"] != "none":
+        template = CONSENSUS_CHAIRMAN_PROMPT_TEMPLATE
+        budget = CONSENSUS_PROMPT_TOKENS
+        stage1_results = sorted(
+            stage1_results, key=lambda result: result["model"] != consensus["representative"]
+        )
+    empty1, empty2 = _chairman_sections(
+        [(result["model"], "") for result in stage1_results],
+        [(result["model"], "") for result in stage2_results]
+    )
+    overhead = estimate_tokens(template.format(
+        user_query=user_query, stage1_text=empty1, stage2_text=empty2
+    ))
+
+    items = [(result["response"], PROMPT_EXCERPT_STRATEGIES["answer"]) for result in stage1_results]
+    items += [(result["ranking"], PROMPT_EXCERPT_STRATEGIES["review"]) for result in stage2_results]
+    texts, truncated = fit_to_budget(items, _prompt_text_budget(budget, overhead))
+
+    split = len(stage1_results)
+    stage1_text, stage2_text = _chairman_sections(
+        [(result["model"], text) for result, text in zip(stage1_results, texts[:split])],
+        [(result["model"], text) for result, text in zip(stage2_results, texts[split:])]
+    )
 
-Предоставь чёткий, хорошо аргументированный финальный ответ, который представляет коллективную мудрость совета:"""
+    chairman_prompt = template.format(
+        user_query=user_query,
+        stage1_text=stage1_text,
+        stage2_text=stage2_text
+    )
+    record_prompt(stage, chairman_prompt, budget, len(texts), len(truncated))
+    return chairman_prompt
 
-    messages = [{"role": "user", "content": chairman_prompt}]
 
-    # Query the chairman model
-    response = await query_model(CHAIRMAN_MODEL, messages)
+# "FINAL RANKING:" header in English or Russian (the stage 2 prompt asks for Russian)
+_RANKING_HEADER_RE = re.compile(r'(?:FINAL\s+RANKING|ФИНАЛЬНЫЙ\s+РЕЙТИНГ)\s*:', re.IGNORECASE)
 
-    if response is None:
-        # Fallback if chairman fails
-        return {
-            "model": CHAIRMAN_MODEL,
-            "response": "Error: Unable to generate final synthesis."
-        }
+# "Response X" / "Ответ X", optionally preceded by a list number ("1. Ответ А")
+# The letter must be uppercase so Russian prose like "ответ в том" isn't read as a label
+# (the lookahead lets the engine skip positions that can't start a label quickly)
+_RANKING_LABEL_RE = re.compile(
+    r'(?=[\dRrОо])(\d+\s*[.)]\s*)?(?:[Rr]esponse|RESPONSE|[Оо]твет|ОТВЕТ)\s+([A-ZА-ЯЁ])(?!\w)'
+)
+
+# Common spellings of the header keyword, located with str.rfind before using the regex
+_RANKING_HEADER_WORDS = ("RANKING", "Ranking", "ranking", "РЕЙТИНГ", "Рейтинг", "рейтинг")
+
+# Cyrillic letters that look like the Latin labels used in the prompt, mapped by shape
+# (models copy "Ответ А" with a Cyrillic А). Other Cyrillic letters name no label.
+_CYRILLIC_LABELS = {
+    'А': 'A', 'В': 'B', 'С': 'C', 'Е': 'E', 'Н': 'H', 'К': 'K', 'М': 'M',
+    'О': 'O', 'Р': 'P', 'Т': 'T', 'Х': 'X',
+}
 
-    return {
-        "model": CHAIRMAN_MODEL,
-        "response": response.get('content', '')
-    }
+
+def _ranking_section_start(ranking_text: str) -> int:
+    """Return where the last ranking header ends, or 0 if the text has none."""
+    # The ranking is at the end: check around the last keyword before scanning everything
+    keyword = max(ranking_text.rfind(word) for word in _RANKING_HEADER_WORDS)
+    if keyword >= 0:
+        header = None
+        for header in _RANKING_HEADER_RE.finditer(ranking_text, max(0, keyword - 32), keyword + 32):
+            pass
+        if header is not None:
+            return header.end()
+
+    section_start = 0
+    for header in _RANKING_HEADER_RE.finditer(ranking_text):
+        section_start = header.end()
+    return section_start
 
 
 def parse_ranking_from_text(ranking_text: str) -> List[str]:
     """
     Parse the FINAL RANKING section from the model's response.
 
+    Accepts "FINAL RANKING:" or "ФИНАЛЬНЫЙ РЕЙТИНГ:" and "Response X" or "Ответ X"
+    labels with Latin or Cyrillic letters, in a single pass over the section.
+    Numbered entries are preferred; without them every label mention counts.
+
     Args:
         ranking_text: The full text response from the model
 
     Returns:
-        List of response labels in ranked order
+        List of response labels ("Response A", ...) in ranked order, without duplicates
     """
-    import re
-
-    # Look for "FINAL RANKING:" section
-    if "FINAL RANKING:" in ranking_text:
-        # Extract everything after "FINAL RANKING:"
-        parts = ranking_text.split("FINAL RANKING:")
-        if len(parts) >= 2:
-            ranking_section = parts[1]
-            # Try to extract numbered list format (e.g., "1. Response A")
-            # This pattern looks for: number, period, optional space, "Response X"
-            numbered_matches = re.findall(r'\d+\.\s*Response [A-Z]', ranking_section)
-            if numbered_matches:
-                # Extract just the "Response X" part
-                return [re.search(r'Response [A-Z]', m).group() for m in numbered_matches]
-
-            # Fallback: Extract all "Response X" patterns in order
-            matches = re.findall(r'Response [A-Z]', ranking_section)
-            return matches
-
-    # Fallback: try to find any "Response X" patterns in order
-    matches = re.findall(r'Response [A-Z]', ranking_text)
-    return matches
+    section_start = _ranking_section_start(ranking_text)
+
+    numbered: List[str] = []
+    mentioned: List[str] = []
+    for match in _RANKING_LABEL_RE.finditer(ranking_text, section_start):
+        letter = match.group(2)
+        label = "Response " + _CYRILLIC_LABELS.get(letter, letter)
+        if match.group(1):
+            if label not in numbered:
+                numbered.append(label)
+        elif label not in mentioned:
+            mentioned.append(label)
+
+    return numbered if numbered else mentioned
 
 
 def calculate_aggregate_rankings(
@@ -244,6 +421,11 @@ def calculate_aggregate_rankings(
     """
     Calculate aggregate rankings across all models.
 
+    Reuses 'parsed_ranking' stored by stage 2 and only parses reviews that lack it.
+    Besides the mean rank, each model gets a Borda score (n - position points per
+    review of n answers), a Copeland score (head-to-head majorities won) and its
+    row of the pairwise win matrix.
+
     Args:
         stage2_results: Rankings from each model
         label_to_model: Mapping from anonymous labels to model names
@@ -251,35 +433,48 @@ def calculate_aggregate_rankings(
     Returns:
         List of dicts with model name and average rank, sorted best to worst
     """
-    from collections import defaultdict
+    models = list(dict.fromkeys(label_to_model.values()))
+    index = {model: i for i, model in enumerate(models)}
+    count = len(models)
 
-    # Track positions for each model
-    model_positions = defaultdict(list)
+    position_sums = [0] * count
+    rankings_counts = [0] * count
+    borda = [0] * count
+    # wins[a][b]: number of reviewers that ranked a above b
+    wins = [[0] * count for _ in range(count)]
 
     for ranking in stage2_results:
-        ranking_text = ranking['ranking']
-
-        # Parse the ranking from the structured format
-        parsed_ranking = parse_ranking_from_text(ranking_text)
-
-        for position, label in enumerate(parsed_ranking, start=1):
-            if label in label_to_model:
-                model_name = label_to_model[label]
-                model_positions[model_name].append(position)
+        parsed_ranking = ranking.get('parsed_ranking')
+        if parsed_ranking is None:
+            parsed_ranking = parse_ranking_from_text(ranking['ranking'])
+
+        ranked = [index[label_to_model[label]] for label in parsed_ranking if label in label_to_model]
+        size = len(ranked)
+        for position, model_index in enumerate(ranked, start=1):
+            position_sums[model_index] += position
+            rankings_counts[model_index] += 1
+            borda[model_index] += size - position
+            row = wins[model_index]
+            for lower in ranked[position:]:
+                row[lower] += 1
 
     # Calculate average position for each model
     aggregate = []
-    for model, positions in model_positions.items():
-        if positions:
-            avg_rank = sum(positions) / len(positions)
-            aggregate.append({
-                "model": model,
-                "average_rank": round(avg_rank, 2),
-                "rankings_count": len(positions)
-            })
-
-    # Sort by average rank (lower is better)
-    aggregate.sort(key=lambda x: x['average_rank'])
+    for i, model in enumerate(models):
+        if not rankings_counts[i]:
+            continue
+        copeland = sum(1 for j in range(count) if wins[i][j] > wins[j][i])
+        aggregate.append({
+            "model": model,
+            "average_rank": round(position_sums[i] / rankings_counts[i], 2),
+            "rankings_count": rankings_counts[i],
+            "borda_score": borda[i],
+            "copeland_score": copeland,
+            "pairwise_wins": {models[j]: wins[i][j] for j in range(count) if j != i}
+        })
+
+    # Sort by average rank (lower is better), ties broken by Borda score
+    aggregate.sort(key=lambda x: (x['average_rank'], -x['borda_score']))
 
     return aggregate
 
@@ -303,8 +498,8 @@ Title:"""
 
     messages = [{"role": "user", "content": title_prompt}]
 
-    # Use gemini-2.5-flash for title generation (fast and cheap)
-    response = await query_model("google/gemini-2.5-flash", messages, timeout=30.0)
+    # A fast and cheap model (CONVERSATION_MODEL, gemini-2.5-flash by default)
+    response = await query_model(CONVERSATION_MODEL, messages, timeout=30.0)
 
     if response is None:
         # Fallback to a generic title
@@ -322,48 +517,6 @@ Title:"""
     return title
 
 
-async def run_full_council(user_query: str) -> Tuple[List, List, Dict, Dict]:
-    """
-    Run the complete 3-stage council process.
-
-    Args:
-        user_query: The user's question
-
-    Returns:
-        Tuple of (stage1_results, stage2_results, stage3_result, metadata)
-    """
-    # Stage 1: Collect individual responses
-    stage1_results = await stage1_collect_responses(user_query)
-
-    # If no models responded successfully, return error
-    if not stage1_results:
-        return [], [], {
-            "model": "error",
-            "response": "All models failed to respond. Please try again."
-        }, {}
-
-    # Stage 2: Collect rankings
-    stage2_results, label_to_model = await stage2_collect_rankings(user_query, stage1_results)
-
-    # Calculate aggregate rankings
-    aggregate_rankings = calculate_aggregate_rankings(stage2_results, label_to_model)
-
-    # Stage 3: Synthesize final answer
-    stage3_result = await stage3_synthesize_final(
-        user_query,
-        stage1_results,
-        stage2_results
-    )
-
-    # Prepare metadata
-    metadata = {
-        "label_to_model": label_to_model,
-        "aggregate_rankings": aggregate_rankings
-    }
-
-    return stage1_results, stage2_results, stage3_result, metadata
-
-
 def format_for_frontend(
     stage1_results: List[Dict[str, Any]], 
     stage2_results: List[Dict[str, Any]], 
@@ -408,225 +561,398 @@ def format_for_frontend(
     }
 
 
-async def stage1_collect_responses_stream(user_query: str) -> AsyncIterator[Dict[str, Any]]:
-    """
-    Stage 1: Stream individual responses from all council models.
-    
-    Args:
-        user_query: The user's question
-        
-    Yields:
-        Dict with streaming events for stage 1
-    """
-    from .polzaai import query_models_stream
-    messages = [{"role": "user", "content": user_query}]
-    
-    # Stream responses from models
-    yield {"stage": "stage1", "status": "started"}
-    
-    async for model, response in query_models_stream(COUNCIL_MODELS, messages):
-        if response is not None:  # Only include successful responses
-            yield {
-                "stage": "stage1",
-                "model": extract_short_model_name(model),
-                "response": response.get('content', '')
-            }
-    
-    yield {"stage": "stage1", "status": "completed"}
+def _question(run: GraphRun) -> str:
+    """The run's question as the stages see it: with the conversation context on follow-up turns."""
+    context = run.options.get("context")
+    if not context:
+        return run.user_query
+    return CONVERSATION_PROMPT_TEMPLATE.format(context=context, user_query=run.user_query)
 
 
-async def stage2_collect_rankings_stream(
-    user_query: str,
-    stage1_results: List[Dict[str, Any]]
-) -> AsyncIterator[Dict[str, Any]]:
+def _review(answer: Dict[str, Any], plan: List[Tuple[str, Optional[Tuple[int, int]]]]) -> Dict[str, Any]:
+    """One stage 2 result; a head-to-head verdict is limited to the pair it compared."""
+    parsed_ranking = parse_ranking_from_text(answer["response"])
+    pair = plan[answer["call"]][1] if "call" in answer else None
+    if pair is None:
+        return {"model": answer["model"], "ranking": answer["response"], "parsed_ranking": parsed_ranking}
+
+    labels = [f"Response {chr(65 + index)}" for index in pair]
+    parsed_ranking = [label for label in parsed_ranking if label in labels]
+    if len(parsed_ranking) == 1:
+        # Only the winner was named
+        parsed_ranking += [label for label in labels if label not in parsed_ranking]
+    return {
+        "model": answer["model"],
+        "ranking": answer["response"],
+        "parsed_ranking": parsed_ranking,
+        "pair": labels
+    }
+
+
+def _collect_reviews(run: GraphRun, answers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the stage 2 output: reviews with their parsed rankings, and the label mapping."""
+    label_to_model, _ = anonymize_responses(run.outputs["stage1"])
+    plan = run.notes.get("review_plan", [])
+    return {
+        "results": [_review(answer, plan) for answer in answers],
+        "label_to_model": label_to_model,
+        "consensus": run.notes.get("consensus"),
+        "strategy": run.notes.get("review_strategy")
+    }
+
+
+def _review_members(run: GraphRun) -> List[str]:
     """
-    Stage 2: Stream rankings from each model for the anonymized responses.
-    
-    Args:
-        user_query: The original user query
-        stage1_results: Results from Stage 1
-        
-    Yields:
-        Dict with streaming events for stage 2
+    Reviewers of the run, one entry per review call.
+
+    The review strategy comes from the request or REVIEW_STRATEGY (see
+    services.review). When the stage 1 answers agree, the consensus action
+    overrides it: no reviewers, or the first CONSENSUS_REVIEWERS members.
     """
-    from .polzaai import query_models_stream
-    # Create anonymized labels for responses (Response A, Response B, etc.)
-    labels = [chr(65 + i) for i in range(len(stage1_results))]  # A, B, C, ...
+    consensus = run.notes["consensus"] = check_consensus(run.outputs["stage1"])
+    strategy = run.options.get("review_strategy") or REVIEW_STRATEGY
+    if consensus["action"] == "skip":
+        strategy, plan = "skipped", []
+    elif consensus["action"] == "shrink":
+        strategy = "consensus"
+        plan = [(member, None) for member in council_members()[:max(CONSENSUS_REVIEWERS, 1)]]
+    else:
+        plan = plan_reviews(
+            strategy,
+            council_members(),
+            [result["model"] for result in run.outputs["stage1"]],
+            REVIEW_JUDGE_MODEL or chairman_model()
+        )
+    run.notes["review_strategy"] = strategy
+    run.notes["review_plan"] = plan
+    return [reviewer for reviewer, _ in plan]
 
-    # Create mapping from label to model name
-    label_to_model = {
-        f"Response {label}": result['model']
-        for label, result in zip(labels, stage1_results)
-    }
 
-    # Build the ranking prompt
-    responses_text = "\n\n".join([
-        f"Response {label}:\n{result['response']}"
-        for label, result in zip(labels, stage1_results)
-    ])
+def _review_prompts(run: GraphRun) -> Any:
+    """The ranking prompt for every reviewer, or one comparison prompt per head-to-head call."""
+    plan = run.notes["review_plan"]
+    if all(pair is None for _, pair in plan):
+        return build_ranking_prompt(_question(run), run.outputs["stage1"])[1]
+    return [build_pairwise_prompt(_question(run), run.outputs["stage1"], pair) for _, pair in plan]
 
-    ranking_prompt = f"""Ты оцениваешь различные ответы на следующий вопрос:
-Вопрос: {user_query}
 
-Вот ответы от разных моделей (анонимизированы):
+def _consensus(run: GraphRun) -> Optional[Dict[str, Any]]:
+    """Consensus check the run's stage 2 was based on, if any."""
+    return run.outputs.get("stage2", {}).get("consensus")
 
-{responses_text}
 
-Твоя задача:
-1. Сначала оцени каждый ответ отдельно. Для каждого ответа объясни, что он делает хорошо и что плохо.
-2. Затем, в самом конце своего ответа, предоставь финальный рейтинг.
+def _collect_synthesis(run: GraphRun, answers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the stage 3 output from the chairman's answer, or the error fallback."""
+    if not answers:
+        return {"model": chairman_model(), "response": CHAIRMAN_ERROR_RESPONSE}
+    return {"model": answers[0]["model"], "response": answers[0]["response"]}
 
-ВАЖНО: Твой финальный рейтинг ДОЛЖЕН быть отформатирован ТОЧНО И СТРОГО следующим образом:
-- Начни со строки "ФИНАЛЬНЫЙ РЕЙТИНГ:" (все буквы заглавные, с двоеточием)
-- Затем перечисли ответы от лучшего к худшему как нумерованный список
-- Каждая строка должна быть: номер, точка, пробел, затем ТОЛЬКО метка ответа (например, "1. Ответ А")
-- Не добавляй никакой другой текст или объяснения в разделе рейтинга
 
-Пример правильного формата для ВСЕГО твоего ответа:
+def _stage2_results(run: GraphRun) -> List[Dict[str, Any]]:
+    """Reviews of the run, or none if the graph has no review stage."""
+    return run.outputs.get("stage2", {}).get("results", [])
 
-Ответ А предоставляет хорошие детали по X, но упускает Y...
-Ответ B точен, но не хватает глубины по Z...
-Ответ C предлагает наиболее полный ответ...
 
-ФИНАЛЬНЫЙ РЕЙТИНГ:
-1. Ответ C
-2. Ответ A
-3. Ответ B
+def _label_to_model(run: GraphRun) -> Dict[str, str]:
+    """Label mapping of the run's stage 1 answers."""
+    if "stage2" in run.outputs:
+        return run.outputs["stage2"]["label_to_model"]
+    return anonymize_responses(run.outputs.get("stage1", []))[0]
 
-Теперь предоставь свою оценку и рейтинг:"""
 
-    messages = [{"role": "user", "content": ranking_prompt}]
-    
-    # Stream rankings from models
-    yield {"stage": "stage2", "status": "started"}
-    
-    async for model, response in query_models_stream(COUNCIL_MODELS, messages):
-        if response is not None:
-            full_text = response.get('content', '')
-            parsed = parse_ranking_from_text(full_text)
-            yield {
-                "stage": "stage2",
-                "model": extract_short_model_name(model),
-                "response": full_text  # Using 'response' instead of 'ranking' for consistency with stream
-            }
-    
-    yield {"stage": "stage2", "status": "completed"}
+def _rank_spread(run: GraphRun) -> float:
+    """Gap between the best and worst average rank of the run's reviews (0 without reviews)."""
+    ranks = [
+        entry["average_rank"]
+        for entry in calculate_aggregate_rankings(_stage2_results(run), _label_to_model(run))
+    ]
+    return max(ranks) - min(ranks) if len(ranks) > 1 else 0.0
 
 
-async def stage3_synthesize_final_stream(
-    user_query: str,
-    stage1_results: List[Dict[str, Any]],
-    stage2_results: List[Dict[str, Any]]
-) -> AsyncIterator[Dict[str, Any]]:
-    """
-    Stage 3: Stream chairman's synthesis of the final response.
-    
-    Args:
-        user_query: The original user query
-        stage1_results: Individual model responses from Stage 1
-        stage2_results: Rankings from Stage 2
-        
-    Yields:
-        Dict with streaming events for stage 3
+def _draft_rejected(run: GraphRun) -> bool:
+    """Whether the reviews rule out the speculative draft, so it can be cancelled."""
+    return "stage2" in run.outputs and _rank_spread(run) > SPECULATIVE_MAX_RANK_SPREAD
+
+
+def _reuse_draft(run: GraphRun) -> Optional[Dict[str, Any]]:
     """
-    from .polzaai import query_model  # Using single query_model for chairman
-    # Build comprehensive context for chairman
-    stage1_text = "\n\n".join([
-        f"Model: {result['model']}\nResponse: {result['response']}"
-        for result in stage1_results
-    ])
+    Accept or reject the speculative draft once the reviews are in.
 
-    stage2_text = "\n\n".join([
-        f"Model: {result['model']}\nRanking: {result['response']}"  # Using 'response' from stream
-        for result in stage2_results
-    ])
+    The draft saw no reviews, so it is kept only if the reviewers found no clear
+    winner or loser (rank spread within SPECULATIVE_MAX_RANK_SPREAD). The outcome,
+    the latency saved by an accepted draft and the time spent on a discarded one
+    go into the run's notes and the speculation metrics.
 
-    chairman_prompt = f"""Ты — Председатель Совета LLM. Несколько AI-моделей предоставили ответы на вопрос пользователя и затем ранжировали ответы друг друга.
+    Returns:
+        The draft as the stage 3 output, or None to run the full synthesis
+    """
+    draft = run.outputs.get("draft")
+    spread = _rank_spread(run)
+    timeline = run.timeline.get("draft", {})
+    draft_seconds = timeline.get("finished", 0.0) - timeline.get("started", 0.0)
+
+    saved = wasted = 0.0
+    if draft is not None and spread <= SPECULATIVE_MAX_RANK_SPREAD:
+        outcome = "accepted"
+        # Without the draft, the synthesis would have started when the reviews finished
+        saved = max(0.0, min(draft_seconds, run.timeline["stage2"]["finished"] - timeline["started"]))
+        SPECULATION_SECONDS.inc(saved, kind="saved")
+    else:
+        outcome = "failed" if draft is None and not timeline.get("cancelled") else "rejected"
+        wasted = draft_seconds
+        SPECULATION_SECONDS.inc(wasted, kind="wasted")
+    SPECULATION_OUTCOMES.inc(outcome=outcome)
+
+    run.notes["speculation"] = {
+        "outcome": outcome,
+        "rank_spread": round(spread, 2),
+        "max_rank_spread": SPECULATIVE_MAX_RANK_SPREAD,
+        "draft_seconds": round(draft_seconds, 3),
+        "saved_seconds": round(saved, 3),
+        "wasted_seconds": round(wasted, 3)
+    }
+    return draft if outcome == "accepted" else None
 
-Исходный вопрос: {user_query}
 
-ЭТАП 1 — Индивидуальные ответы:
-{stage1_text}
+def build_council_graph(speculative: bool = COUNCIL_SPECULATIVE_CHAIRMAN) -> List[StageNode]:
+    """
+    Build the council pipeline: answers, peer review of the anonymized answers, synthesis.
 
-ЭТАП 2 — Взаимное ранжирование:
-{stage2_text}
+    Peer review follows the run's review strategy, and is skipped or shrunk when
+    the answers already agree (_review_members).
+    Stage 3 reads the reviews through _stage2_results, so a graph without the review
+    node (or with more nodes feeding the chairman) needs no other changes.
 
-Твоя задача как Председателя — синтезировать всю эту информацию в один единственный, комплексный, точный ответ на исходный вопрос пользователя. Рассмотри:
-- Индивидуальные ответы и их инсайты
-- Взаимное ранжирование и то, что оно раскрывает о качестве ответов
-- Любые паттерны согласия или разногласия
+    Args:
+        speculative: Also run a hidden chairman draft from the stage 1 answers while
+            stage 2 runs; stage 3 reuses it if the reviews accept it (_reuse_draft)
 
-Предоставь чёткий, хорошо аргументированный финальный ответ, который представляет коллективную мудрость совета:"""
+    Returns:
+        Nodes for execute_graph
+    """
+    graph = [
+        StageNode(
+            "stage1",
+            models=lambda run: council_members(),
+            prompt=_question,
+            collect=lambda run, answers: answers,
+            answers=lambda output: output,
+            quorum=STAGE1_QUORUM,
+            deadline=STAGE1_DEADLINE,
+            budget=STAGE_BUDGETS["stage1"],
+            templates=[CONVERSATION_PROMPT_TEMPLATE],
+            options=("context",),
+            required="All models failed to respond. Please try again."
+        ),
+        StageNode(
+            "stage2",
+            models=_review_members,
+            prompt=_review_prompts,
+            collect=_collect_reviews,
+            answers=lambda output: [
+                {"model": result["model"], "response": result["ranking"]}
+                for result in output["results"]
+            ],
+            deps=("stage1",),
+            quorum=STAGE2_QUORUM,
+            deadline=STAGE2_DEADLINE,
+            budget=STAGE_BUDGETS["stage2"],
+            templates=[RANKING_PROMPT_TEMPLATE, PAIRWISE_PROMPT_TEMPLATE],
+            options=("review_strategy", "context")
+        ),
+        StageNode(
+            "stage3",
+            models=lambda run: [chairman_model()],
+            prompt=lambda run: build_chairman_prompt(
+                _question(run), run.outputs["stage1"], _stage2_results(run), _consensus(run)
+            ),
+            collect=_collect_synthesis,
+            answers=lambda output: [output],
+            deps=("stage1", "stage2", "draft") if speculative else ("stage1", "stage2"),
+            # The draft differs on every run; keyed on it, stage 3 would never hit the cache
+            unkeyed=("draft",),
+            budget=STAGE_BUDGETS["stage3"],
+            templates=[
+                RANKING_PROMPT_TEMPLATE, PAIRWISE_PROMPT_TEMPLATE,
+                CHAIRMAN_PROMPT_TEMPLATE, CONSENSUS_CHAIRMAN_PROMPT_TEMPLATE
+            ],
+            options=("context",),
+            fallback=CHAIRMAN_ERROR_RESPONSE,
+            reuse=_reuse_draft if speculative else None
+        ),
+    ]
+    if speculative:
+        graph.append(StageNode(
+            "draft",
+            models=lambda run: [chairman_model()],
+            prompt=lambda run: build_chairman_prompt(
+                _question(run), run.outputs["stage1"], [], draft=True
+            ),
+            collect=lambda run, answers: _collect_synthesis(run, answers) if answers else None,
+            answers=lambda output: [output],
+            deps=("stage1",),
+            budget=STAGE_BUDGETS["stage3"],
+            templates=[DRAFT_CHAIRMAN_PROMPT_TEMPLATE],
+            options=("context",),
+            hidden=True,
+            cancel_when=_draft_rejected
+        ))
+    return graph
+
+
+COUNCIL_GRAPH = build_council_graph()
+
+
+async def _council_events(
+    run: GraphRun,
+    graph: List[StageNode],
+    stream_tokens: bool
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Execute a council graph for a run and yield its events, then the run metadata.
+
+    Members are chosen from healthy models when the run starts (see
+    services.health). In a conversation, the stages see the context of the
+    earlier turns, the first turn starts generating the conversation title
+    alongside stage 1, and the finished run is appended as a new turn. A
+    finished one-shot run is stored in the near-duplicate index instead. The
+    final {"stage": "metadata"} event reports the label mapping, aggregate
+    rankings, cached stages, the retries and hedges of the run, its stage/call
+    timings, prompt budgets, council composition, the stage 1 consensus check,
+    the review strategy, the outcome of a speculative chairman draft and the
+    conversation turn.
+
+    Raises:
+        KeyError: If the run's conversation doesn't exist
+    """
+    # Retries, hedges and exhausted budgets of this run's upstream calls (shared with stage tasks)
+    resilience_report = new_run_report()
+    # Stage wall times and per-call latency/tokens of this run (shared with stage tasks)
+    timings = new_run_timings()
+    # Token budgets and excerpts of this run's stage 2 and chairman prompts (shared with stage tasks)
+    prompt_report = new_prompt_report()
+    # Members and chairman of this run, chosen from healthy models (shared with stage tasks)
+    council = new_run_council()
+
+    conversation_id = run.options.get("conversation_id")
+    if conversation_id:
+        store = get_conversation_store()
+        context = await store.context(conversation_id)
+        if context is None:
+            raise KeyError(f"Conversation not found: {conversation_id}")
+        run.options["context"] = context
+        if not context:
+            # First turn: the title is ready long before the synthesis
+            store.generate_title(conversation_id, generate_conversation_title(run.user_query))
+
+    async for event in execute_graph(graph, run, stream_tokens):
+        yield event
 
-    messages = [{"role": "user", "content": chairman_prompt}]
-    
-    # Stream chairman's response
-    yield {"stage": "stage3", "status": "started"}
-    
-    response = await query_model(CHAIRMAN_MODEL, messages)
-    
-    if response is None:
-        # Fallback if chairman fails
-        yield {
-            "stage": "stage3",
-            "response": "Error: Unable to generate final synthesis."
-        }
+    if not run.finished(graph):
+        # A required stage failed and already reported the error
+        return
+
+    result = format_for_frontend(
+        run.outputs.get("stage1", []), _stage2_results(run), run.outputs.get("stage3", {})
+    )
+    turn = None
+    if conversation_id:
+        turn = await get_conversation_store().append_turn(conversation_id, run.user_query, result)
     else:
-        yield {
-            "stage": "stage3",
-            "model": extract_short_model_name(CHAIRMAN_MODEL),
-            "response": response.get('content', '')
-        }
+        # Offer the result to later paraphrases of the question (services.semantic_cache)
+        index = get_semantic_cache()
+        if index is not None and result["consensus"] != CHAIRMAN_ERROR_RESPONSE:
+            try:
+                await index.add(run.user_query, result, run.options.get("review_strategy") or REVIEW_STRATEGY)
+            except Exception as e:
+                logger.warning("Near-duplicate index update failed: %s", e)
+
+    # Run metadata for clients and monitoring
+    label_to_model = _label_to_model(run)
+    yield {
+        "stage": "metadata",
+        "label_to_model": label_to_model,
+        "aggregate_rankings": calculate_aggregate_rankings(_stage2_results(run), label_to_model),
+        "cached_stages": run.cached,
+        "resilience": resilience_report,
+        "timings": timings,
+        "prompt_budget": prompt_report,
+        "council": council,
+        "consensus": _consensus(run),
+        "review_strategy": run.outputs.get("stage2", {}).get("strategy"),
+        "speculation": run.notes.get("speculation"),
+        "conversation": {"id": conversation_id, "turn": turn} if conversation_id else None
+    }
+
+
+async def run_full_council(
+    user_query: str,
+    cache_stages: Optional[List[str]] = None,
+    review_strategy: Optional[str] = None,
+    conversation_id: Optional[str] = None
+) -> Tuple[List, List, Dict, Dict]:
+    """
+    Run the complete 3-stage council process.
 
-    yield {"stage": "stage3", "status": "completed"}
+    Executes COUNCIL_GRAPH exactly like run_full_council_stream, without token
+    deltas, and assembles the results of its stages.
 
+    Args:
+        user_query: The user's question
+        cache_stages: Stages that may be served from cache (None = all, [] = bypass)
+        review_strategy: Stage 2 review strategy (None = REVIEW_STRATEGY)
+        conversation_id: Conversation the question continues (None = one-shot)
 
-async def run_full_council_stream(user_query: str) -> AsyncIterator[Dict[str, Any]]:
+    Returns:
+        Tuple of (stage1_results, stage2_results, stage3_result, metadata)
+    """
+    run = GraphRun(user_query, cache_stages, {
+        "review_strategy": review_strategy or REVIEW_STRATEGY,
+        "conversation_id": conversation_id
+    })
+    metadata: Dict[str, Any] = {}
+    async for event in _council_events(run, COUNCIL_GRAPH, stream_tokens=False):
+        if event["stage"] == "error":
+            return [], [], {"model": "error", "response": event["response"]}, {}
+        if event["stage"] == "metadata":
+            metadata = {key: value for key, value in event.items() if key != "stage"}
+
+    return run.outputs["stage1"], _stage2_results(run), run.outputs["stage3"], metadata
+
+
+async def run_full_council_stream(
+    user_query: str,
+    cache_stages: Optional[List[str]] = None,
+    review_strategy: Optional[str] = None,
+    conversation_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
     """
     Run the complete 3-stage council process with streaming updates.
-    
+
+    Executes COUNCIL_GRAPH (see services.pipeline.execute_graph). Stage 1 and
+    stage 2 close as soon as their configured quorum or deadline is met
+    (STAGE1_QUORUM/STAGE1_DEADLINE, STAGE2_QUORUM/STAGE2_DEADLINE), so the next
+    stage starts on the answers collected so far instead of waiting for the
+    slowest model. Stages found in the council cache are replayed as the same
+    event sequence. If the consumer stops iterating (the client disconnected, or
+    the last subscriber of a coalesced run left), every running stage is
+    cancelled, which cancels its outstanding upstream requests and releases
+    their pooled connections. A final {"stage": "metadata"} event reports
+    aggregate rankings, the retries and hedges of the run, its stage/call
+    timings, prompt budgets and council composition.
+
     Args:
         user_query: The user's question
-        
+        cache_stages: Stages that may be served from cache (None = all, [] = bypass)
+        review_strategy: Stage 2 review strategy (None = REVIEW_STRATEGY)
+        conversation_id: Conversation the question continues (None = one-shot)
+
     Yields:
         Dict with streaming events for the entire council process
     """
-    # Collect results for stage 2
-    stage1_results = []
-    
-    # Stage 1: Stream individual responses
-    async for event in stage1_collect_responses_stream(user_query):
-        yield event
-        # Collect successful stage 1 results for stage 2
-        if event.get("stage") == "stage1" and event.get("model") and event.get("response"):
-            stage1_results.append({
-                "model": event["model"],
-                "response": event["response"]
-            })
-    
-    # If no models responded successfully, return error
-    if not stage1_results:
-        yield {
-            "stage": "error",
-            "status": "error",
-            "response": "All models failed to respond. Please try again."
-        }
-        # Don't send done event if there's an error
-        return
-
-    # Collect results for stage 3
-    stage2_results = []
-    
-    # Stage 2: Stream rankings
-    async for event in stage2_collect_rankings_stream(user_query, stage1_results):
-        yield event
-        # Collect successful stage 2 results for stage 3
-        if event.get("stage") == "stage2" and event.get("model") and event.get("response"):
-            stage2_results.append({
-                "model": event["model"],
-                "response": event["response"]  # Using 'response' from stream
-            })
-
-    # Stage 3: Stream final synthesis
-    async for event in stage3_synthesize_final_stream(user_query, stage1_results, stage2_results):
+    run = GraphRun(user_query, cache_stages, {
+        "review_strategy": review_strategy or REVIEW_STRATEGY,
+        "conversation_id": conversation_id
+    })
+    async for event in _council_events(run, COUNCIL_GRAPH, COUNCIL_STREAM_TOKENS):
         yield event
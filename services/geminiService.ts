@@ -77,6 +77,13 @@ export const executeCouncilDeliberationStream = (
               try {
                 const eventData = JSON.parse(line.substring(6)); // Убираем 'data: ' префикс
 
+                // Опоздавшие ответы (STRAGGLER_POLICY=attach) приходят после завершения
+                // этапа и в его результат не вошли, поэтому не показываем их как мнения
+                if (eventData.status === 'late') {
+                  console.log(`Late answer for ${eventData.stage} from ${eventData.model}`);
+                  continue;
+                }
+
                 // Обработка событий по этапам
                 switch (eventData.stage) {
                   case 'stage1':
@@ -0,0 +1,352 @@
+"""Model health registry: EWMA latency/error rate, circuit breakers and council selection."""
+
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .config import (
+    COUNCIL_MODELS,
+    CHAIRMAN_MODEL,
+    COUNCIL_STANDBY_MODELS,
+    COUNCIL_MIN_SIZE,
+    MODEL_HEALTH_ENABLED,
+    HEALTH_EWMA_ALPHA,
+    BREAKER_FAILURES,
+    BREAKER_ERROR_RATE,
+    BREAKER_MIN_SAMPLES,
+    BREAKER_COOLDOWN,
+    HEALTH_SLOW_CALL,
+    HEALTH_PROBE_INTERVAL,
+)
+from .metrics import BREAKER_TRANSITIONS
+from .ratelimit import use_batch_priority
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Council chosen for the run the current task belongs to
+_run_council: ContextVar[Optional[Dict[str, Any]]] = ContextVar("run_council", default=None)
+
+
+class ModelHealth:
+    """
+    Live statistics and circuit breaker of one model.
+
+    closed: the model takes part in councils. open: it is left out for
+    BREAKER_COOLDOWN seconds. half_open: the next request (from a run or a
+    probe) is a trial; success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self.state = CLOSED
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_at: Optional[float] = None
+        self.last_call: Optional[float] = None
+
+    def _enter(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.info("Circuit breaker of %s: %s -> %s", self.model, self.state, state)
+        self.state = state
+        BREAKER_TRANSITIONS.inc(model=self.model, state=state)
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        self.trial_at = None
+
+    def record(self, ok: bool, seconds: Optional[float] = None) -> None:
+        """
+        Fold one finished call into the statistics and update the breaker.
+
+        Args:
+            ok: Whether the call succeeded
+            seconds: Call duration, used for the latency average of successful calls
+        """
+        self.samples += 1
+        self.last_call = time.monotonic()
+        self.error_rate += HEALTH_EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+
+        if ok:
+            if seconds is not None:
+                if self.latency is None:
+                    self.latency = seconds
+                else:
+                    self.latency += HEALTH_EWMA_ALPHA * (seconds - self.latency)
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                # Start over so the failures that opened the breaker don't trip it again
+                self.error_rate = 0.0
+                self.samples = 0
+                self._enter(CLOSED)
+            return
+
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            self._enter(OPEN)
+        elif self.state == CLOSED and (
+            self.consecutive_failures >= BREAKER_FAILURES
+            or (self.samples >= BREAKER_MIN_SAMPLES and self.error_rate >= BREAKER_ERROR_RATE)
+        ):
+            self._enter(OPEN)
+
+    def trial_due(self) -> bool:
+        """Whether the breaker is waiting for a trial request that nobody has sent yet."""
+        now = time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= BREAKER_COOLDOWN:
+            self._enter(HALF_OPEN)
+        # A trial that never reported back (e.g. its run was cancelled) is retried
+        return self.state == HALF_OPEN and (
+            self.trial_at is None or now - self.trial_at >= BREAKER_COOLDOWN
+        )
+
+    def allow(self) -> bool:
+        """
+        Decide whether a new request may go to the model.
+
+        In half-open state only one request is let through as the trial.
+
+        Returns:
+            True if the model may be used
+        """
+        if self.state == CLOSED:
+            return True
+        if self.trial_due():
+            self.trial_at = time.monotonic()
+            return True
+        return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return the model's statistics.
+
+        Returns:
+            Dict with breaker state, EWMA latency and error rate, sample and failure counts
+        """
+        return {
+            "state": self.state,
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "samples": self.samples,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+_registry: Dict[str, ModelHealth] = {}
+
+
+def health_of(model: str) -> ModelHealth:
+    """
+    Return the health record of a model, creating it on first use.
+
+    Args:
+        model: PolzaAI model identifier
+
+    Returns:
+        The model's health record
+    """
+    health = _registry.get(model)
+    if health is None:
+        health = _registry[model] = ModelHealth(model)
+    return health
+
+
+def record_call(model: str, status: str, seconds: float, ttfb: Optional[float] = None) -> None:
+    """
+    Feed the outcome of one upstream request into the model's health.
+
+    Rate limiting (429) and other client errors say nothing about the
+    provider's health and are ignored, as are cancelled requests: stragglers,
+    lost hedges and disconnected clients are cancelled however healthy the
+    model is. Slowness is judged by the time to the first byte, since long
+    answers legitimately take long to finish.
+
+    Args:
+        model: PolzaAI model identifier
+        status: HTTP status as a string, or "timeout", "error" or "cancelled"
+        seconds: How long the request took
+        ttfb: Seconds to the first byte or token (None = use `seconds`)
+    """
+    if status == "cancelled":
+        return
+    waited = seconds if ttfb is None else ttfb
+    slow = HEALTH_SLOW_CALL > 0 and waited >= HEALTH_SLOW_CALL
+    if status.isdigit():
+        code = int(status)
+        if code == 429 or (400 <= code < 500 and code != 408):
+            return
+        if code < 300:
+            health_of(model).record(not slow, seconds)
+            return
+    health_of(model).record(False)
+
+
+def select_council(claim_trials: bool = True) -> Dict[str, Any]:
+    """
+    Choose council members and chairman for a new run from healthy models.
+
+    Members with an open breaker are left out; standby models fill the council
+    up to COUNCIL_MIN_SIZE. If even that isn't enough, the least failing of the
+    excluded members are kept, since a degraded council beats no council.
+
+    Args:
+        claim_trials: Whether a model waiting for its breaker trial is taken as that
+            trial (False only predicts the council, e.g. for admission control)
+
+    Returns:
+        Dict with 'members', 'chairman', 'excluded' and 'substitutes'
+    """
+    if not MODEL_HEALTH_ENABLED:
+        return {"members": list(COUNCIL_MODELS), "chairman": CHAIRMAN_MODEL, "excluded": [], "substitutes": []}
+
+    def usable(model: str) -> bool:
+        health = health_of(model)
+        if claim_trials:
+            return health.allow()
+        return health.state == CLOSED or health.trial_due()
+
+    members = [model for model in COUNCIL_MODELS if usable(model)]
+    excluded = [model for model in COUNCIL_MODELS if model not in members]
+    min_size = min(COUNCIL_MIN_SIZE, len(COUNCIL_MODELS))
+
+    substitutes = []
+    for model in COUNCIL_STANDBY_MODELS:
+        if len(members) >= min_size:
+            break
+        if model not in members and usable(model):
+            members.append(model)
+            substitutes.append(model)
+
+    for model in sorted(excluded, key=lambda m: health_of(m).error_rate):
+        if len(members) >= min_size:
+            break
+        members.append(model)
+        excluded.remove(model)
+
+    # The chairman writes the final answer, so it must not be a trial request
+    chairman = CHAIRMAN_MODEL
+    if health_of(CHAIRMAN_MODEL).state != CLOSED:
+        healthy = [model for model in members if health_of(model).state == CLOSED]
+        if healthy:
+            chairman = healthy[0]
+
+    return {"members": members, "chairman": chairman, "excluded": excluded, "substitutes": substitutes}
+
+
+def new_run_council() -> Dict[str, Any]:
+    """
+    Choose the council of a new run and bind it to the current task.
+
+    Tasks created afterwards inherit it, so every stage of the run queries
+    the same members.
+
+    Returns:
+        The selection (see select_council)
+    """
+    selection = select_council()
+    if selection["excluded"] or selection["substitutes"] or selection["chairman"] != CHAIRMAN_MODEL:
+        logger.info(
+            "Council adjusted for model health: excluded %s, substitutes %s, chairman %s",
+            selection["excluded"], selection["substitutes"], selection["chairman"]
+        )
+    _run_council.set(selection)
+    return selection
+
+
+def admission_models() -> List[str]:
+    """
+    Return the models a run started now would query, for admission control.
+
+    Returns:
+        Members and chairman select_council would pick, without claiming breaker trials
+    """
+    selection = select_council(claim_trials=False)
+    return selection["members"] + [selection["chairman"]]
+
+
+def council_members() -> List[str]:
+    """
+    Return the council members of the current run.
+
+    Returns:
+        Members chosen by new_run_council, or COUNCIL_MODELS outside a run
+    """
+    selection = _run_council.get()
+    return selection["members"] if selection is not None else COUNCIL_MODELS
+
+
+def chairman_model() -> str:
+    """
+    Return the chairman of the current run.
+
+    Returns:
+        Chairman chosen by new_run_council, or CHAIRMAN_MODEL outside a run
+    """
+    selection = _run_council.get()
+    return selection["chairman"] if selection is not None else CHAIRMAN_MODEL
+
+
+def health_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Return the health of every model seen so far.
+
+    Returns:
+        Dict mapping model identifier to its snapshot
+    """
+    for model in COUNCIL_MODELS + COUNCIL_STANDBY_MODELS + [CHAIRMAN_MODEL]:
+        health_of(model)
+    return {model: health.snapshot() for model, health in _registry.items()}
+
+
+async def _probe_loop(probe: Callable[[str], Awaitable[Any]]) -> None:
+    # Probes give way to live traffic in the admission limiters
+    use_batch_priority()
+    while True:
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL)
+        now = time.monotonic()
+        due = []
+        for model in dict.fromkeys(COUNCIL_MODELS + COUNCIL_STANDBY_MODELS + [CHAIRMAN_MODEL]):
+            health = health_of(model)
+            if health.state != CLOSED:
+                if health.allow():
+                    due.append(model)
+            elif model in COUNCIL_STANDBY_MODELS and (
+                health.last_call is None or now - health.last_call >= HEALTH_PROBE_INTERVAL
+            ):
+                # Keep standby statistics fresh so substitutes are known to work
+                due.append(model)
+        if due:
+            await asyncio.gather(*(probe(model) for model in due), return_exceptions=True)
+
+
+_probe_task: Optional[asyncio.Task] = None
+
+
+async def start_probes(probe: Callable[[str], Awaitable[Any]]) -> None:
+    """
+    Start background health probes if HEALTH_PROBE_INTERVAL is set.
+
+    Args:
+        probe: Coroutine function sending one probe request to a model; its
+            outcome reaches the registry through record_call
+    """
+    global _probe_task
+    if HEALTH_PROBE_INTERVAL > 0 and MODEL_HEALTH_ENABLED and _probe_task is None:
+        _probe_task = asyncio.create_task(_probe_loop(probe))
+
+
+async def stop_probes() -> None:
+    """Stop the background health probes."""
+    global _probe_task
+    if _probe_task is not None:
+        _probe_task.cancel()
+        await asyncio.gather(_probe_task, return_exceptions=True)
+        _probe_task = None
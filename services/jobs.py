@@ -0,0 +1,448 @@
+"""Background council jobs with buffered, resumable event streams."""
+
+import asyncio
+import json
+import logging
+import math
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple, Union
+
+from .config import (
+    COUNCIL_COALESCE,
+    COUNCIL_JOB_WORKERS,
+    COUNCIL_JOB_MAX_QUEUE,
+    COUNCIL_JOB_EVENT_BUFFER,
+    COUNCIL_JOB_TTL,
+    SHARED_POLL_INTERVAL,
+)
+from .council import format_for_frontend, run_full_council_stream
+from .ratelimit import UpstreamOverloaded
+from .shared import SharedState, get_shared_state
+from .singleflight import coalesced_stream, run_key
+from .tracing import bind_run, current_run_id
+
+logger = logging.getLogger(__name__)
+
+
+class CouncilJob:
+    """
+    One council run executed in the background, detached from any HTTP connection.
+
+    Events are numbered from 1 and the last COUNCIL_JOB_EVENT_BUFFER (at least) are
+    kept, so a client can reconnect and continue after the last id it saw.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        cache_stages: Optional[List[str]] = None,
+        review_strategy: Optional[str] = None,
+        conversation_id: Optional[str] = None
+    ) -> None:
+        self.id = uuid.uuid4().hex
+        # The job's logs and trace carry the run id of the request that submitted it
+        self.run_id = current_run_id() or self.id
+        self.query = query
+        self.cache_stages = cache_stages
+        self.review_strategy = review_strategy
+        self.conversation_id = conversation_id
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+        # Ring buffer as a list trimmed in batches: (event id, event), oldest first
+        self.events: List[Tuple[int, Dict[str, Any]]] = []
+        self.last_event_id = 0
+        self._changed = asyncio.Event()
+
+        # Full answers collected for polling clients
+        self._opinions: List[Dict[str, Any]] = []
+        self._reviews: List[Dict[str, Any]] = []
+        self._consensus: Optional[Dict[str, Any]] = None
+        self._metadata: Optional[Dict[str, Any]] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def _notify(self) -> None:
+        # Wake current waiters and hand out a fresh event for the next wait
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def record(self, event: Dict[str, Any]) -> None:
+        """
+        Append an event to the buffer and wake attached clients.
+
+        Args:
+            event: Council stream event
+        """
+        self.last_event_id += 1
+        self.events.append((self.last_event_id, event))
+        if len(self.events) >= 2 * COUNCIL_JOB_EVENT_BUFFER:
+            del self.events[:-COUNCIL_JOB_EVENT_BUFFER]
+
+        if event.get("type") != "delta" and event.get("response") is not None:
+            stage = event.get("stage")
+            model = event.get("model_id", event.get("model"))
+            if stage == "stage1":
+                self._opinions.append({"model": model, "response": event["response"]})
+            elif stage == "stage2":
+                self._reviews.append({"model": model, "ranking": event["response"]})
+            elif stage == "stage3":
+                self._consensus = {"model": model, "response": event["response"]}
+        elif event.get("stage") == "metadata":
+            self._metadata = event
+
+        self._notify()
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        """
+        Mark the job finished and wake attached clients.
+
+        Args:
+            status: Final status ("completed", "failed" or "cancelled")
+            error: Error message for failed jobs
+        """
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self._notify()
+
+    async def follow(self, last_event_id: int = 0) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Iterate over the job's events after `last_event_id`, then follow it live.
+
+        Events that already fell out of the ring buffer are skipped.
+
+        Args:
+            last_event_id: Id of the last event the client received (0 = from the start)
+
+        Yields:
+            Tuple of (event id, event) until the job is finished
+        """
+        position = last_event_id
+        while True:
+            if self.events:
+                # Ids are consecutive, so the resume point is an offset into the buffer
+                start = max(position + 1 - self.events[0][0], 0)
+                for event_id, event in self.events[start:]:
+                    position = event_id
+                    yield event_id, event
+            if self.done and position >= self.last_event_id:
+                return
+            await self._changed.wait()
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Return the job status and, once it has finished, its result.
+
+        Returns:
+            Dict with id, status, timestamps, last_event_id, and 'result' in the
+            /council response format when the job completed
+        """
+        summary: Dict[str, Any] = {
+            "id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "last_event_id": self.last_event_id,
+        }
+        if self.error:
+            summary["error"] = self.error
+        if self.status == "completed" and self._consensus is not None:
+            summary["result"] = format_for_frontend(self._opinions, self._reviews, self._consensus)
+            if self._metadata is not None:
+                summary["metadata"] = {k: v for k, v in self._metadata.items() if k != "stage"}
+        return summary
+
+
+class RemoteJob:
+    """A job submitted to another worker, read from the shared state."""
+
+    def __init__(self, summary: Dict[str, Any], shared: SharedState) -> None:
+        self.id = summary["id"]
+        self._summary = summary
+        self._shared = shared
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Return the job status and result as last published by its worker.
+
+        Returns:
+            Dict in the CouncilJob.summary format
+        """
+        return self._summary
+
+    async def follow(self, last_event_id: int = 0) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Iterate over the job's events after `last_event_id`, then poll for new ones.
+
+        Args:
+            last_event_id: Id of the last event the client received (0 = from the start)
+
+        Yields:
+            Tuple of (event id, event) until the job is finished
+        """
+        position = last_event_id
+        while True:
+            # Events are published before the summary, so a finished summary means all are there
+            summary = await self._shared.get(f"job:{self.id}")
+            finished = summary is None or json.loads(summary)["finished_at"] is not None
+            # Ids are consecutive from 1, so event `position` + 1 is at list index `position`
+            for item in await self._shared.items(f"job-events:{self.id}", position):
+                event_id, event = json.loads(item)
+                if event_id > position:
+                    position = event_id
+                    yield event_id, event
+            if finished:
+                return
+            await asyncio.sleep(SHARED_POLL_INTERVAL)
+
+
+async def _publish_job(job: CouncilJob, shared: SharedState) -> None:
+    """Keep a job's summary and events in the shared state, so every worker can serve it."""
+    sent = 0
+    while True:
+        changed = job._changed
+        done = job.done
+        start = max(sent + 1 - job.events[0][0], 0) if job.events else 0
+        batch = job.events[start:]
+        try:
+            if batch:
+                await shared.append(
+                    f"job-events:{job.id}",
+                    [json.dumps(item, ensure_ascii=False, default=str) for item in batch],
+                    COUNCIL_JOB_TTL
+                )
+                sent = batch[-1][0]
+            await shared.set(
+                f"job:{job.id}", json.dumps(job.summary(), ensure_ascii=False, default=str), COUNCIL_JOB_TTL
+            )
+        except Exception as e:
+            logger.warning("Could not publish council job %s: %s", job.id, e)
+        if done:
+            return
+        await changed.wait()
+        # Events that arrive meanwhile go out in the next batch
+        await asyncio.sleep(SHARED_POLL_INTERVAL)
+
+
+async def _run_job(job: CouncilJob) -> None:
+    """Execute a job's council run, recording every event including the final one."""
+    job.status = "running"
+    bind_run(job.run_id)
+    if COUNCIL_COALESCE:
+        # A job and live streams for the same question share one upstream run
+        events = coalesced_stream(
+            run_key(job.query, job.cache_stages, job.review_strategy, job.conversation_id),
+            lambda: run_full_council_stream(
+                job.query,
+                cache_stages=job.cache_stages,
+                review_strategy=job.review_strategy,
+                conversation_id=job.conversation_id
+            )
+        )
+    else:
+        events = run_full_council_stream(
+            job.query,
+            cache_stages=job.cache_stages,
+            review_strategy=job.review_strategy,
+            conversation_id=job.conversation_id
+        )
+
+    failed = None
+    try:
+        async for event in events:
+            job.record(event)
+            if event.get("stage") == "error":
+                failed = event.get("response") or event.get("message")
+    except asyncio.CancelledError:
+        job.record({"stage": "error", "status": "cancelled", "message": "Job was cancelled"})
+        job.finish("cancelled")
+        raise
+    except UpstreamOverloaded as e:
+        job.record({
+            "stage": "error",
+            "status": "overloaded",
+            "message": str(e),
+            "retry_after": math.ceil(e.retry_after)
+        })
+        job.finish("failed", str(e))
+        return
+    except Exception as e:
+        job.record({"stage": "error", "status": "error", "message": str(e)})
+        job.finish("failed", str(e))
+        return
+
+    if failed:
+        job.finish("failed", failed)
+    else:
+        job.record({"stage": "done", "status": "completed"})
+        job.finish("completed")
+
+
+class JobRunner:
+    """Bounded worker pool executing queued council jobs."""
+
+    def __init__(self, workers: int, max_queue: int, ttl: float) -> None:
+        self.workers = workers
+        self.ttl = ttl
+        self.jobs: Dict[str, CouncilJob] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self._tasks: List[asyncio.Task] = []
+        self._publishers: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start the worker tasks if they aren't running."""
+        self._tasks = [task for task in self._tasks if not task.done()]
+        for _ in range(self.workers - len(self._tasks)):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        """Cancel the workers and the jobs they are running."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Finished jobs publish their last state; queued ones will never run here
+        for job in self.jobs.values():
+            if not job.done:
+                job.finish("cancelled")
+        await asyncio.gather(*self._publishers, return_exceptions=True)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await _run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Council job %s crashed: %s", job.id, e)
+                if not job.done:
+                    job.finish("failed", str(e))
+            finally:
+                self._queue.task_done()
+
+    def expire(self) -> None:
+        """Forget finished jobs older than the TTL."""
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def submit(
+        self,
+        query: str,
+        cache_stages: Optional[List[str]] = None,
+        review_strategy: Optional[str] = None,
+        conversation_id: Optional[str] = None
+    ) -> CouncilJob:
+        """
+        Queue a council job.
+
+        Args:
+            query: The user's question
+            cache_stages: Stages that may be served from cache (None = all, [] = bypass)
+            review_strategy: Stage 2 review strategy (None = REVIEW_STRATEGY)
+            conversation_id: Conversation the question continues (None = one-shot)
+
+        Returns:
+            The queued job
+
+        Raises:
+            UpstreamOverloaded: If the job queue is full
+        """
+        self.expire()
+        self.start()
+        job = CouncilJob(query, cache_stages, review_strategy, conversation_id)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise UpstreamOverloaded("council-jobs", retry_after=5.0)
+        self.jobs[job.id] = job
+        shared = get_shared_state()
+        if shared is not None:
+            publisher = asyncio.create_task(_publish_job(job, shared))
+            self._publishers.add(publisher)
+            publisher.add_done_callback(self._publishers.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[CouncilJob]:
+        """
+        Look up a job that hasn't expired.
+
+        Args:
+            job_id: Job id returned by submit
+
+        Returns:
+            The job, or None if it is unknown or expired
+        """
+        self.expire()
+        return self.jobs.get(job_id)
+
+    async def lookup(self, job_id: str) -> Optional[Union[CouncilJob, RemoteJob]]:
+        """
+        Look up a job submitted to this or (with shared state) any other worker.
+
+        Args:
+            job_id: Job id returned by submit
+
+        Returns:
+            The job, or None if it is unknown or expired
+        """
+        job = self.get(job_id)
+        if job is not None:
+            return job
+        shared = get_shared_state()
+        if shared is None:
+            return None
+        summary = await shared.get(f"job:{job_id}")
+        return RemoteJob(json.loads(summary), shared) if summary is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return worker pool counters.
+
+        Returns:
+            Dict with queued, running and stored job counts
+        """
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "running": sum(1 for job in self.jobs.values() if job.status == "running"),
+            "stored": len(self.jobs),
+        }
+
+
+_runner: Optional[JobRunner] = None
+
+
+def get_runner() -> JobRunner:
+    """
+    Return the process-wide job runner, creating it on first use.
+
+    Returns:
+        Job runner configured from COUNCIL_JOB_* settings
+    """
+    global _runner
+    if _runner is None:
+        _runner = JobRunner(COUNCIL_JOB_WORKERS, COUNCIL_JOB_MAX_QUEUE, COUNCIL_JOB_TTL)
+    return _runner
+
+
+async def start_jobs() -> None:
+    """Start the job workers. Called from the FastAPI app lifespan."""
+    get_runner().start()
+
+
+async def stop_jobs() -> None:
+    """Stop the job workers, cancelling running jobs."""
+    if _runner is not None:
+        await _runner.stop()
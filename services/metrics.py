@@ -0,0 +1,325 @@
+"""Latency/token instrumentation and Prometheus text exposition."""
+
+import os
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .config import COUNCIL_WORKERS
+
+# Latency buckets in seconds, from fast cache hits up to the 120 s request timeout
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90, 120, 180)
+
+# Prompt size buckets in (estimated) tokens
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 24000, 32000, 48000, 64000, 128000)
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(labelnames, values)
+    ]
+    if COUNCIL_WORKERS > 1:
+        # Each worker process keeps its own registry and a scrape reaches one of them;
+        # the label keeps their series apart instead of jumping between them
+        pairs.append('worker="%d"' % os.getpid())
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        total[0] += value
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, f'le="{bound:g}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            le = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total[0]:g}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Gauge whose samples are read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Dict[Tuple[str, ...], float]]
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+_REGISTRY: List[_Metric] = []
+
+UPSTREAM_REQUESTS = Counter(
+    "council_upstream_requests_total",
+    "Upstream chat-completions attempts by model and HTTP status (or error kind).",
+    ("model", "status")
+)
+UPSTREAM_SECONDS = Histogram(
+    "council_upstream_request_seconds",
+    "Wall time of upstream chat-completions attempts.",
+    ("model",)
+)
+UPSTREAM_TTFB_SECONDS = Histogram(
+    "council_upstream_ttfb_seconds",
+    "Time to first byte (response headers, or first token when streaming).",
+    ("model",)
+)
+UPSTREAM_TOKENS = Counter(
+    "council_upstream_tokens_total",
+    "Tokens reported in the upstream usage field.",
+    ("model", "kind")
+)
+STAGE_SECONDS = Histogram(
+    "council_stage_seconds",
+    "Wall time of council stages.",
+    ("stage",)
+)
+PROMPT_TOKENS = Histogram(
+    "council_prompt_tokens",
+    "Estimated size of stage 2 and chairman prompts after budgeting.",
+    ("stage",),
+    TOKEN_BUCKETS
+)
+PROMPT_TRUNCATIONS = Counter(
+    "council_prompt_truncations_total",
+    "Answers and reviews shortened to fit the prompt token budget.",
+    ("stage",)
+)
+CLIENT_DISCONNECTS = Counter(
+    "council_client_disconnects_total",
+    "SSE clients that went away before their council stream finished.",
+    ("endpoint",)
+)
+RUNS_ABANDONED = Counter(
+    "council_runs_abandoned_total",
+    "Streaming council runs stopped before completion because nobody was listening.",
+    ("stage",)
+)
+STAGE_TASKS_CANCELLED = Counter(
+    "council_stage_tasks_cancelled_total",
+    "Stage tasks (with their outstanding upstream requests) cancelled before finishing.",
+    ("stage",)
+)
+BATCH_QUERIES = Counter(
+    "council_batch_queries_total",
+    "Queries processed by /council/batch, by outcome.",
+    ("status",)
+)
+BREAKER_TRANSITIONS = Counter(
+    "council_breaker_transitions_total",
+    "Model circuit breaker state changes, by the state entered.",
+    ("model", "state")
+)
+CONSENSUS_DECISIONS = Counter(
+    "council_consensus_decisions_total",
+    "Stage 1 consensus checks, by decision (skip, shrink, none, disagree, too_few_answers).",
+    ("decision",)
+)
+SPECULATION_OUTCOMES = Counter(
+    "council_speculation_outcomes_total",
+    "Speculative chairman drafts, by outcome (accepted, rejected, failed).",
+    ("outcome",)
+)
+SPECULATION_SECONDS = Counter(
+    "council_speculation_seconds_total",
+    "Stage 3 latency saved by accepted drafts and draft time spent on discarded ones.",
+    ("kind",)
+)
+SEMANTIC_CACHE_LOOKUPS = Counter(
+    "council_semantic_cache_lookups_total",
+    "Near-duplicate index lookups, by outcome (hit, miss).",
+    ("outcome",)
+)
+LOG_RECORDS_DROPPED = Counter(
+    "council_log_records_dropped_total",
+    "Log and trace records dropped because the logging queue was full.",
+    ("kind",)
+)
+SSE_DELTAS_COALESCED = Counter(
+    "council_sse_deltas_coalesced_total",
+    "Token delta events merged into a preceding delta of the same answer before sending."
+)
+SSE_SLOW_CLIENTS = Counter(
+    "council_sse_slow_clients_total",
+    "SSE clients that fell SSE_CLIENT_BUFFER events behind, by action (drop_deltas, disconnect).",
+    ("action",)
+)
+
+# Per-run timings of the council run the current task belongs to
+_run_timings: ContextVar[Optional[Dict[str, Any]]] = ContextVar("run_timings", default=None)
+
+
+def new_run_timings() -> Dict[str, Any]:
+    """
+    Start collecting timings for a council run.
+
+    The timings are bound to the current task and inherited by tasks it creates.
+
+    Returns:
+        Dict with 'stages' (stage -> seconds) and 'calls' (per upstream attempt)
+    """
+    timings: Dict[str, Any] = {"stages": {}, "calls": []}
+    _run_timings.set(timings)
+    return timings
+
+
+def observe_upstream_call(
+    model: str,
+    status: str,
+    seconds: float,
+    ttfb: Optional[float] = None,
+    usage: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Record one upstream attempt in the metrics and in the current run's timings.
+
+    Args:
+        model: PolzaAI model identifier
+        status: HTTP status code as a string, or an error kind ("timeout", "error")
+        seconds: Wall time of the attempt
+        ttfb: Time to first byte/token, if known
+        usage: Upstream 'usage' dict with prompt_tokens/completion_tokens, if any
+    """
+    UPSTREAM_REQUESTS.inc(model=model, status=status)
+    UPSTREAM_SECONDS.observe(seconds, model=model)
+    if ttfb is not None:
+        UPSTREAM_TTFB_SECONDS.observe(ttfb, model=model)
+
+    prompt_tokens = completion_tokens = None
+    if usage:
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens:
+            UPSTREAM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        if completion_tokens:
+            UPSTREAM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+
+    timings = _run_timings.get()
+    if timings is not None:
+        timings["calls"].append({
+            "model": model,
+            "status": status,
+            "seconds": round(seconds, 3),
+            "ttfb": round(ttfb, 3) if ttfb is not None else None,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        })
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """
+    Record the duration of a council stage in the stage histogram and the current run's timings.
+
+    Args:
+        stage: Stage name ("stage1", "stage2" or "stage3")
+        seconds: Wall time of the stage
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _run_timings.get()
+    if timings is not None:
+        timings["stages"][stage] = round(seconds, 3)
+
+
+def render_metrics() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+
+    Returns:
+        Exposition text
+    """
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
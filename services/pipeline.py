@@ -0,0 +1,622 @@
+"""Declarative stage-graph executor for council runs."""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .polzaai import query_models_stream, query_models_token_stream
+from .cache import CACHE_STAGES, get_cache, stage_key
+from .metrics import RUNS_ABANDONED, STAGE_TASKS_CANCELLED, observe_stage
+from .resilience import stage_budget
+from .tracing import trace
+from .config import COUNCIL_STREAM_TOKENS, STRAGGLER_POLICY
+
+
+def extract_short_model_name(full_model_name: str) -> str:
+    """
+    Extract short model name for frontend compatibility.
+
+    Args:
+        full_model_name: Full model identifier like "google/gemini-3-flash-preview"
+
+    Returns:
+        Short name like "GEMINI" for frontend
+    """
+    model_mapping = {
+        "google/gemini": "GEMINI",
+        "google/gemini-": "GEMINI",
+        "openai/gpt": "GPT",
+        "openai/": "GPT",
+        "x-ai/grok": "GROK",
+        "x-ai/": "GROK",
+        "anthropic/claude": "CLAUDE",
+        "anthropic/": "CLAUDE"
+    }
+
+    # Find matching prefix
+    for prefix, short_name in model_mapping.items():
+        if full_model_name.startswith(prefix):
+            return short_name
+
+    # Fallback: use uppercase first part
+    return full_model_name.split('/')[0].upper()
+
+
+class GraphRun:
+    """
+    State of one execution of a stage graph.
+
+    Attributes:
+        user_query: The user's question
+        cache_stages: Stages that may be served from cache (None = all, [] = bypass)
+        options: Request options nodes read (e.g. the review strategy)
+        outputs: Output of every finished node, by node name
+        cached: Names of the nodes served from the cache
+        notes: Values nodes derive from the run and share (e.g. a consensus check)
+        timeline: perf_counter 'started'/'finished' times of every node, with
+            'cancelled': True for nodes cancelled by their cancel_when hook
+    """
+
+    def __init__(
+        self,
+        user_query: str,
+        cache_stages: Optional[List[str]] = None,
+        options: Optional[Dict[str, Any]] = None
+    ) -> None:
+        self.user_query = user_query
+        self.cache_stages = cache_stages
+        self.options: Dict[str, Any] = dict(options or {})
+        self.outputs: Dict[str, Any] = {}
+        self.cached: List[str] = []
+        self.notes: Dict[str, Any] = {}
+        self.timeline: Dict[str, Dict[str, Any]] = {}
+
+    def finished(self, graph: Sequence["StageNode"]) -> bool:
+        """Whether every node of the graph produced an output."""
+        return all(node.name in self.outputs for node in graph)
+
+
+class StageNode:
+    """
+    One stage of a council graph.
+
+    A node starts as soon as every node it depends on has an output. It sends its
+    prompt to each of its models (or one prompt per model), relays their answers
+    as stream events until all of them arrived or its quorum/deadline is met, and
+    turns the answers it collected into its output.
+
+    Attributes:
+        name: Stage name, used on events, metrics and cache keys
+        models: Returns the models to query when the node starts; with none, the
+            node is skipped and its output built from no answers
+        prompt: Builds the prompt from the run (outputs of the dependencies): one
+            string for every model, or a list with one prompt per entry of
+            `models` (which may then repeat a model)
+        collect: Builds the output from the run and the collected
+            {'model', 'response'} answers (full model ids, arrival order); with
+            per-model prompts each answer also has 'call', its index in `models`
+        answers: Turns a cached output back into answers to replay
+        deps: Names of the nodes whose outputs the prompt needs
+        unkeyed: Those of `deps` left out of the cache key, e.g. a nondeterministic
+            draft that is only an input to `reuse`
+        quorum: Successful answers needed to close the node early (0 = all)
+        deadline: Seconds after which the node closes once it has an answer (0 = none)
+        budget: Total time budget of the node's upstream calls (0 = none)
+        templates: Prompt templates that go into the node's cache key
+        options: Names of the run options that go into the node's cache key
+        fallback: Answer text reported when no model answered
+        required: Error message ending the run when no model answered
+        hidden: Run without relaying the node's events (e.g. a speculative draft)
+        cancel_when: Checked whenever another node finishes; once it returns True
+            the node is cancelled (or not started) and its output is None
+        reuse: Returns an output that makes the node's own queries unnecessary
+            (e.g. an accepted draft), or None; its answers are replayed with
+            "reused": True
+    """
+
+    def __init__(
+        self,
+        name: str,
+        models: Callable[[GraphRun], List[str]],
+        prompt: Callable[[GraphRun], str],
+        collect: Callable[[GraphRun, List[Dict[str, Any]]], Any],
+        answers: Callable[[Any], List[Dict[str, Any]]],
+        deps: Sequence[str] = (),
+        unkeyed: Sequence[str] = (),
+        quorum: int = 0,
+        deadline: float = 0,
+        budget: float = 0,
+        templates: Sequence[str] = (),
+        options: Sequence[str] = (),
+        fallback: Optional[str] = None,
+        required: Optional[str] = None,
+        hidden: bool = False,
+        cancel_when: Optional[Callable[[GraphRun], bool]] = None,
+        reuse: Optional[Callable[[GraphRun], Optional[Any]]] = None
+    ) -> None:
+        self.name = name
+        self.models = models
+        self.prompt = prompt
+        self.collect = collect
+        self.answers = answers
+        self.deps = tuple(deps)
+        self.unkeyed = tuple(unkeyed)
+        self.quorum = quorum
+        self.deadline = deadline
+        self.budget = budget
+        self.templates = list(templates)
+        self.options = tuple(options)
+        self.fallback = fallback
+        self.required = required
+        self.hidden = hidden
+        self.cancel_when = cancel_when
+        self.reuse = reuse
+
+
+class _NodeState:
+    """Progress of a running node: answers so far, quorum and deadline."""
+
+    def __init__(self, node: StageNode, size: int, now: float, key: Optional[str]) -> None:
+        self.node = node
+        self.key = key
+        self.started = time.perf_counter()
+        self.collected: List[Dict[str, Any]] = []
+        self.size = size
+        # A quorum equal to the number of models is the same as waiting for everyone
+        self.quorum = node.quorum if node.quorum < size else 0
+        self.deadline_at = now + node.deadline if node.deadline else None
+
+    def gate_met(self, now: float) -> bool:
+        """Whether the node may close before every model answered."""
+        if self.quorum and len(self.collected) >= self.quorum:
+            return True
+        return self.deadline_at is not None and now >= self.deadline_at and bool(self.collected)
+
+    def timeout(self, now: float) -> Optional[float]:
+        """Seconds until the deadline, or None if the node only waits for answers."""
+        if self.deadline_at is None or self.deadline_at <= now:
+            # Past the deadline with nothing usable yet: wait for the first answer
+            return None
+        return self.deadline_at - now
+
+
+# Marks the end of a node's event stream inside the executor queue
+_STAGE_END = object()
+
+
+async def _fan_out(
+    stage: str,
+    models: List[str],
+    messages: List[Dict[str, str]],
+    budget: float,
+    stream_tokens: bool
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Query models concurrently and turn their output into stream events.
+
+    With stream_tokens, token deltas are forwarded as {'type': 'delta'} events
+    while answers are generated. Either way, every successful model produces one
+    full event with 'response' and 'latency'.
+
+    Args:
+        stage: Stage name to put on the events
+        models: PolzaAI model identifiers to query
+        messages: List of message dicts to send to each model
+        budget: Total time budget of the upstream calls (0 = none)
+        stream_tokens: Whether to stream token deltas
+
+    Yields:
+        Dict with streaming events for the given stage
+    """
+    with stage_budget(budget):
+        if stream_tokens:
+            async for model, event in query_models_token_stream(models, messages):
+                if event["type"] == "delta":
+                    yield {
+                        "stage": stage,
+                        "type": "delta",
+                        "model": extract_short_model_name(model),
+                        "delta": event["content"]
+                    }
+                elif event["response"] is not None:  # Only include successful responses
+                    yield {
+                        "stage": stage,
+                        "model": extract_short_model_name(model),
+                        "model_id": model,
+                        "response": event["response"].get('content', ''),
+                        "latency": round(event["elapsed"], 3)
+                    }
+            return
+
+        async for model, response, elapsed in query_models_stream(models, messages):
+            if response is not None:  # Only include successful responses
+                yield {
+                    "stage": stage,
+                    "model": extract_short_model_name(model),
+                    "model_id": model,
+                    "response": response.get('content', ''),
+                    "latency": round(elapsed, 3)
+                }
+
+
+async def _fan_out_calls(
+    stage: str,
+    models: List[str],
+    prompt: Any,
+    budget: float,
+    stream_tokens: bool
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Send a node's prompt to its models and yield the resulting events.
+
+    A single prompt goes to every model in one fan-out. With one prompt per
+    model, every call runs as its own fan-out, and its events carry 'call' (the
+    index of the call) so answers of a model asked several times can be told apart.
+    """
+    if isinstance(prompt, str):
+        messages = [{"role": "user", "content": prompt}]
+        async for event in _fan_out(stage, models, messages, budget, stream_tokens):
+            yield event
+        return
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def call(index: int, model: str, text: str) -> None:
+        try:
+            messages = [{"role": "user", "content": text}]
+            async for event in _fan_out(stage, [model], messages, budget, stream_tokens):
+                await queue.put({**event, "call": index})
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(_STAGE_END)
+
+    tasks = [
+        asyncio.create_task(call(index, model, text))
+        for index, (model, text) in enumerate(zip(models, prompt))
+    ]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            event = await queue.get()
+            if event is _STAGE_END:
+                remaining -= 1
+            elif isinstance(event, Exception):
+                raise event
+            else:
+                yield event
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _pump(
+    stage: str,
+    events: AsyncIterator[Dict[str, Any]],
+    queue: asyncio.Queue
+) -> None:
+    """Forward a node's events into the shared executor queue, then an end marker."""
+    try:
+        async for event in events:
+            await queue.put((stage, event))
+    except Exception as e:
+        await queue.put((stage, e))
+    finally:
+        await queue.put((stage, _STAGE_END))
+
+
+async def _cache_lookup(node: StageNode, run: GraphRun) -> Tuple[Optional[str], Optional[Any]]:
+    """
+    Look up a node's output in the council cache.
+
+    The key covers the outputs of the node's dependencies (except `unkeyed`
+    ones), so a re-run stage 1 also re-runs the stages that depend on it.
+
+    Returns:
+        Tuple of (cache key or None if caching is disabled, cached value or None)
+    """
+    cache = get_cache()
+    if cache is None:
+        return None, None
+
+    key = stage_key(
+        node.name,
+        run.user_query,
+        node.templates,
+        {option: run.options.get(option) for option in node.options},
+        *(run.outputs[dep] for dep in node.deps if dep not in node.unkeyed)
+    )
+    allowed = CACHE_STAGES if run.cache_stages is None else run.cache_stages
+    if node.name not in allowed:
+        return key, None
+
+    return key, await cache.get(key)
+
+
+async def _cache_store(key: Optional[str], value: Any) -> None:
+    """Store a node's output under a key returned by _cache_lookup."""
+    cache = get_cache()
+    if cache is not None and key is not None:
+        await cache.set(key, value)
+
+
+def _replay_events(
+    stage: str,
+    answers: List[Dict[str, Any]],
+    mark: str = "cached"
+) -> List[Dict[str, Any]]:
+    """
+    Rebuild the stream events of a node whose output didn't come from its own queries.
+
+    Args:
+        stage: Stage name
+        answers: {'model', 'response'} answers with full model ids
+        mark: Key set to True on every event ("cached" or "reused")
+
+    Returns:
+        The same event sequence a live run emits, each marked with `mark`
+    """
+    events = [{"stage": stage, "status": "started", mark: True}]
+    for answer in answers:
+        events.append({
+            "stage": stage,
+            "model": extract_short_model_name(answer["model"]),
+            "model_id": answer["model"],
+            "response": answer["response"],
+            mark: True
+        })
+    events.append({"stage": stage, "status": "completed", mark: True})
+    return events
+
+
+def _check_graph(graph: Sequence[StageNode]) -> None:
+    """Raise ValueError unless every node can start once its dependencies finished."""
+    resolved: set = set()
+    remaining = list(graph)
+    while remaining:
+        ready = [node for node in remaining if set(node.deps) <= resolved]
+        if not ready:
+            raise ValueError(
+                f"Stages {[node.name for node in remaining]} depend on unknown stages or on each other"
+            )
+        resolved.update(node.name for node in ready)
+        remaining = [node for node in remaining if node not in ready]
+
+
+async def execute_graph(
+    graph: Sequence[StageNode],
+    run: GraphRun,
+    stream_tokens: bool = COUNCIL_STREAM_TOKENS
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Execute a stage graph and yield its events as they happen.
+
+    Every node whose dependencies have outputs starts at once, so independent
+    nodes run concurrently. Nodes found in the council cache are replayed as the
+    same event sequence. A node closed early by its quorum or deadline lets the
+    nodes depending on it start on the answers collected so far; its stragglers
+    are streamed with status "late" when STRAGGLER_POLICY is "attach" and
+    cancelled with "drop". A node without models is skipped (its events are
+    marked "skipped": True), and a node can be answered by its reuse hook or
+    cancelled by its cancel_when hook. Hidden nodes run without relaying their
+    events. If a required node gets no answer, an error event is
+    yielded and the run ends without starting its dependents.
+
+    If the consumer stops iterating, every running node is cancelled, which
+    cancels its outstanding upstream requests.
+
+    Args:
+        graph: Nodes of the graph; dependencies are referenced by name
+        run: Run state receiving node outputs
+        stream_tokens: Whether to stream token deltas of the answers
+
+    Yields:
+        Dict with streaming events of every node
+
+    Raises:
+        ValueError: If the graph has unknown dependencies or a cycle
+    """
+    _check_graph(graph)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    pending = list(graph)
+    active: Dict[str, _NodeState] = {}
+    pumps: Dict[str, asyncio.Task] = {}
+    # Latest node started, for the abandonment metric
+    current = pending[0].name if pending else ""
+    # Number of outputs when cancel_when hooks were last checked
+    checked_outputs = -1
+
+    def settle(node: StageNode, output: Any, started: float) -> None:
+        run.outputs[node.name] = output
+        run.timeline[node.name] = {"started": started, "finished": time.perf_counter()}
+
+    async def finish(state: _NodeState, early: bool) -> AsyncIterator[Dict[str, Any]]:
+        node = state.node
+        del active[node.name]
+        if early and STRAGGLER_POLICY != "attach":
+            pumps[node.name].cancel()
+        seconds = time.perf_counter() - state.started
+        observe_stage(node.name, seconds)
+        trace(
+            "stage.end",
+            stage=node.name,
+            status="ok" if state.collected or node.required is None else "error",
+            answers=len(state.collected),
+            closed_early=early,
+            seconds=round(seconds, 4),
+        )
+
+        events = []
+        if not state.collected and node.fallback is not None:
+            events.append({"stage": node.name, "response": node.fallback})
+        completed = {"stage": node.name, "status": "completed"}
+        if early:
+            completed.update(received=len(state.collected), closed_early=True)
+        events.append(completed)
+        if not node.hidden:
+            for event in events:
+                yield event
+
+        if not state.collected and node.required is not None:
+            # Nothing to build on: end the run
+            yield {"stage": "error", "status": "error", "response": node.required}
+            return
+        settle(node, node.collect(run, state.collected), state.started)
+        # Only a full council's output is cached: a node closed early or missing failed
+        # answers would otherwise be served to every repeat of the question
+        if not early and len(state.collected) == state.size:
+            await _cache_store(state.key, run.outputs[node.name])
+
+    try:
+        while True:
+            if len(run.outputs) != checked_outputs:
+                # Drop running nodes whose result is no longer wanted
+                checked_outputs = len(run.outputs)
+                for state in list(active.values()):
+                    node = state.node
+                    if node.cancel_when is not None and node.cancel_when(run):
+                        del active[node.name]
+                        pumps[node.name].cancel()
+                        STAGE_TASKS_CANCELLED.inc(stage=node.name)
+                        trace("stage.cancelled", stage=node.name, status="cancelled", reason="cancel_when")
+                        settle(node, None, state.started)
+                        run.timeline[node.name]["cancelled"] = True
+                        if not node.hidden:
+                            yield {"stage": node.name, "status": "cancelled"}
+
+            # Start every ready node; nodes that finish at once may ready others
+            ready = [node for node in pending if all(dep in run.outputs for dep in node.deps)]
+            while ready:
+                for node in ready:
+                    pending.remove(node)
+                    started = time.perf_counter()
+                    if node.cancel_when is not None and node.cancel_when(run):
+                        trace("stage.cancelled", stage=node.name, status="cancelled", reason="cancel_when")
+                        settle(node, None, started)
+                        run.timeline[node.name]["cancelled"] = True
+                        continue
+
+                    if not node.hidden:
+                        current = node.name
+                    key, output = await _cache_lookup(node, run)
+                    mark = "cached"
+                    if output is not None:
+                        run.cached.append(node.name)
+                    elif node.reuse is not None:
+                        output = node.reuse(run)
+                        mark = "reused"
+                        if output is not None:
+                            await _cache_store(key, output)
+                    if output is not None:
+                        if not node.hidden:
+                            for event in _replay_events(node.name, node.answers(output), mark):
+                                yield event
+                        settle(node, output, started)
+                        observe_stage(node.name, time.perf_counter() - started)
+                        trace("stage.end", stage=node.name, status="ok", source=mark)
+                        continue
+
+                    models = node.models(run)
+                    if not models:
+                        if not node.hidden:
+                            yield {"stage": node.name, "status": "started", "skipped": True}
+                            yield {"stage": node.name, "status": "completed", "skipped": True}
+                        settle(node, node.collect(run, []), started)
+                        trace("stage.end", stage=node.name, status="ok", source="skipped")
+                        continue
+
+                    prompt = node.prompt(run)
+                    active[node.name] = _NodeState(node, len(models), loop.time(), key)
+                    trace("stage.start", stage=node.name, models=list(models))
+                    if not node.hidden:
+                        yield {"stage": node.name, "status": "started"}
+                    pumps[node.name] = asyncio.create_task(_pump(
+                        node.name,
+                        _fan_out_calls(node.name, models, prompt, node.budget, stream_tokens),
+                        queue
+                    ))
+                ready = [node for node in pending if all(dep in run.outputs for dep in node.deps)]
+
+            if len(run.outputs) != checked_outputs:
+                # Nodes finished without queries; check the cancel_when hooks first
+                continue
+            if not active:
+                return
+
+            now = loop.time()
+            timeouts = [t for t in (state.timeout(now) for state in active.values()) if t is not None]
+
+            # Not asyncio.wait_for: on 3.11 it can swallow the cancellation of an abandoned
+            # run when an event arrives at the same moment
+            getter = asyncio.ensure_future(queue.get())
+            try:
+                done, _ = await asyncio.wait({getter}, timeout=min(timeouts) if timeouts else None)
+            finally:
+                if not getter.done():
+                    getter.cancel()
+
+            closing: List[Tuple[_NodeState, bool]] = []
+            if not done:
+                # A deadline passed: close the nodes that have something to work with
+                now = loop.time()
+                closing = [(state, True) for state in active.values() if state.gate_met(now)]
+            else:
+                source, event = getter.result()
+                state = active.get(source)
+
+                if state is None:
+                    # Straggler of a node that was closed early or cancelled
+                    if (
+                        STRAGGLER_POLICY == "attach"
+                        and isinstance(event, dict)
+                        and event.get("type") != "delta"
+                        and not any(node.name == source and node.hidden for node in graph)
+                    ):
+                        # The node already completed: a distinct status keeps
+                        # clients from taking the answer for one of its results
+                        yield {**event, "status": "late"}
+                    continue
+
+                if isinstance(event, Exception):
+                    raise event
+
+                if event is _STAGE_END:
+                    closing = [(state, False)]
+                else:
+                    if not state.node.hidden:
+                        yield event
+                    if event.get("type") != "delta" and event.get("response"):
+                        answer = {
+                            "model": event.get("model_id", event["model"]),
+                            "response": event["response"]
+                        }
+                        if "call" in event:
+                            answer["call"] = event["call"]
+                        state.collected.append(answer)
+                        if state.gate_met(loop.time()):
+                            closing = [(state, True)]
+
+            for state, early in closing:
+                async for event in finish(state, early):
+                    yield event
+                if state.node.name not in run.outputs:
+                    # A required node got no answer; its dependents can't start
+                    return
+    except (asyncio.CancelledError, GeneratorExit):
+        # Nobody is listening any more: don't spend upstream capacity on the rest
+        RUNS_ABANDONED.inc(stage=current)
+        trace("run.abandoned", stage=current, status="cancelled")
+        raise
+    finally:
+        # Stragglers still running after the final answer are no longer useful
+        for stage, task in pumps.items():
+            if not task.done():
+                STAGE_TASKS_CANCELLED.inc(stage=stage)
+                trace("stage.cancelled", stage=stage, status="cancelled", reason="straggler")
+                task.cancel()
+        if pumps:
+            await asyncio.gather(*pumps.values(), return_exceptions=True)
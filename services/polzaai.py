@@ -1,8 +1,264 @@
 """PolzaAI API client for making LLM requests."""
 
+import asyncio
+import json
+import logging
+import time
 import httpx
 from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
-from .config import POLZAAI_API_KEY, POLZAAI_API_URL
+from .config import (
+    POLZAAI_API_KEY,
+    POLZAAI_API_URL,
+    POLZAAI_MAX_CONNECTIONS,
+    POLZAAI_MAX_KEEPALIVE_CONNECTIONS,
+    POLZAAI_KEEPALIVE_EXPIRY,
+    POLZAAI_CONNECT_TIMEOUT,
+    POLZAAI_HTTP2,
+    POLZAAI_STREAM_USAGE,
+    HEALTH_PROBE_TIMEOUT,
+)
+from .health import record_call
+from .metrics import observe_upstream_call
+from .ratelimit import UpstreamOverloaded, limiter_for, upstream_slot
+from .resilience import (
+    UpstreamError,
+    attempt_timeout,
+    call_with_resilience,
+    hedged,
+    is_retryable_status,
+    remaining_budget,
+    report_event,
+    retry_delay,
+)
+from .tracing import trace
+
+logger = logging.getLogger(__name__)
+
+# Longest upstream body excerpt written to debug logs
+_LOGGED_BODY_CHARS = 500
+
+# Shared client reused by every request so TLS sessions and connections are pooled
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    """
+    Create the pooled HTTP client used for all PolzaAI requests.
+
+    Returns:
+        Configured httpx.AsyncClient (HTTP/2 if enabled and available)
+    """
+    http2 = POLZAAI_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("POLZAAI_HTTP2 is enabled but 'h2' is not installed, falling back to HTTP/1.1")
+            http2 = False
+
+    limits = httpx.Limits(
+        max_connections=POLZAAI_MAX_CONNECTIONS,
+        max_keepalive_connections=POLZAAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=POLZAAI_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(120.0, connect=POLZAAI_CONNECT_TIMEOUT)
+
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared client, creating it lazily when used outside the app lifespan.
+
+    Returns:
+        The shared client
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def start_client() -> httpx.AsyncClient:
+    """
+    Open the shared PolzaAI client. Called from the FastAPI app lifespan.
+
+    Returns:
+        The shared client
+    """
+    return get_client()
+
+
+async def close_client() -> None:
+    """Close the shared PolzaAI client and release pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _note_rate_limited(model: str, response: httpx.Response) -> None:
+    """Hold back new requests to a model after an upstream 429, honouring Retry-After."""
+    if response.status_code != 429:
+        return
+    try:
+        retry_after = float(response.headers.get("Retry-After", "1"))
+    except ValueError:
+        retry_after = 1.0
+    limiter_for(model).backoff(retry_after)
+
+
+def _observe(
+    model: str,
+    status: str,
+    seconds: float,
+    ttfb: Optional[float] = None,
+    usage: Optional[Dict[str, Any]] = None
+) -> None:
+    """Report a finished upstream request to the metrics, the model health registry and the run trace."""
+    observe_upstream_call(model, status, seconds, ttfb, usage)
+    record_call(model, status, seconds, ttfb)
+    if status == "cancelled":
+        outcome = "cancelled"
+    elif status in ("200", "201"):
+        outcome = "ok"
+    else:
+        outcome = "error"
+    trace(
+        "upstream.request",
+        model=model,
+        status=outcome,
+        http_status=status,
+        seconds=round(seconds, 4),
+        ttfb=round(ttfb, 4) if ttfb is not None else None,
+        tokens=(usage or {}).get("total_tokens"),
+    )
+
+
+def _status_error(model: str, response: httpx.Response, body: str) -> UpstreamError:
+    """
+    Turn a non-success upstream response into an UpstreamError.
+
+    Args:
+        model: PolzaAI model identifier
+        response: The upstream response
+        body: Response body text
+
+    Returns:
+        UpstreamError marked retryable according to the model's policy
+    """
+    _note_rate_limited(model, response)
+    logger.warning("Error querying model %s: status %s", model, response.status_code)
+    logger.debug("Response of %s: %s", model, body[:_LOGGED_BODY_CHARS])
+
+    retry_after = None
+    if "Retry-After" in response.headers:
+        try:
+            retry_after = float(response.headers["Retry-After"])
+        except ValueError:
+            pass
+
+    return UpstreamError(
+        f"Status {response.status_code}",
+        status=response.status_code,
+        retryable=is_retryable_status(model, response.status_code),
+        retry_after=retry_after
+    )
+
+
+async def _query_model_once(
+    model: str,
+    messages: List[Dict[str, str]],
+    timeout: float
+) -> Dict[str, Any]:
+    """
+    Make one non-streaming chat-completions request.
+
+    Args:
+        model: PolzaAI model identifier
+        messages: List of message dicts with 'role' and 'content'
+        timeout: Request timeout in seconds
+
+    Returns:
+        Response dict with 'content' and optional 'reasoning_details'
+
+    Raises:
+        UpstreamError: If the request failed (retryable for timeouts, transport
+            errors and statuses in the model's retry policy)
+        UpstreamOverloaded: If the request can't be admitted by the rate limiter in time
+    """
+    headers = {
+        "Authorization": f"Bearer {POLZAAI_API_KEY}",
+        "Content-Type": "application/json",
+    }
+
+    payload = {
+        "model": model,
+        "messages": messages,
+    }
+
+    client = get_client()
+    request = client.build_request(
+        "POST",
+        POLZAAI_API_URL,
+        headers=headers,
+        json=payload,
+        timeout=httpx.Timeout(timeout, connect=POLZAAI_CONNECT_TIMEOUT)
+    )
+    start: Optional[float] = None
+    ttfb: Optional[float] = None
+    try:
+        async with upstream_slot(model):
+            # Timed from admission so queueing in the limiter doesn't count as upstream latency
+            start = time.perf_counter()
+            response = await client.send(request, stream=True)
+            ttfb = time.perf_counter() - start
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+    except asyncio.CancelledError:
+        # Hedge loser, closed stage or abandoned run
+        if start is not None:
+            _observe(model, "cancelled", time.perf_counter() - start, ttfb)
+        raise
+    except httpx.TransportError as e:
+        if start is not None:
+            kind = "timeout" if isinstance(e, httpx.TimeoutException) else "error"
+            _observe(model, kind, time.perf_counter() - start, ttfb)
+        # Timeouts, connection resets and protocol errors are worth another try
+        raise UpstreamError(f"{type(e).__name__}: {e}", retryable=True)
+    elapsed = time.perf_counter() - start
+    status = str(response.status_code)
+
+    # Check if status code indicates success (200 or 201)
+    if response.status_code not in [200, 201]:
+        _observe(model, status, elapsed, ttfb)
+        raise _status_error(model, response, response.text)
+
+    # Try to parse JSON response
+    try:
+        data = response.json()
+    except Exception as json_error:
+        _observe(model, status, elapsed, ttfb)
+        logger.warning("Error parsing JSON response for model %s: %s", model, json_error)
+        logger.debug("Raw response of %s: %s", model, response.text[:_LOGGED_BODY_CHARS])
+        raise UpstreamError(f"Invalid JSON: {json_error}")
+
+    _observe(model, status, elapsed, ttfb, data.get('usage') if isinstance(data, dict) else None)
+
+    # Check if the expected structure exists in the response
+    if 'choices' not in data or not data['choices']:
+        logger.warning("No choices in response for model %s", model)
+        logger.debug("Response of %s: %s", model, str(data)[:_LOGGED_BODY_CHARS])
+        raise UpstreamError("No choices in response")
+
+    message = data['choices'][0]['message']
+
+    return {
+        'content': message.get('content'),
+        'reasoning_details': message.get('reasoning_details')
+    }
 
 
 async def query_model(
@@ -13,118 +269,476 @@ async def query_model(
     """
     Query a single model via PolzaAI API.
 
+    Retryable failures are retried and slow requests hedged according to the
+    model's resilience policy, within the current stage budget.
+
     Args:
         model: PolzaAI model identifier (e.g., "openai/gpt-4o")
         messages: List of message dicts with 'role' and 'content'
-        timeout: Request timeout in seconds
+        timeout: Request timeout in seconds (per attempt)
 
     Returns:
         Response dict with 'content' and optional 'reasoning_details', or None if failed
+
+    Raises:
+        UpstreamOverloaded: If the request can't be admitted by the rate limiter in time
+    """
+    try:
+        return await call_with_resilience(
+            model,
+            lambda attempt_timeout: _query_model_once(model, messages, attempt_timeout),
+            timeout
+        )
+    except UpstreamOverloaded:
+        raise
+    except Exception as e:
+        logger.warning("Error querying model %s: %s", model, e)
+        return None
+
+
+async def probe_model(model: str) -> bool:
+    """
+    Send a minimal request to a model to check its health.
+
+    A single attempt without retries or hedging; the outcome reaches the health
+    registry like any other request.
+
+    Args:
+        model: PolzaAI model identifier
+
+    Returns:
+        True if the model answered
+    """
+    try:
+        await _query_model_once(model, [{"role": "user", "content": "ping"}], HEALTH_PROBE_TIMEOUT)
+        return True
+    except Exception as e:
+        logger.info("Health probe of %s failed: %s", model, e)
+        return False
+
+
+async def _stream_model_once(
+    model: str,
+    messages: List[Dict[str, str]],
+    timeout: float,
+    state: Dict[str, Any]
+) -> AsyncIterator[str]:
+    """
+    Make one streaming chat-completions request and yield content deltas.
+
+    Args:
+        model: PolzaAI model identifier
+        messages: List of message dicts with 'role' and 'content'
+        timeout: Request timeout in seconds
+        state: Dict receiving 'reasoning_details' if the upstream sends them
+
+    Yields:
+        Content chunks as they arrive
+
+    Raises:
+        UpstreamError: If the request failed
+        UpstreamOverloaded: If the request can't be admitted by the rate limiter in time
     """
-    print(f"Using API Key: {POLZAAI_API_KEY[:10] if POLZAAI_API_KEY else 'None'}...")
     headers = {
         "Authorization": f"Bearer {POLZAAI_API_KEY}",
         "Content-Type": "application/json",
+        "Accept": "text/event-stream",
     }
 
     payload = {
         "model": model,
         "messages": messages,
+        "stream": True,
     }
+    if POLZAAI_STREAM_USAGE:
+        payload["stream_options"] = {"include_usage": True}
 
+    client = get_client()
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                POLZAAI_API_URL,
-                headers=headers,
-                json=payload
-            )
-            
-            # Check if status code indicates success (200 or 201)
-            if response.status_code not in [200, 201]:
-                print(f"Error querying model {model}: Status {response.status_code}")
-                print(f"Response: {response.text}")
-                return None
-            
-            # Try to parse JSON response
+        async with upstream_slot(model):
+            # Timed from admission; TTFB is the time to the first content token
+            start = time.perf_counter()
+            ttfb: Optional[float] = None
+            status = "error"
+            usage: Optional[Dict[str, Any]] = None
             try:
-                data = response.json()
-            except Exception as json_error:
-                print(f"Error parsing JSON response for model {model}: {json_error}")
-                print(f"Raw response: {response.text}")
-                return None
-            
-            # Check if the expected structure exists in the response
-            if 'choices' not in data or not data['choices']:
-                print(f"No choices in response for model {model}")
-                print(f"Response: {data}")
-                return None
-                
-            message = data['choices'][0]['message']
-
-            return {
-                'content': message.get('content'),
-                'reasoning_details': message.get('reasoning_details')
-            }
+                async with client.stream(
+                    "POST",
+                    POLZAAI_API_URL,
+                    headers=headers,
+                    json=payload,
+                    timeout=httpx.Timeout(timeout, connect=POLZAAI_CONNECT_TIMEOUT)
+                ) as response:
+                    status = str(response.status_code)
+                    if response.status_code not in [200, 201]:
+                        body = await response.aread()
+                        raise _status_error(model, response, body.decode('utf-8', errors='replace'))
 
-    except Exception as e:
-        print(f"Error querying model {model}: {e}")
-        return None
+                    async for line in response.aiter_lines():
+                        # SSE framing: only "data:" lines carry payload, blank lines and comments are skipped
+                        if not line.startswith("data:"):
+                            continue
+                        data_str = line[5:].strip()
+                        if data_str == "[DONE]":
+                            break
+                        if not data_str:
+                            continue
+
+                        try:
+                            chunk = json.loads(data_str)
+                        except ValueError:
+                            logger.debug("Skipping malformed stream chunk for model %s: %s", model, data_str[:200])
+                            continue
+
+                        # The usage chunk usually comes last, with empty choices
+                        if chunk.get('usage'):
+                            usage = chunk['usage']
+
+                        choices = chunk.get('choices') or []
+                        if not choices:
+                            continue
+                        delta = choices[0].get('delta') or {}
+
+                        if delta.get('reasoning_details'):
+                            state['reasoning_details'] = delta['reasoning_details']
+
+                        content = delta.get('content')
+                        if content:
+                            if ttfb is None:
+                                ttfb = time.perf_counter() - start
+                            yield content
+            except asyncio.CancelledError:
+                # Hedge loser, closed stage or abandoned run; the connection is released on exit
+                status = "cancelled"
+                raise
+            except httpx.TransportError as e:
+                status = "timeout" if isinstance(e, httpx.TimeoutException) else "error"
+                raise
+            finally:
+                _observe(model, status, time.perf_counter() - start, ttfb, usage)
+    except httpx.TransportError as e:
+        raise UpstreamError(f"{type(e).__name__}: {e}", retryable=True)
+
+
+async def _open_stream(
+    model: str,
+    messages: List[Dict[str, str]],
+    timeout: float
+) -> Tuple[AsyncIterator[str], Optional[str], Dict[str, Any]]:
+    """Start one streaming request and wait for its first token (None if it ended without content)."""
+    state: Dict[str, Any] = {}
+    stream = _stream_model_once(model, messages, timeout, state)
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = None
+    return stream, first, state
+
+
+async def _close_stream(opened: Tuple[AsyncIterator[str], Optional[str], Dict[str, Any]]) -> None:
+    await opened[0].aclose()
+
+
+async def query_model_stream(
+    model: str,
+    messages: List[Dict[str, str]],
+    timeout: float = 120.0
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Query a single model with upstream token streaming ("stream": true).
+
+    The chat-completions SSE body is parsed incrementally and every content
+    delta is yielded as soon as it arrives. Until the first token, failures
+    are retried and a slow request is hedged according to the model's
+    resilience policy; once tokens have been forwarded the answer can't be
+    restarted, so later failures end it. The stage budget bounds the whole
+    answer: a model still streaming when it runs out fails like any other
+    request over budget.
+
+    Args:
+        model: PolzaAI model identifier (e.g., "openai/gpt-4o")
+        messages: List of message dicts with 'role' and 'content'
+        timeout: Request timeout in seconds (per attempt)
+
+    Yields:
+        {'type': 'delta', 'content': str} for each content chunk, then exactly one
+        {'type': 'done', 'response': dict or None} where 'response' has the same
+        shape as query_model's return value (None if the request failed)
+
+    Raises:
+        UpstreamOverloaded: If the request can't be admitted by the rate limiter in time
+    """
+    parts: List[str] = []
+    state: Dict[str, Any] = {}
+    retries = 0
+
+    while True:
+        budget_timeout = attempt_timeout(timeout)
+        if budget_timeout is None:
+            report_event("budget_exhausted", model, retries=retries)
+            logger.info("Stage budget exhausted for model %s", model)
+            yield {"type": "done", "response": None}
+            return
+
+        stream: Optional[AsyncIterator[str]] = None
+        try:
+            try:
+                # asyncio.timeout(None) never expires, so without a budget only httpx times out
+                async with asyncio.timeout(remaining_budget()):
+                    stream, content, state = await hedged(
+                        model,
+                        lambda attempt_timeout: _open_stream(model, messages, attempt_timeout),
+                        budget_timeout,
+                        first_token=True,
+                        discard=_close_stream
+                    )
+                while content is not None:
+                    parts.append(content)
+                    yield {"type": "delta", "content": content}
+                    try:
+                        async with asyncio.timeout(remaining_budget()):
+                            content = await stream.__anext__()
+                    except StopAsyncIteration:
+                        content = None
+            except asyncio.TimeoutError:
+                report_event("budget_exhausted", model, retries=retries)
+                raise UpstreamError(f"Stage budget exhausted for {model}")
+            break
+        except UpstreamOverloaded:
+            raise
+        except UpstreamError as e:
+            delay = None if parts else retry_delay(model, retries, e)
+            if delay is None:
+                logger.warning("Error streaming model %s: %s", model, e)
+                yield {"type": "done", "response": None}
+                return
+            retries += 1
+            report_event("retry", model, attempt=retries, reason=str(e), delay=round(delay, 3))
+            await asyncio.sleep(delay)
+        except Exception as e:
+            logger.warning("Error streaming model %s: %s", model, e)
+            yield {"type": "done", "response": None}
+            return
+        finally:
+            # Closes the connection when the answer is abandoned or cut off mid-stream
+            if stream is not None:
+                await stream.aclose()
+
+    if not parts:
+        logger.warning("No content streamed for model %s", model)
+        yield {"type": "done", "response": None}
+        return
+
+    yield {
+        "type": "done",
+        "response": {
+            'content': "".join(parts),
+            'reasoning_details': state.get('reasoning_details')
+        }
+    }
 
 
 async def query_models_parallel(
     models: List[str],
-    messages: List[Dict[str, str]]
+    messages: List[Dict[str, str]],
+    quorum: Optional[int] = None,
+    deadline: Optional[float] = None
 ) -> Dict[str, Optional[Dict[str, Any]]]:
     """
     Query multiple models in parallel.
 
+    By default waits for every model. With a quorum and/or deadline, returns as
+    soon as `quorum` models answered successfully or `deadline` seconds passed
+    (with at least one answer), and cancels the stragglers.
+
     Args:
         models: List of PolzaAI model identifiers
         messages: List of message dicts to send to each model
+        quorum: Number of successful answers that is enough to return early
+        deadline: Seconds after which to return with whatever has arrived
 
     Returns:
-        Dict mapping model identifier to response dict (or None if failed)
+        Dict mapping model identifier to response dict (or None if failed or dropped)
     """
-    import asyncio
+    logger.debug("Querying models: %s", models)
+
+    if not quorum and not deadline:
+        tasks = [asyncio.create_task(query_model(model, messages)) for model in models]
+        try:
+            responses = await asyncio.gather(*tasks)
+        finally:
+            # On an error (or our cancellation) the other calls must not keep their slots
+            unfinished = [task for task in tasks if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                await asyncio.gather(*unfinished, return_exceptions=True)
+
+        # Map models to their responses
+        return {model: response for model, response in zip(models, responses)}
+
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline if deadline else None
+
+    task_to_model = {
+        asyncio.create_task(query_model(model, messages)): model
+        for model in models
+    }
+    pending = set(task_to_model)
+    results: Dict[str, Optional[Dict[str, Any]]] = {model: None for model in models}
+    succeeded = 0
+
+    try:
+        while pending:
+            if quorum and succeeded >= quorum:
+                break
+
+            timeout = None
+            if deadline_at is not None:
+                timeout = deadline_at - loop.time()
+                if timeout <= 0:
+                    if succeeded:
+                        break
+                    # Nothing usable yet: keep waiting for the first answer
+                    timeout = None
+
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                error = task.exception()
+                if isinstance(error, UpstreamOverloaded):
+                    raise error
+                response = None if error else task.result()
+                results[task_to_model[task]] = response
+                if response is not None:
+                    succeeded += 1
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    if pending:
+        dropped = [task_to_model[task] for task in pending]
+        logger.info("Quorum/deadline reached, dropping stragglers: %s", dropped)
+
+    return results
 
-    print(f"Querying models: {models}")
-    # Create tasks for all models
-    tasks = [query_model(model, messages) for model in models]
-    # Wait for all to complete
-    responses = await asyncio.gather(*tasks)
 
-    # Map models to their responses
-    return {model: response for model, response in zip(models, responses)}
+async def _timed_query(
+    model: str,
+    messages: List[Dict[str, str]]
+) -> Tuple[str, Optional[Dict[str, Any]], float]:
+    """
+    Query a model and measure how long the call took.
+
+    Args:
+        model: PolzaAI model identifier
+        messages: List of message dicts to send
+
+    Returns:
+        Tuple of (model, response or None, elapsed seconds)
+    """
+    start = time.perf_counter()
+    response = await query_model(model, messages)
+    return model, response, time.perf_counter() - start
 
 
 async def query_models_stream(
     models: List[str],
     messages: List[Dict[str, str]]
-) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]]]]:
+) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]], float]]:
     """
-    Stream model responses as they become available.
-    
+    Stream model responses in completion order.
+
+    All models are queried concurrently and each result is yielded as soon as
+    it lands, regardless of submission order. If the consumer stops iterating
+    (e.g. the SSE client disconnected), outstanding requests are cancelled.
+
     Args:
         models: List of PolzaAI model identifiers
         messages: List of message dicts to send to each model
-    
+
     Yields:
-        Tuple of (model_name, response) as responses become available
+        Tuple of (model_name, response, elapsed_seconds) in completion order
     """
-    import asyncio
-    from typing import AsyncIterator, Tuple, Optional, Dict, Any, List
+    logger.debug("Querying models: %s", models)
+
+    task_to_model = {
+        asyncio.create_task(_timed_query(model, messages)): model
+        for model in models
+    }
+    pending = set(task_to_model)
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    model_name, response, elapsed = task.result()
+                except UpstreamOverloaded:
+                    raise
+                except Exception as e:
+                    model_name = task_to_model[task]
+                    logger.warning("Error querying model %s: %s", model_name, e)
+                    yield model_name, None, 0.0
+                    continue
+                yield model_name, response, elapsed
+    finally:
+        # Consumer went away or failed: cancel whatever is still running
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
 
-    print(f"Querying models: {models}")
 
-    # Create tasks for all models and keep track of which model each task corresponds to
-    model_tasks = [(model, asyncio.create_task(query_model(model, messages))) for model in models]
+async def query_models_token_stream(
+    models: List[str],
+    messages: List[Dict[str, str]]
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream token deltas from several models at once, interleaved as they arrive.
 
-    # Process results as they complete
-    for model_name, task in model_tasks:
+    Args:
+        models: List of PolzaAI model identifiers
+        messages: List of message dicts to send to each model
+
+    Yields:
+        Tuple of (model_name, event) where event is a query_model_stream event.
+        Each model ends with one 'done' event that also carries 'elapsed' seconds.
+    """
+    logger.debug("Streaming models: %s", models)
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump(model: str) -> None:
+        start = time.perf_counter()
         try:
-            response = await task
-            yield model_name, response
+            async for event in query_model_stream(model, messages):
+                if event["type"] == "done":
+                    event = {**event, "elapsed": time.perf_counter() - start}
+                await queue.put((model, event))
+        except UpstreamOverloaded as e:
+            await queue.put((model, e))
         except Exception as e:
-            print(f"Error querying model {model_name}: {e}")
-            yield model_name, None
+            logger.warning("Error streaming model %s: %s", model, e)
+            await queue.put((model, {"type": "done", "response": None, "elapsed": time.perf_counter() - start}))
+
+    tasks = [asyncio.create_task(pump(model)) for model in models]
+    remaining = len(tasks)
+
+    try:
+        while remaining:
+            model_name, event = await queue.get()
+            if isinstance(event, UpstreamOverloaded):
+                raise event
+            if event["type"] == "done":
+                remaining -= 1
+            yield model_name, event
+    finally:
+        # Consumer went away or failed: cancel whatever is still streaming
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
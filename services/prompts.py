@@ -0,0 +1,165 @@
+"""Token-budgeted prompt assembly: local token estimate and answer/review excerpts."""
+
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .config import PROMPT_BYTES_PER_TOKEN, PROMPT_MIN_ITEM_TOKENS
+from .metrics import PROMPT_TOKENS, PROMPT_TRUNCATIONS
+
+# Inserted where part of an answer or review was cut out
+EXCERPT_MARKER = "\n[…фрагмент сокращён…]\n"
+
+EXCERPT_STRATEGIES = ("head", "tail", "head_tail")
+
+# Prompt budgets used by the council run the current task belongs to
+_prompt_report: ContextVar[Optional[Dict[str, Any]]] = ContextVar("prompt_report", default=None)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text without a tokenizer.
+
+    UTF-8 length divided by PROMPT_BYTES_PER_TOKEN: about 4 characters per token
+    for Latin text and 2 for Cyrillic, which errs on the safe side for both.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated number of tokens
+    """
+    return int(len(text.encode("utf-8")) / PROMPT_BYTES_PER_TOKEN + 0.999)
+
+
+def excerpt(text: str, max_tokens: int, strategy: str = "head_tail") -> str:
+    """
+    Shorten a text to about `max_tokens` tokens.
+
+    Args:
+        text: Answer or review text
+        max_tokens: Token allowance for the text
+        strategy: "head" keeps the beginning, "tail" the end, "head_tail" both halves
+            (the end of a review holds its ranking)
+
+    Returns:
+        The text itself if it fits, otherwise an excerpt with EXCERPT_MARKER at the cut
+    """
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+
+    # Scale the allowance left after the marker to characters using this text's own density
+    keep = int(len(text) * (max_tokens - estimate_tokens(EXCERPT_MARKER)) / tokens)
+    if keep <= 0:
+        return EXCERPT_MARKER.strip()
+
+    if strategy == "head":
+        return _cut_head(text, keep) + EXCERPT_MARKER
+    if strategy == "tail":
+        return EXCERPT_MARKER + _cut_tail(text, keep)
+    half = keep // 2
+    return _cut_head(text, keep - half) + EXCERPT_MARKER + _cut_tail(text, half)
+
+
+def _cut_head(text: str, chars: int) -> str:
+    """First `chars` characters, backed off to a word boundary when one is near."""
+    head = text[:chars]
+    space = head.rfind(" ", chars - chars // 10)
+    return (head[:space] if space > 0 else head).rstrip()
+
+
+def _cut_tail(text: str, chars: int) -> str:
+    """Last `chars` characters, moved forward to a word boundary when one is near."""
+    tail = text[len(text) - chars:]
+    space = tail.find(" ", 0, chars // 10)
+    return (tail[space + 1:] if space >= 0 else tail).lstrip()
+
+
+def fit_to_budget(
+    items: Sequence[Tuple[str, str]],
+    budget: int
+) -> Tuple[List[str], List[int]]:
+    """
+    Share a token budget between texts and excerpt the ones that don't fit.
+
+    Texts shorter than an equal share keep their full length and leave the
+    rest to the longer ones, so only the longest texts get shortened.
+
+    Args:
+        items: (text, excerpt strategy) pairs
+        budget: Tokens available for all texts together; 0 disables the budget
+
+    Returns:
+        Tuple of (texts in the same order, indexes of the texts that were shortened)
+    """
+    texts = [text for text, _ in items]
+    if not budget or not items:
+        return texts, []
+
+    sizes = [estimate_tokens(text) for text in texts]
+    if sum(sizes) <= budget:
+        return texts, []
+
+    allowances = [0] * len(items)
+    remaining = budget
+    order = sorted(range(len(items)), key=lambda i: sizes[i])
+    for position, index in enumerate(order):
+        share = max(remaining // (len(order) - position), PROMPT_MIN_ITEM_TOKENS)
+        allowances[index] = min(sizes[index], share)
+        remaining -= allowances[index]
+
+    truncated = []
+    for index, (text, strategy) in enumerate(items):
+        if allowances[index] < sizes[index]:
+            texts[index] = excerpt(text, allowances[index], strategy)
+            truncated.append(index)
+    return texts, truncated
+
+
+def new_prompt_report() -> Dict[str, Any]:
+    """
+    Start collecting prompt budget usage for a council run.
+
+    The report is bound to the current task and inherited by tasks it creates.
+
+    Returns:
+        Dict that build results will be stored in, by stage
+    """
+    report: Dict[str, Any] = {}
+    _prompt_report.set(report)
+    return report
+
+
+def record_prompt(stage: str, prompt: str, budget: int, items: int, truncated: int) -> None:
+    """
+    Report the size of a built prompt to the metrics and the current run.
+
+    Prompts of the same stage are summed up in the run report: the number of
+    prompts, items and truncated items, and the largest prompt's token estimate.
+
+    Args:
+        stage: Stage the prompt is for ("stage2" or "stage3")
+        prompt: The final prompt text
+        budget: Configured token budget (0 = none)
+        items: Number of answers/reviews in the prompt
+        truncated: How many of them were shortened
+    """
+    tokens = estimate_tokens(prompt)
+    PROMPT_TOKENS.observe(tokens, stage=stage)
+    if truncated:
+        PROMPT_TRUNCATIONS.inc(truncated, stage=stage)
+
+    report = _prompt_report.get()
+    if report is not None:
+        # Pairwise and tournament reviews build several prompts per stage
+        entry = report.setdefault(stage, {
+            "budget": budget,
+            "prompts": 0,
+            "estimated_tokens": 0,
+            "items": 0,
+            "truncated": 0,
+        })
+        entry["prompts"] += 1
+        entry["estimated_tokens"] = max(entry["estimated_tokens"], tokens)
+        entry["items"] += items
+        entry["truncated"] += truncated
@@ -0,0 +1,361 @@
+"""Admission control and per-model rate limiting in front of PolzaAI."""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+from .config import (
+    UPSTREAM_MAX_CONCURRENCY,
+    UPSTREAM_MAX_QUEUE,
+    ADMISSION_MAX_WAIT,
+    BATCH_MAX_SHARE,
+    DEFAULT_MODEL_LIMITS,
+    MODEL_LIMITS,
+    SHARED_LEASE_TTL,
+)
+from .shared import SharedState, get_shared_state, in_background
+
+# Whether the upstream requests of the current task are batch (low priority) traffic
+_batch_priority: ContextVar[bool] = ContextVar("batch_priority", default=False)
+
+
+class UpstreamOverloaded(Exception):
+    """Raised when a request can't be admitted upstream within the allowed wait."""
+
+    def __init__(self, key: str, retry_after: float) -> None:
+        super().__init__(f"Upstream capacity exhausted for {key}, retry after {retry_after:.0f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Token bucket, concurrency cap and bounded wait queue for one upstream key.
+
+    A rate of 0 disables the token bucket (only concurrency is limited).
+    When workers share state (SHARED_STATE_BACKEND), the rate and the
+    concurrency cap hold across all workers: the local token bucket gives
+    way to a shared sliding window, and every request also takes a shared
+    lease.
+    Batch requests (see use_batch_priority) are limited to BATCH_MAX_SHARE of
+    the concurrency and only queue up while no interactive request is waiting.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        max_concurrent: int,
+        max_queue: int,
+        max_wait: float
+    ) -> None:
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+        self.waiting = 0
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+
+        self.batch_max_concurrent = max(1, int(max_concurrent * BATCH_MAX_SHARE))
+        self.batch_active = 0
+        self.batch_waiting = 0
+        self._interactive_waiting = 0
+        self._batch_gate = asyncio.Event()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def retry_after(self) -> float:
+        """
+        Estimate when a rejected client should try again.
+
+        Returns:
+            Seconds to wait, at least 1
+        """
+        now = time.monotonic()
+        if self.rate > 0:
+            estimate = (self.waiting + 1) / self.rate
+        else:
+            estimate = self.max_wait
+        return max(1.0, min(estimate, 60.0), self._blocked_until - now)
+
+    def check(self) -> None:
+        """
+        Fail fast if the wait queue is already full.
+
+        Raises:
+            UpstreamOverloaded: If no more requests can wait for this key
+        """
+        if self._interactive_waiting >= self.max_queue:
+            self.rejected += 1
+            raise UpstreamOverloaded(self.name, self.retry_after())
+
+    def backoff(self, seconds: float) -> None:
+        """
+        Stop admitting requests for a while, e.g. after an upstream 429.
+
+        Args:
+            seconds: How long to hold new requests back
+        """
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        shared = get_shared_state()
+        if shared is not None:
+            # The other workers hold back too, instead of each finding out with a 429 of its own
+            in_background(shared.block(self.name, seconds))
+
+    def _open_batch_gate(self) -> None:
+        # Wake held-back batch requests to re-check, and hand out a fresh event
+        self._batch_gate.set()
+        self._batch_gate = asyncio.Event()
+
+    async def _wait_batch_turn(self) -> None:
+        """Hold a batch request back until it may compete for a slot."""
+        self.batch_waiting += 1
+        try:
+            while self._interactive_waiting or self.batch_active >= self.batch_max_concurrent:
+                await self._batch_gate.wait()
+        finally:
+            self.batch_waiting -= 1
+
+    async def _take_token(self, deadline: float) -> None:
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(self._blocked_until - now, 0.0)
+            if wait == 0.0:
+                if self.rate <= 0 or self._tokens >= 1.0:
+                    if self.rate > 0:
+                        self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            if now + wait > deadline:
+                self.rejected += 1
+                raise UpstreamOverloaded(self.name, max(wait, 1.0))
+            await asyncio.sleep(wait)
+
+    async def _take_lease(self, shared: SharedState, deadline: float) -> str:
+        while True:
+            # Shielded: a lease granted while the request was being cancelled is still returned
+            admit = asyncio.ensure_future(
+                shared.admit(self.name, self.max_concurrent, self.rate, self.burst, SHARED_LEASE_TTL)
+            )
+            try:
+                lease, wait = await asyncio.shield(admit)
+            except asyncio.CancelledError:
+                admit.add_done_callback(lambda done: self._return_abandoned_lease(shared, done))
+                raise
+            if lease is not None:
+                return lease
+            if time.monotonic() + wait > deadline:
+                self.rejected += 1
+                raise UpstreamOverloaded(self.name, max(wait, 1.0))
+            await asyncio.sleep(wait)
+
+    def _return_abandoned_lease(self, shared: SharedState, admit: asyncio.Future) -> None:
+        if not admit.cancelled() and admit.exception() is None:
+            lease, _wait = admit.result()
+            if lease is not None:
+                in_background(shared.release(self.name, lease))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold one admission slot for the duration of an upstream request.
+
+        Batch requests wait for their turn without a deadline and only then
+        start the max_wait clock; they never count against max_queue.
+
+        Raises:
+            UpstreamOverloaded: If the queue is full or no slot frees up in max_wait
+        """
+        batch = _batch_priority.get()
+        if batch:
+            await self._wait_batch_turn()
+            self.batch_active += 1
+        else:
+            self.check()
+            self._interactive_waiting += 1
+        self.waiting += 1
+        deadline = time.monotonic() + self.max_wait
+        acquired = False
+        shared = get_shared_state()
+        lease = None
+        try:
+            # Not asyncio.wait_for: on 3.11 it can swallow a cancellation that races
+            # with the acquire, leaving an abandoned request running
+            acquire = asyncio.ensure_future(self._semaphore.acquire())
+            try:
+                await asyncio.wait({acquire}, timeout=self.max_wait)
+            finally:
+                if not acquire.done():
+                    acquire.cancel()
+                elif not acquire.cancelled():
+                    acquired = True
+            if not acquired:
+                self.rejected += 1
+                raise UpstreamOverloaded(self.name, self.retry_after())
+            if shared is None:
+                await self._take_token(deadline)
+            else:
+                lease = await self._take_lease(shared, deadline)
+        except BaseException:
+            if acquired:
+                self._semaphore.release()
+            if batch:
+                self.batch_active -= 1
+                self._open_batch_gate()
+            raise
+        finally:
+            self.waiting -= 1
+            if not batch:
+                self._interactive_waiting -= 1
+                if not self._interactive_waiting:
+                    self._open_batch_gate()
+
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            if lease is not None:
+                in_background(shared.release(self.name, lease))
+            self._semaphore.release()
+            if batch:
+                self.batch_active -= 1
+                self._open_batch_gate()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return limiter counters.
+
+        Returns:
+            Dict with active, waiting, admitted and rejected counts, and the
+            active/held-back batch requests
+        """
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "batch_active": self.batch_active,
+            "batch_waiting": self.batch_waiting,
+        }
+
+
+_global_limiter: Optional[AdmissionLimiter] = None
+_model_limiters: Dict[str, AdmissionLimiter] = {}
+
+
+def global_limiter() -> AdmissionLimiter:
+    """
+    Return the limiter shared by all upstream requests.
+
+    Returns:
+        Global concurrency limiter
+    """
+    global _global_limiter
+    if _global_limiter is None:
+        _global_limiter = AdmissionLimiter(
+            "upstream",
+            rate=0,
+            burst=1,
+            max_concurrent=UPSTREAM_MAX_CONCURRENCY,
+            max_queue=UPSTREAM_MAX_QUEUE,
+            max_wait=ADMISSION_MAX_WAIT
+        )
+    return _global_limiter
+
+
+def limiter_for(model: str) -> AdmissionLimiter:
+    """
+    Return the limiter of a PolzaAI model, creating it from MODEL_LIMITS on first use.
+
+    Args:
+        model: PolzaAI model identifier
+
+    Returns:
+        Per-model limiter
+    """
+    limiter = _model_limiters.get(model)
+    if limiter is None:
+        limits = {**DEFAULT_MODEL_LIMITS, **MODEL_LIMITS.get(model, {})}
+        limiter = AdmissionLimiter(
+            model,
+            rate=limits["rate"],
+            burst=limits["burst"],
+            max_concurrent=int(limits["max_concurrent"]),
+            max_queue=int(limits["max_queue"]),
+            max_wait=ADMISSION_MAX_WAIT
+        )
+        _model_limiters[model] = limiter
+    return limiter
+
+
+@asynccontextmanager
+async def upstream_slot(model: str) -> AsyncIterator[None]:
+    """
+    Admit one request to `model`: per-model rate/concurrency first, then the global cap.
+
+    Args:
+        model: PolzaAI model identifier
+
+    Raises:
+        UpstreamOverloaded: If the request can't be admitted in time
+    """
+    async with limiter_for(model).slot():
+        async with global_limiter().slot():
+            yield
+
+
+def use_batch_priority() -> None:
+    """
+    Mark the upstream requests of the current task as batch traffic.
+
+    Tasks created afterwards inherit the mark, so calling this at the start of
+    a council run covers every request of the run.
+    """
+    _batch_priority.set(True)
+
+
+def check_admission(models: Iterable[str]) -> None:
+    """
+    Fail fast before starting a council run if any limiter it needs is saturated.
+
+    Args:
+        models: PolzaAI model identifiers the run will query
+
+    Raises:
+        UpstreamOverloaded: If the global or any per-model wait queue is full
+    """
+    global_limiter().check()
+    for model in models:
+        limiter_for(model).check()
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Return counters of the global and per-model limiters.
+
+    Returns:
+        Dict mapping limiter name to its stats
+    """
+    stats = {"upstream": global_limiter().stats()}
+    for model, limiter in _model_limiters.items():
+        stats[model] = limiter.stats()
+    return stats
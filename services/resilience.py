@@ -0,0 +1,339 @@
+"""Retries, hedged requests and stage time budgets for upstream model calls."""
+
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+from .config import DEFAULT_RESILIENCE_POLICY, MODEL_RESILIENCE_POLICY
+from .tracing import trace
+
+T = TypeVar("T")
+
+# Recent successful latencies per model, used to pick the hedging delay; streamed
+# requests are hedged on the time to their first token, kept apart from full calls
+_LATENCY_WINDOW = 200
+_latencies: Dict[str, Deque[float]] = {}
+_first_token_latencies: Dict[str, Deque[float]] = {}
+
+# Retry/hedge events of the council run the current task belongs to
+_run_report: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("run_report", default=None)
+
+# Absolute loop time by which the current stage must be finished
+_stage_deadline: ContextVar[Optional[float]] = ContextVar("stage_deadline", default=None)
+
+
+class UpstreamError(Exception):
+    """A failed upstream attempt, with enough detail to decide whether to retry it."""
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retryable: bool = False,
+        retry_after: Optional[float] = None
+    ) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def policy_for(model: str) -> Dict[str, Any]:
+    """
+    Return the resilience policy of a model.
+
+    Args:
+        model: PolzaAI model identifier
+
+    Returns:
+        MODEL_RESILIENCE_POLICY entry merged over DEFAULT_RESILIENCE_POLICY
+    """
+    return {**DEFAULT_RESILIENCE_POLICY, **MODEL_RESILIENCE_POLICY.get(model, {})}
+
+
+def is_retryable_status(model: str, status: int) -> bool:
+    """
+    Check whether an HTTP status is worth retrying for a model.
+
+    Args:
+        model: PolzaAI model identifier
+        status: HTTP status code returned upstream
+
+    Returns:
+        True if the status is in the model's retry_statuses
+    """
+    return status in policy_for(model)["retry_statuses"]
+
+
+def new_run_report() -> List[Dict[str, Any]]:
+    """
+    Start collecting retry/hedge events for a council run.
+
+    The report is bound to the current task and inherited by tasks it creates.
+
+    Returns:
+        The list that events will be appended to
+    """
+    report: List[Dict[str, Any]] = []
+    _run_report.set(report)
+    return report
+
+
+def report_event(kind: str, model: str, **details: Any) -> None:
+    """
+    Record a resilience event in the current run report, if there is one, and in the run trace.
+
+    Args:
+        kind: Event kind ("retry", "hedge", "hedge_won", "budget_exhausted")
+        model: PolzaAI model identifier
+        **details: Extra fields describing the event
+    """
+    report = _run_report.get()
+    if report is not None:
+        report.append({"kind": kind, "model": model, **details})
+    trace(f"upstream.{kind}", model=model, **details)
+
+
+@contextmanager
+def stage_budget(seconds: float) -> Iterator[None]:
+    """
+    Limit the total time upstream calls made inside the block may take.
+
+    Args:
+        seconds: Budget in seconds; 0 means no budget
+    """
+    if not seconds:
+        yield
+        return
+
+    deadline = asyncio.get_running_loop().time() + seconds
+    token = _stage_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        try:
+            _stage_deadline.reset(token)
+        except ValueError:
+            # Generator finalized from another context; the budget dies with it
+            pass
+
+
+def remaining_budget() -> Optional[float]:
+    """
+    Return the seconds left in the current stage budget.
+
+    Returns:
+        Remaining seconds, or None when no budget applies
+    """
+    deadline = _stage_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - asyncio.get_running_loop().time()
+
+
+def attempt_timeout(timeout: float) -> Optional[float]:
+    """
+    Clamp a request timeout to the current stage budget.
+
+    Args:
+        timeout: Requested timeout in seconds
+
+    Returns:
+        Timeout to use, or None if the budget is already spent
+    """
+    remaining = remaining_budget()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        return None
+    return min(timeout, remaining)
+
+
+def retry_delay(model: str, attempt: int, error: UpstreamError) -> Optional[float]:
+    """
+    Decide whether a failed attempt should be retried and after how long.
+
+    Uses full-jitter exponential backoff, never shorter than an upstream
+    Retry-After, and never past the current stage budget.
+
+    Args:
+        model: PolzaAI model identifier
+        attempt: Number of retries already made
+        error: The failure of the last attempt
+
+    Returns:
+        Seconds to sleep before the next attempt, or None to give up
+    """
+    policy = policy_for(model)
+    if not error.retryable or attempt >= policy["max_retries"]:
+        return None
+
+    delay = random.uniform(0, min(policy["backoff_max"], policy["backoff_base"] * (2 ** attempt)))
+    if error.retry_after:
+        delay = max(delay, error.retry_after)
+
+    remaining = remaining_budget()
+    if remaining is not None and delay >= remaining:
+        return None
+    return delay
+
+
+def record_latency(model: str, seconds: float, first_token: bool = False) -> None:
+    """
+    Remember the latency of a successful call for hedging decisions.
+
+    Args:
+        model: PolzaAI model identifier
+        seconds: Wall time of the call
+        first_token: Whether `seconds` is the time to the first token of a stream
+    """
+    latencies = _first_token_latencies if first_token else _latencies
+    window = latencies.get(model)
+    if window is None:
+        window = latencies[model] = deque(maxlen=_LATENCY_WINDOW)
+    window.append(seconds)
+
+
+def hedge_delay(model: str, first_token: bool = False) -> Optional[float]:
+    """
+    Return after how long a duplicate request should be started.
+
+    Args:
+        model: PolzaAI model identifier
+        first_token: Whether the request is a stream hedged until its first token
+
+    Returns:
+        Delay in seconds, or None if hedging is disabled or there is too little history
+    """
+    policy = policy_for(model)
+    percentile = policy["hedge_percentile"]
+    window = (_first_token_latencies if first_token else _latencies).get(model)
+    if not percentile or window is None or len(window) < policy["hedge_min_samples"]:
+        return None
+
+    ordered = sorted(window)
+    index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+    return max(ordered[index], policy["hedge_min_delay"])
+
+
+async def hedged(
+    model: str,
+    attempt: Callable[[float], Awaitable[T]],
+    timeout: float,
+    first_token: bool = False,
+    discard: Optional[Callable[[T], Awaitable[None]]] = None
+) -> T:
+    """
+    Run one attempt, adding a duplicate if it is slower than the hedging delay.
+
+    Args:
+        model: PolzaAI model identifier
+        attempt: Coroutine factory doing one upstream request; raises UpstreamError on failure
+        timeout: Per-attempt timeout in seconds
+        first_token: Whether `attempt` returns at the first token of a stream
+        discard: Called with the result of an attempt that finished too late to be used,
+            e.g. to close its stream
+
+    Returns:
+        The result of the first successful attempt
+    """
+    start = time.perf_counter()
+    delay = hedge_delay(model, first_token)
+
+    if delay is None or delay >= timeout:
+        result = await attempt(timeout)
+        record_latency(model, time.perf_counter() - start, first_token)
+        return result
+
+    primary = asyncio.create_task(attempt(timeout))
+    tasks = [primary]
+    winner: Optional[asyncio.Task] = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            result = primary.result()
+            record_latency(model, time.perf_counter() - start, first_token)
+            winner = primary
+            return result
+
+        report_event("hedge", model, after=round(delay, 3))
+        backup = asyncio.create_task(attempt(max(timeout - delay, 1.0)))
+        tasks.append(backup)
+        pending = {primary, backup}
+        first_error: Optional[BaseException] = None
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Prefer the primary if both finished in the same turn
+            for task in sorted(done, key=lambda task: task is not primary):
+                error = task.exception()
+                if error is None:
+                    if task is backup:
+                        report_event("hedge_won", model, elapsed=round(time.perf_counter() - start, 3))
+                    record_latency(model, time.perf_counter() - start, first_token)
+                    winner = task
+                    return task.result()
+                if first_error is None or task is primary:
+                    first_error = error
+        raise first_error
+    finally:
+        # The losing request (or both, if we were cancelled) must not keep its slot
+        unfinished = [task for task in tasks if not task.done()]
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            await asyncio.gather(*unfinished, return_exceptions=True)
+        if discard is not None:
+            for task in tasks:
+                if task is not winner and task.done() and not task.cancelled() and task.exception() is None:
+                    await discard(task.result())
+
+
+async def call_with_resilience(
+    model: str,
+    attempt: Callable[[float], Awaitable[T]],
+    timeout: float
+) -> T:
+    """
+    Call `attempt(timeout)` with the model's retry and hedging policy and the stage budget.
+
+    Args:
+        model: PolzaAI model identifier
+        attempt: Coroutine factory doing one upstream request; raises UpstreamError on failure
+        timeout: Per-attempt timeout in seconds
+
+    Returns:
+        The result of the first successful attempt
+
+    Raises:
+        UpstreamError: If every attempt failed or the stage budget ran out
+    """
+    retries = 0
+    while True:
+        budget_timeout = attempt_timeout(timeout)
+        if budget_timeout is None:
+            report_event("budget_exhausted", model, retries=retries)
+            raise UpstreamError(f"Stage budget exhausted for {model}")
+
+        try:
+            if remaining_budget() is None:
+                return await hedged(model, attempt, budget_timeout)
+            # Enforce the stage budget even if the transport doesn't time out on its own;
+            # not asyncio.wait_for, which on 3.11 can swallow a cancellation of the caller
+            try:
+                async with asyncio.timeout(budget_timeout):
+                    return await hedged(model, attempt, budget_timeout)
+            except asyncio.TimeoutError:
+                report_event("budget_exhausted", model, retries=retries)
+                raise UpstreamError(f"Stage budget exhausted for {model}")
+        except UpstreamError as e:
+            delay = retry_delay(model, retries, e)
+            if delay is None:
+                raise
+            retries += 1
+            report_event("retry", model, attempt=retries, reason=str(e), delay=round(delay, 3))
+            await asyncio.sleep(delay)
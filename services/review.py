@@ -0,0 +1,88 @@
+"""Stage 2 review strategies: which council members review which stage 1 answers."""
+
+import random
+from typing import List, Optional, Sequence, Tuple
+
+from .config import REVIEW_SAMPLE_SIZE, REVIEW_TOURNAMENT_ROUNDS
+
+# Strategy names accepted by the API and REVIEW_STRATEGY
+REVIEW_STRATEGIES = ("all", "judge", "sample", "tournament")
+
+# One review call: the reviewer, and the pair of answer indices it compares
+# (None = it ranks all answers)
+ReviewCall = Tuple[str, Optional[Tuple[int, int]]]
+
+
+def tournament_pairs(count: int, rounds: int = REVIEW_TOURNAMENT_ROUNDS) -> List[Tuple[int, int]]:
+    """
+    Schedule head-to-head pairs of answers for a round-robin tournament.
+
+    Round r pairs every answer i with answer (i + r) mod count, so each round
+    gives every answer two comparisons and `rounds` rounds cost about
+    count * rounds comparisons instead of all count * (count - 1) / 2 pairs.
+    With enough rounds every pair is played once.
+
+    Args:
+        count: Number of answers
+        rounds: Rounds to play
+
+    Returns:
+        Pairs of answer indices, without repeats
+    """
+    pairs: List[Tuple[int, int]] = []
+    seen = set()
+    for offset in range(1, min(max(rounds, 1), count - 1) + 1):
+        for i in range(count):
+            pair = (min(i, (i + offset) % count), max(i, (i + offset) % count))
+            if pair not in seen:
+                seen.add(pair)
+                pairs.append(pair)
+    return pairs
+
+
+def plan_reviews(
+    strategy: str,
+    members: Sequence[str],
+    authors: Sequence[str],
+    judge: str
+) -> List[ReviewCall]:
+    """
+    Decide who reviews what in stage 2.
+
+    "all" asks every member to rank every answer (quadratic in the council
+    size: N prompts of N answers each). "judge" asks one model, "sample" asks
+    REVIEW_SAMPLE_SIZE random members. "tournament" sends each scheduled pair
+    of answers (see tournament_pairs) to the least busy member who wrote
+    neither of them; the order within a pair alternates so no answer is
+    always shown first.
+
+    Args:
+        strategy: One of REVIEW_STRATEGIES
+        members: Council members of the run
+        authors: Model of each stage 1 answer, in answer order
+        judge: Model used by the "judge" strategy
+
+    Returns:
+        Review calls, one per upstream request
+
+    Raises:
+        ValueError: If the strategy is unknown
+    """
+    if strategy == "all":
+        return [(member, None) for member in members]
+    if strategy == "judge":
+        return [(judge, None)]
+    if strategy == "sample":
+        return [(member, None) for member in random.sample(list(members), min(REVIEW_SAMPLE_SIZE, len(members)))]
+    if strategy == "tournament":
+        calls: List[ReviewCall] = []
+        load = {member: 0 for member in members}
+        for index, (first, second) in enumerate(tournament_pairs(len(authors))):
+            neutral = [member for member in members if member not in (authors[first], authors[second])]
+            # Least busy neutral member, so the comparisons run spread over the council
+            reviewer = min(neutral or list(members), key=lambda member: load[member])
+            load[reviewer] += 1
+            pair = (first, second) if index % 2 == 0 else (second, first)
+            calls.append((reviewer, pair))
+        return calls
+    raise ValueError(f"Unknown review strategy: {strategy!r} (expected one of {', '.join(REVIEW_STRATEGIES)})")
@@ -0,0 +1,421 @@
+"""Near-duplicate index of past council results: MinHash/LSH over character shingles of queries."""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache import normalize_query
+from .config import (
+    SEMANTIC_CACHE_MODE,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_PATH,
+    SEMANTIC_CACHE_SHINGLE_SIZE,
+    SEMANTIC_CACHE_BANDS,
+    SEMANTIC_CACHE_ROWS,
+    COUNCIL_WORKERS,
+    REVIEW_STRATEGY,
+)
+from .metrics import SEMANTIC_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    # The index needs NumPy; without it SEMANTIC_CACHE_MODE is ignored
+    np = None
+
+_WORD_RE = re.compile(r"\w+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+# Universal hashing modulo a Mersenne prime stands in for the MinHash permutations.
+# The seed is fixed so signatures stored on disk stay comparable across restarts.
+_PRIME = (1 << 31) - 1
+_SEED = 0x5EC0DE
+
+# Rows per chunk when hashing stored signatures into LSH band keys
+_CHUNK_ROWS = 65536
+
+# New band keys wait in an unsorted buffer of at least this many rows (or 1/16 of the
+# index) and are merged into the sorted arrays in one rebuild when it fills up
+_MIN_PENDING_ROWS = 1024
+
+
+def query_shingles(user_query: str, size: int = SEMANTIC_CACHE_SHINGLE_SIZE) -> List[str]:
+    """
+    Split a query into character shingles, word by word.
+
+    Shingles never span two words, so reordering the words keeps the set, and a
+    typo changes only the few shingles around it. Punctuation is dropped.
+
+    Args:
+        user_query: The user's question
+        size: Shingle length in characters (words are padded with a space on each side)
+
+    Returns:
+        Sorted distinct shingles
+    """
+    result = set()
+    for word in _WORD_RE.findall(normalize_query(user_query)):
+        padded = f" {word} "
+        result.update(padded[i:i + size] for i in range(max(len(padded) - size + 1, 1)))
+    return sorted(result)
+
+
+def _words(user_query: str) -> str:
+    return " ".join(_WORD_RE.findall(normalize_query(user_query)))
+
+
+def _numbers(user_query: str) -> List[str]:
+    # "2+2" and "2+3" share almost every shingle; a match must mention the same numbers
+    return sorted(_NUMBER_RE.findall(user_query))
+
+
+class NearDuplicateIndex:
+    """
+    Index of council results by query, matched by estimated Jaccard similarity.
+
+    Each query gets a MinHash signature of bands * rows 32-bit values. For the
+    LSH lookup, every band of a signature is folded into one 64-bit key, and
+    each band keeps its keys in a sorted array, so finding the candidates that
+    share a band is one binary search per band. Keys of new entries go to a
+    small unsorted buffer, scanned with one vectorized comparison, and are
+    merged into the sorted arrays when it fills up; keys of overwritten slots
+    are dropped at that point too (until then they only yield extra candidates).
+    Candidates are scored against the query's full signature with one
+    vectorized comparison.
+
+    Signatures and insertion times live in fixed-size memory-mapped .npy files
+    (SEMANTIC_CACHE_MAX_ENTRIES rows), and the stored results in a SQLite file
+    next to them. A new entry takes the slot of the oldest one once the index
+    is full, and entries older than the TTL are no longer matched. A result is
+    only matched by requests with the same review strategy.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int,
+        ttl: float,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        bands: int = SEMANTIC_CACHE_BANDS,
+        rows: int = SEMANTIC_CACHE_ROWS
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.sets = 0
+
+        rng = np.random.default_rng(_SEED)
+        hashes = bands * rows
+        self._a = rng.integers(1, _PRIME, hashes, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, hashes, dtype=np.uint64)
+        self._band_weights = rng.integers(1, 1 << 63, rows, dtype=np.uint64) | np.uint64(1)
+
+        os.makedirs(path, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(path, "entries.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "slot INTEGER PRIMARY KEY, query TEXT NOT NULL, result TEXT NOT NULL, "
+            "review_strategy TEXT NOT NULL DEFAULT '')"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+        if "review_strategy" not in columns:
+            # Entries stored before the strategy was recorded never match again
+            self._conn.execute("ALTER TABLE entries ADD COLUMN review_strategy TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+        self._signatures, self._created = self._open_arrays(hashes)
+        self._pending_keys = np.empty((max(_MIN_PENDING_ROWS, max_entries // 16), bands), dtype=np.uint64)
+        self._pending_slots = np.empty(len(self._pending_keys), dtype=np.int64)
+        self._build_bands()
+        self._lock = asyncio.Lock()
+
+    def _open_arrays(self, hashes: int) -> Tuple[Any, Any]:
+        """Map the signature and timestamp files, recreating them if their shape changed."""
+        signatures_path = os.path.join(self.path, "signatures.npy")
+        created_path = os.path.join(self.path, "created.npy")
+        try:
+            signatures = np.load(signatures_path, mmap_mode="r+")
+            created = np.load(created_path, mmap_mode="r+")
+            if signatures.shape == (self.max_entries, hashes) and created.shape == (self.max_entries,):
+                return signatures, created
+        except (OSError, ValueError):
+            pass
+
+        # New index, or SEMANTIC_CACHE_MAX_ENTRIES/BANDS/ROWS changed: start empty
+        self._conn.execute("DELETE FROM entries")
+        self._conn.commit()
+        signatures = np.lib.format.open_memmap(
+            signatures_path, mode="w+", dtype=np.uint32, shape=(self.max_entries, hashes)
+        )
+        created = np.lib.format.open_memmap(
+            created_path, mode="w+", dtype=np.float64, shape=(self.max_entries,)
+        )
+        return signatures, created
+
+    def _signature(self, shingles: List[str]) -> Any:
+        hashed = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64, count=len(shingles)
+        )
+        # a < 2^31 and crc32 < 2^32, so the products fit in 64 bits
+        values = (self._a[:, None] * hashed[None, :] + self._b[:, None]) % np.uint64(_PRIME)
+        return values.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signatures: Any) -> Any:
+        # uint64 arithmetic wraps around, which is fine for hashing
+        folded = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (folded * self._band_weights).sum(axis=2, dtype=np.uint64)
+
+    def _build_bands(self) -> None:
+        """Rebuild the sorted band keys of every stored entry and the eviction order."""
+        slots = np.flatnonzero(self._created > 0)
+        keys = np.empty((len(slots), self.bands), dtype=np.uint64)
+        for start in range(0, len(slots), _CHUNK_ROWS):
+            chunk = slots[start:start + _CHUNK_ROWS]
+            keys[start:start + len(chunk)] = self._band_keys(self._signatures[chunk])
+
+        self._keys: List[Any] = []
+        self._slots: List[Any] = []
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind="stable")
+            self._keys.append(keys[order, band])
+            self._slots.append(slots[order])
+        self._pending = 0
+
+        # Slots oldest first (empty ones before all others), with the times they had
+        # now; a slot written since then no longer matches its time and is skipped
+        self._eviction_order = np.argsort(self._created, kind="stable")
+        self._eviction_created = self._created[self._eviction_order].copy()
+        self._eviction_next = 0
+
+    def _index(self, slot: int, keys: Any) -> None:
+        if self._pending == len(self._pending_keys):
+            # Rebuilt from the stored signatures, which already include this slot
+            self._build_bands()
+            return
+        self._pending_keys[self._pending] = keys
+        self._pending_slots[self._pending] = slot
+        self._pending += 1
+
+    def _oldest_slot(self) -> int:
+        """The slot a new entry takes: an empty one, else the oldest entry."""
+        while True:
+            while self._eviction_next < len(self._eviction_order):
+                position = self._eviction_next
+                self._eviction_next += 1
+                slot = int(self._eviction_order[position])
+                if self._created[slot] == self._eviction_created[position]:
+                    return slot
+            # Every slot was written since the order was taken
+            self._eviction_order = np.argsort(self._created, kind="stable")
+            self._eviction_created = self._created[self._eviction_order].copy()
+            self._eviction_next = 0
+
+    def _candidates(self, signature: Any) -> Tuple[Any, Any]:
+        """Live entries sharing at least one band with the signature, and their similarity."""
+        keys = self._band_keys(signature[None, :])[0]
+        found = []
+        for band, key in enumerate(keys):
+            low = np.searchsorted(self._keys[band], key, "left")
+            high = np.searchsorted(self._keys[band], key, "right")
+            if high > low:
+                found.append(self._slots[band][low:high])
+        if self._pending:
+            shared = (self._pending_keys[:self._pending] == keys).any(axis=1)
+            found.append(self._pending_slots[:self._pending][shared])
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        slots = np.unique(np.concatenate(found))
+        slots = slots[self._created[slots] >= time.time() - self.ttl]
+        # Share of equal MinHash values estimates the Jaccard similarity of the shingle sets
+        return slots, (self._signatures[slots] == signature).mean(axis=1)
+
+    def _lookup(self, user_query: str, review_strategy: str) -> Optional[Dict[str, Any]]:
+        shingles = query_shingles(user_query)
+        if not shingles:
+            return None
+        slots, similarity = self._candidates(self._signature(shingles))
+        numbers = _numbers(normalize_query(user_query))
+        for i in np.argsort(-similarity, kind="stable"):
+            if similarity[i] < self.threshold:
+                break
+            slot = int(slots[i])
+            row = self._conn.execute(
+                "SELECT query, result FROM entries WHERE slot = ? AND review_strategy = ?",
+                (slot, review_strategy)
+            ).fetchone()
+            if row is not None and _numbers(normalize_query(row[0])) == numbers:
+                return {
+                    "query": row[0],
+                    "similarity": round(float(similarity[i]), 3),
+                    "age": round(time.time() - float(self._created[slot]), 1),
+                    "result": json.loads(row[1])
+                }
+        return None
+
+    def _add(self, user_query: str, result: Dict[str, Any], review_strategy: str) -> None:
+        shingles = query_shingles(user_query)
+        if not shingles:
+            return
+        signature = self._signature(shingles)
+
+        # The same question asked again refreshes its entry instead of adding a copy
+        slot = None
+        slots, similarity = self._candidates(signature)
+        words = _words(user_query)
+        for candidate in slots[similarity == 1.0]:
+            row = self._conn.execute(
+                "SELECT query FROM entries WHERE slot = ? AND review_strategy = ?",
+                (int(candidate), review_strategy)
+            ).fetchone()
+            if row is not None and _words(row[0]) == words:
+                slot = int(candidate)
+                break
+        if slot is None:
+            slot = self._oldest_slot()
+            if self._created[slot] > 0:
+                self.evictions += 1
+
+        self._signatures[slot] = signature
+        self._created[slot] = time.time()
+        self._index(slot, self._band_keys(signature[None, :])[0])
+        self._conn.execute(
+            "INSERT OR REPLACE INTO entries (slot, query, result, review_strategy) VALUES (?, ?, ?, ?)",
+            (slot, user_query, json.dumps(result, ensure_ascii=False), review_strategy)
+        )
+        self._conn.commit()
+        self._signatures.flush()
+        self._created.flush()
+        self.sets += 1
+
+    async def get(self, user_query: str, review_strategy: str = REVIEW_STRATEGY) -> Optional[Dict[str, Any]]:
+        """
+        Find the stored result of the most similar past query.
+
+        Args:
+            user_query: The user's question
+            review_strategy: Stage 2 review strategy the result must have been produced with
+
+        Returns:
+            Dict with the matched 'query', its 'similarity', 'age' in seconds and
+            'result' in the /council format, or None below the threshold
+        """
+        async with self._lock:
+            match = await asyncio.to_thread(self._lookup, user_query, review_strategy)
+        if match is None:
+            self.misses += 1
+            SEMANTIC_CACHE_LOOKUPS.inc(outcome="miss")
+        else:
+            self.hits += 1
+            SEMANTIC_CACHE_LOOKUPS.inc(outcome="hit")
+        return match
+
+    async def add(self, user_query: str, result: Dict[str, Any], review_strategy: str = REVIEW_STRATEGY) -> None:
+        """
+        Store the result of a council run.
+
+        Args:
+            user_query: The user's question
+            result: Result in the /council format (see format_for_frontend)
+            review_strategy: Stage 2 review strategy the run used
+        """
+        async with self._lock:
+            await asyncio.to_thread(self._add, user_query, result, review_strategy)
+
+    def size(self) -> int:
+        return int(np.count_nonzero(self._created >= time.time() - self.ttl))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return index counters.
+
+        Returns:
+            Dict with mode, threshold, size, hits, misses, evictions and sets
+        """
+        return {
+            "mode": SEMANTIC_CACHE_MODE,
+            "threshold": self.threshold,
+            "size": self.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "sets": self.sets,
+        }
+
+
+_index: Optional[NearDuplicateIndex] = None
+_index_built = False
+
+
+def get_semantic_cache() -> Optional[NearDuplicateIndex]:
+    """
+    Return the process-wide near-duplicate index, creating it on first use.
+
+    Returns:
+        The index, or None when SEMANTIC_CACHE_MODE is "off", NumPy is missing
+        or several workers serve the app
+    """
+    global _index, _index_built
+    if not _index_built:
+        _index_built = True
+        if SEMANTIC_CACHE_MODE != "off":
+            if np is None:
+                logger.warning("SEMANTIC_CACHE_MODE needs NumPy; near-duplicate index disabled")
+            elif COUNCIL_WORKERS > 1:
+                # The index files are written by one process; workers would overwrite each other's entries
+                logger.warning("SEMANTIC_CACHE_MODE needs COUNCIL_WORKERS=1; near-duplicate index disabled")
+            else:
+                _index = NearDuplicateIndex(SEMANTIC_CACHE_PATH, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_TTL)
+    return _index
+
+
+async def find_near_duplicate(
+    user_query: str,
+    cache_stages: Optional[List[str]] = None,
+    review_strategy: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Look up the stored result of a near-duplicate query for a request.
+
+    Args:
+        user_query: The user's question
+        cache_stages: The request's cache stages; [] bypasses the index like the stage cache
+        review_strategy: The request's review strategy (None = REVIEW_STRATEGY)
+
+    Returns:
+        Match as returned by NearDuplicateIndex.get, or None
+    """
+    index = get_semantic_cache()
+    if index is None or cache_stages == []:
+        return None
+    return await index.get(user_query, review_strategy or REVIEW_STRATEGY)
+
+
+def semantic_cache_stats() -> Dict[str, Any]:
+    """
+    Return counters of the near-duplicate index.
+
+    Returns:
+        Dict with index counters, or {'mode': 'off'} when disabled
+    """
+    index = get_semantic_cache()
+    if index is None:
+        return {"mode": "off"}
+    return index.stats()
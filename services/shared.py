@@ -0,0 +1,504 @@
+"""State shared by the worker processes of a multi-worker deployment."""
+
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Coroutine, Iterator, List, Optional, Set, Tuple
+
+from .config import (
+    SHARED_STATE_BACKEND,
+    SHARED_STATE_PATH,
+    SHARED_STATE_REDIS_URL,
+    SHARED_POLL_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    # Optional: only SHARED_STATE_BACKEND=redis needs it
+    redis = None
+
+# Seconds an admission may take before its permit is timestamped again (Redis backend)
+_CLOCK_SLACK = 0.005
+
+# Fire-and-forget updates (e.g. a backoff after a 429), kept referenced until they finish
+_background: Set[asyncio.Task] = set()
+
+
+class SharedState:
+    """
+    Base class for state backends shared across worker processes.
+
+    Every operation is atomic across processes, and everything a worker holds
+    expires on its own, so a worker that dies holding a lease or a claim
+    blocks the others for its TTL at most.
+    """
+
+    async def admit(
+        self,
+        key: str,
+        max_concurrent: int,
+        rate: float,
+        burst: float,
+        lease_ttl: float
+    ) -> Tuple[Optional[str], float]:
+        """
+        Take a concurrency lease and a rate permit for `key`.
+
+        The rate limit is a sliding window: at most `burst` admissions within
+        any burst / rate seconds. When workers race for the last lease or
+        permit, all of them may be refused, never more than the limit admitted.
+
+        Args:
+            key: Limiter name
+            max_concurrent: Leases that may be held at once (0 = no limit)
+            rate: Admissions per second (0 = no rate limit)
+            burst: Admissions allowed at once
+            lease_ttl: Seconds after which a lease that wasn't released expires
+
+        Returns:
+            (lease id, 0.0) when admitted, else (None, seconds to wait before trying again)
+        """
+        raise NotImplementedError
+
+    async def release(self, key: str, lease: str) -> None:
+        """Return a lease taken with admit."""
+        raise NotImplementedError
+
+    async def block(self, key: str, seconds: float) -> None:
+        """Refuse admissions for `key` in every worker for `seconds`."""
+        raise NotImplementedError
+
+    async def claim(self, key: str, owner: str, ttl: float) -> Optional[str]:
+        """
+        Claim `key` for `owner` unless another owner holds an unexpired claim.
+
+        Claiming a key `owner` already holds renews the claim for `ttl`.
+
+        Returns:
+            The owner holding the claim now (`owner` if it was granted), or
+            None if the other owner's claim ended meanwhile
+        """
+        raise NotImplementedError
+
+    async def unclaim(self, key: str, owner: str) -> None:
+        """Drop `owner`'s claim on `key` (a claim taken over by someone else stays)."""
+        raise NotImplementedError
+
+    async def holder(self, key: str) -> Optional[str]:
+        """Return the owner of the unexpired claim on `key`, or None."""
+        raise NotImplementedError
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the unexpired value stored under `key`, or None."""
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        """Store `value` under `key` for `ttl` seconds."""
+        raise NotImplementedError
+
+    async def append(self, key: str, values: List[str], ttl: float) -> None:
+        """Append `values` to the list under `key` and keep the list for `ttl` seconds."""
+        raise NotImplementedError
+
+    async def items(self, key: str, start: int = 0) -> List[str]:
+        """Return the values of the list under `key` from position `start` on."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release the backend's connections."""
+
+
+class SQLiteSharedState(SharedState):
+    """
+    Shared state in a WAL-mode SQLite file, for the workers of one host.
+
+    Each operation is one IMMEDIATE transaction (the file lock serializes
+    them across processes), run in a worker thread.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            "key TEXT NOT NULL, lease TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (key, lease)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS permits ("
+            "key TEXT NOT NULL, lease TEXT NOT NULL, at REAL NOT NULL, "
+            "PRIMARY KEY (key, lease)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS permits_at ON permits (key, at);"
+            "CREATE TABLE IF NOT EXISTS blocks (key TEXT PRIMARY KEY, until REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS claims ("
+            "key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at);"
+            "CREATE TABLE IF NOT EXISTS lists ("
+            "key TEXT NOT NULL, position INTEGER NOT NULL, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (key, position)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS lists_expires ON lists (expires_at);"
+        )
+        self._lock = asyncio.Lock()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # IMMEDIATE takes the write lock up front, so read-then-write can't interleave
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    async def _run(self, func, *args) -> Any:
+        async with self._lock:
+            return await asyncio.to_thread(func, *args)
+
+    def _admit(
+        self,
+        key: str,
+        max_concurrent: int,
+        rate: float,
+        burst: float,
+        lease_ttl: float
+    ) -> Tuple[Optional[str], float]:
+        now = time.time()
+        conn = self._conn
+        with self._transaction():
+            row = conn.execute("SELECT until FROM blocks WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] > now:
+                return None, row[0] - now
+
+            conn.execute("DELETE FROM leases WHERE key = ? AND expires_at < ?", (key, now))
+            if max_concurrent > 0:
+                (held,) = conn.execute("SELECT COUNT(*) FROM leases WHERE key = ?", (key,)).fetchone()
+                if held >= max_concurrent:
+                    return None, SHARED_POLL_INTERVAL
+
+            lease = uuid.uuid4().hex
+            if rate > 0:
+                window = burst / rate
+                conn.execute("DELETE FROM permits WHERE key = ? AND at <= ?", (key, now - window))
+                count, oldest = conn.execute(
+                    "SELECT COUNT(*), MIN(at) FROM permits WHERE key = ?", (key,)
+                ).fetchone()
+                if count >= int(burst):
+                    return None, max(oldest + window - now, SHARED_POLL_INTERVAL)
+                conn.execute("INSERT INTO permits (key, lease, at) VALUES (?, ?, ?)", (key, lease, now))
+
+            conn.execute(
+                "INSERT INTO leases (key, lease, expires_at) VALUES (?, ?, ?)", (key, lease, now + lease_ttl)
+            )
+        return lease, 0.0
+
+    def _release(self, key: str, lease: str) -> None:
+        with self._transaction():
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND lease = ?", (key, lease))
+
+    def _block(self, key: str, seconds: float) -> None:
+        with self._transaction():
+            self._conn.execute(
+                "INSERT INTO blocks (key, until) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET until = MAX(until, excluded.until)",
+                (key, time.time() + seconds)
+            )
+
+    def _claim(self, key: str, owner: str, ttl: float) -> Optional[str]:
+        now = time.time()
+        with self._transaction():
+            self._conn.execute(
+                "INSERT INTO claims (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE claims.expires_at < ? OR claims.owner = excluded.owner",
+                (key, owner, now + ttl, now)
+            )
+            row = self._conn.execute("SELECT owner FROM claims WHERE key = ?", (key,)).fetchone()
+        return row[0]
+
+    def _unclaim(self, key: str, owner: str) -> None:
+        with self._transaction():
+            self._conn.execute("DELETE FROM claims WHERE key = ? AND owner = ?", (key, owner))
+
+    def _holder(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT owner FROM claims WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def _set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, now + ttl)
+            )
+            self._conn.execute("DELETE FROM kv WHERE expires_at < ?", (now,))
+
+    def _append(self, key: str, values: List[str], ttl: float) -> None:
+        now = time.time()
+        with self._transaction():
+            (end,) = self._conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM lists WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.executemany(
+                "INSERT INTO lists (key, position, value, expires_at) VALUES (?, ?, ?, ?)",
+                [(key, end + offset, value, now + ttl) for offset, value in enumerate(values)]
+            )
+            self._conn.execute("UPDATE lists SET expires_at = ? WHERE key = ?", (now + ttl, key))
+            self._conn.execute("DELETE FROM lists WHERE expires_at < ?", (now,))
+
+    def _items(self, key: str, start: int) -> List[str]:
+        rows = self._conn.execute(
+            "SELECT value FROM lists WHERE key = ? AND position >= ? AND expires_at >= ? ORDER BY position",
+            (key, start, time.time())
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    async def admit(self, key, max_concurrent, rate, burst, lease_ttl):
+        return await self._run(self._admit, key, max_concurrent, rate, burst, lease_ttl)
+
+    async def release(self, key, lease):
+        await self._run(self._release, key, lease)
+
+    async def block(self, key, seconds):
+        await self._run(self._block, key, seconds)
+
+    async def claim(self, key, owner, ttl):
+        return await self._run(self._claim, key, owner, ttl)
+
+    async def unclaim(self, key, owner):
+        await self._run(self._unclaim, key, owner)
+
+    async def holder(self, key):
+        return await self._run(self._holder, key)
+
+    async def get(self, key):
+        return await self._run(self._get, key)
+
+    async def set(self, key, value, ttl):
+        await self._run(self._set, key, value, ttl)
+
+    async def append(self, key, values, ttl):
+        if values:
+            await self._run(self._append, key, values, ttl)
+
+    async def items(self, key, start=0):
+        return await self._run(self._items, key, start)
+
+    async def close(self):
+        async with self._lock:
+            self._conn.close()
+
+
+class RedisSharedState(SharedState):
+    """
+    Shared state in Redis (or a compatible server), for workers on several hosts.
+
+    Uses no scripts, so any server speaking the Redis protocol works.
+    Admission adds its lease and permit first and then counts, taking them
+    back if over the limit. Renewing and releasing a claim check its owner
+    under WATCH/MULTI/EXEC, so a claim that expired and went to another worker
+    in between is left alone.
+    """
+
+    def __init__(self, url: str, prefix: str = "council:") -> None:
+        self.url = url
+        self.prefix = prefix
+        # RESP2: servers without HELLO (older or Redis-compatible ones) understand it too
+        self._redis = redis.from_url(url, decode_responses=True, protocol=2)
+
+    async def admit(self, key, max_concurrent, rate, burst, lease_ttl):
+        now = time.time()
+        lease = uuid.uuid4().hex
+        leases = f"{self.prefix}leases:{key}"
+        permits = f"{self.prefix}permits:{key}"
+        window = burst / rate if rate > 0 else 0.0
+
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.get(f"{self.prefix}block:{key}")
+        # Lease scores are expiry times, permit scores admission times
+        pipe.zremrangebyscore(leases, "-inf", now)
+        pipe.zadd(leases, {lease: now + lease_ttl})
+        pipe.pexpire(leases, int(lease_ttl * 1000))
+        pipe.zcard(leases)
+        if rate > 0:
+            pipe.zremrangebyscore(permits, "-inf", now - window)
+            pipe.zadd(permits, {lease: now})
+            pipe.pexpire(permits, int(window * 1000) + 1000)
+            pipe.zcard(permits)
+            pipe.zrange(permits, 0, 0, withscores=True)
+        results = await pipe.execute()
+
+        wait = 0.0
+        blocked_until = float(results[0]) if results[0] else 0.0
+        if blocked_until > now:
+            wait = blocked_until - now
+        elif max_concurrent > 0 and results[4] > max_concurrent:
+            wait = SHARED_POLL_INTERVAL
+        elif rate > 0 and results[8] > int(burst):
+            oldest = results[9][0][1] if results[9] else now
+            wait = max(oldest + window - now, SHARED_POLL_INTERVAL)
+        if wait:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.zrem(leases, lease)
+            pipe.zrem(permits, lease)
+            await pipe.execute()
+            return None, wait
+        if rate > 0 and time.time() - now > _CLOCK_SLACK:
+            # The permit counts from when the server saw it, not from when it was sent
+            await self._redis.zadd(permits, {lease: time.time()}, xx=True)
+        return lease, 0.0
+
+    async def release(self, key, lease):
+        await self._redis.zrem(f"{self.prefix}leases:{key}", lease)
+
+    async def block(self, key, seconds):
+        name = f"{self.prefix}block:{key}"
+        until = time.time() + seconds
+        current = await self._redis.get(name)
+        if current is None or float(current) < until:
+            await self._redis.set(name, repr(until), px=max(int(seconds * 1000), 1))
+
+    async def _if_owner(self, name: str, owner: str, command: str, *args: Any) -> Optional[str]:
+        """Run `command` on claim `name` only if `owner` holds it; returns the holder seen."""
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(name)
+                    holder = await pipe.get(name)
+                    if holder != owner:
+                        return holder
+                    pipe.multi()
+                    getattr(pipe, command)(name, *args)
+                    await pipe.execute()
+                    return holder
+                except redis.WatchError:
+                    # Changed between the check and the command: look again
+                    continue
+
+    async def claim(self, key, owner, ttl):
+        name = f"{self.prefix}claim:{key}"
+        if await self._redis.set(name, owner, nx=True, px=int(ttl * 1000)):
+            return owner
+        holder = await self._if_owner(name, owner, "pexpire", int(ttl * 1000))
+        if holder is None:
+            # Expired just now: take it like any other free claim
+            return await self.claim(key, owner, ttl)
+        return holder
+
+    async def unclaim(self, key, owner):
+        await self._if_owner(f"{self.prefix}claim:{key}", owner, "delete")
+
+    async def holder(self, key):
+        return await self._redis.get(f"{self.prefix}claim:{key}")
+
+    async def get(self, key):
+        return await self._redis.get(f"{self.prefix}kv:{key}")
+
+    async def set(self, key, value, ttl):
+        await self._redis.set(f"{self.prefix}kv:{key}", value, px=int(ttl * 1000))
+
+    async def append(self, key, values, ttl):
+        if not values:
+            return
+        name = f"{self.prefix}list:{key}"
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.rpush(name, *values)
+        pipe.pexpire(name, int(ttl * 1000))
+        await pipe.execute()
+
+    async def items(self, key, start=0):
+        return await self._redis.lrange(f"{self.prefix}list:{key}", start, -1)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def _build_shared_state() -> Optional[SharedState]:
+    """
+    Create the configured shared state backend.
+
+    Returns:
+        Backend, or None when SHARED_STATE_BACKEND is "none" (or "redis" without the package)
+    """
+    if SHARED_STATE_BACKEND == "sqlite":
+        return SQLiteSharedState(SHARED_STATE_PATH)
+    if SHARED_STATE_BACKEND == "redis":
+        if redis is None:
+            logger.warning("SHARED_STATE_BACKEND=redis needs the redis package; workers don't share state")
+            return None
+        return RedisSharedState(SHARED_STATE_REDIS_URL)
+    return None
+
+
+_shared: Optional[SharedState] = None
+_shared_built = False
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """
+    Return the process-wide shared state backend, creating it on first use.
+
+    Returns:
+        Backend, or None when workers don't share state
+    """
+    global _shared, _shared_built
+    if not _shared_built:
+        _shared = _build_shared_state()
+        _shared_built = True
+    return _shared
+
+
+def set_shared_state(shared: Optional[SharedState]) -> None:
+    """
+    Replace the process-wide shared state backend.
+
+    Args:
+        shared: Backend to use from now on, or None to keep state per worker
+    """
+    global _shared, _shared_built
+    _shared = shared
+    _shared_built = True
+
+
+def in_background(update: Coroutine) -> None:
+    """
+    Run a shared state update without waiting for it; failures are logged.
+
+    Args:
+        update: Coroutine calling the backend
+    """
+    async def run() -> None:
+        try:
+            await update
+        except Exception as e:
+            logger.warning("Shared state update failed: %s", e)
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def close_shared_state() -> None:
+    """Wait for background updates and close the backend. Called from the app lifespan."""
+    global _shared, _shared_built
+    if _background:
+        await asyncio.gather(*_background, return_exceptions=True)
+    if _shared is not None:
+        await _shared.close()
+    _shared = None
+    _shared_built = False
@@ -0,0 +1,343 @@
+"""Single-flight coalescing of identical concurrent council streams, within and across workers."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from .cache import normalize_query
+from .config import SHARED_LEASE_TTL, SHARED_POLL_INTERVAL
+from .shared import SharedState, get_shared_state, in_background
+
+logger = logging.getLogger(__name__)
+
+
+def run_key(user_query: str, *parts: Any) -> str:
+    """
+    Build the coalescing key of a council run.
+
+    Args:
+        user_query: The user's question
+        *parts: Other request options that change the result (e.g. cache_stages)
+
+    Returns:
+        Key shared by requests that would produce the same event stream
+    """
+    return repr((normalize_query(user_query),) + parts)
+
+
+class InFlightRun:
+    """
+    One upstream council execution fanned out to any number of subscribers.
+
+    Events are recorded as they are produced, so a subscriber that joins late
+    first replays everything emitted so far and then follows the live stream.
+    The execution is cancelled when its last subscriber goes away; from that
+    moment it accepts no new subscribers, and its end counts as an error.
+    """
+
+    def __init__(self, source: AsyncIterator[Dict[str, Any]]) -> None:
+        self.events: List[Dict[str, Any]] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        # Set when the task is cancelled, before it has finished unwinding
+        self.cancelling = False
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._drive(source))
+
+    def _notify(self) -> None:
+        # Wake current waiters and hand out a fresh event for the next wait
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _drive(self, source: AsyncIterator[Dict[str, Any]]) -> None:
+        try:
+            async for event in source:
+                self.events.append(event)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        except asyncio.CancelledError:
+            # A truncated run must never look complete to anyone following it
+            self.error = RuntimeError("The council run was cancelled")
+            raise
+        finally:
+            self.done = True
+            self._notify()
+
+    @property
+    def joinable(self) -> bool:
+        """Whether a new request may still subscribe to this run."""
+        return not self.done and not self.cancelling
+
+    def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Register a subscriber and iterate over the run's events from the beginning.
+
+        Returns:
+            Async iterator over every event of the run, replayed and then live
+        """
+        # Counted right away so a subscriber leaving can't cancel a run others just joined
+        self.subscribers += 1
+        return self._follow()
+
+    async def _follow(self) -> AsyncIterator[Dict[str, Any]]:
+        position = 0
+        try:
+            while True:
+                while position < len(self.events):
+                    yield self.events[position]
+                    position += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self.cancelling = True
+                self.task.cancel()
+
+
+# The worker running a shared run checks whether another worker follows it every
+# SHARED_POLL_INTERVAL at first (duplicates tend to arrive together), backing off to this
+_FOLLOWED_CHECK_MAX_INTERVAL = 1.0
+
+# Run claims are renewed while the run executes, so followers of a worker that died or
+# shut down find out within this many seconds
+_CLAIM_TTL = 15.0
+
+
+class _RunLost(Exception):
+    """The run followed in another worker ended without finishing (cancelled, or the worker died)."""
+
+
+class _RunPublisher:
+    """
+    Publishes the events of a run this worker holds the claim for, once another worker follows it.
+
+    Nothing is written for runs nobody else asked for; a follower that shows
+    up late gets the whole run so far. Events are appended in batches at most
+    every SHARED_POLL_INTERVAL.
+    """
+
+    def __init__(
+        self,
+        shared: SharedState,
+        name: str,
+        owner: str,
+        on_followed: Callable[[], None]
+    ) -> None:
+        self.shared = shared
+        self.name = name
+        self.owner = owner
+        self.on_followed = on_followed
+        self.events: List[Dict[str, Any]] = []
+        self.sent = 0
+        self.followed = False
+        self.closing = False
+        self.task = asyncio.create_task(self._publish())
+
+    async def _check_followed(self) -> None:
+        if not self.followed:
+            self.followed = await self.shared.get(f"{self.name}:{self.owner}:followed") is not None
+            if self.followed:
+                self.on_followed()
+
+    async def _send(self, extra: Optional[Dict[str, Any]] = None) -> None:
+        end = len(self.events)
+        batch = self.events[self.sent:end] + ([extra] if extra is not None else [])
+        if batch:
+            await self.shared.append(
+                f"{self.name}:{self.owner}",
+                [json.dumps(event, ensure_ascii=False, default=str) for event in batch],
+                SHARED_LEASE_TTL
+            )
+            self.sent = end
+
+    async def _publish(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = SHARED_POLL_INTERVAL
+        next_check = loop.time()
+        renewed = loop.time()
+        while not self.closing:
+            try:
+                if loop.time() - renewed >= _CLAIM_TTL / 3:
+                    renewed = loop.time()
+                    await self.shared.claim(self.name, self.owner, _CLAIM_TTL)
+                if not self.followed and loop.time() >= next_check:
+                    await self._check_followed()
+                    next_check = loop.time() + interval
+                    interval = min(interval * 2, _FOLLOWED_CHECK_MAX_INTERVAL)
+                if self.followed:
+                    await self._send()
+            except Exception as e:
+                logger.warning("Could not publish council run events: %s", e)
+            await asyncio.sleep(SHARED_POLL_INTERVAL)
+
+    async def close(self, outcome: Dict[str, Any]) -> None:
+        """Send the rest of the run and its outcome to followers, then give up the claim."""
+        self.closing = True
+        try:
+            await self.task
+            await self._check_followed()
+            if self.followed:
+                await self._send(outcome)
+        finally:
+            await self.shared.unclaim(self.name, self.owner)
+
+
+async def _follow_remote(shared: SharedState, name: str, holder: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Follow the events of a run executing in another worker, from its first event.
+
+    Raises:
+        _RunLost: If the run ended without finishing
+        RuntimeError: If the run failed
+    """
+    events = f"{name}:{holder}"
+    await shared.set(f"{events}:followed", "1", SHARED_LEASE_TTL)
+    position = 0
+    lost = False
+    while True:
+        items = await shared.items(events, position)
+        for raw in items:
+            position += 1
+            event = json.loads(raw)
+            outcome = event.get("_outcome")
+            if outcome == "completed":
+                return
+            if outcome == "error":
+                raise RuntimeError(event["message"])
+            if outcome is not None:
+                raise _RunLost()
+            yield event
+        if not items:
+            if lost:
+                raise _RunLost()
+            # The outcome is sent before the claim is given up, so read once more before giving up
+            lost = await shared.holder(name) != holder
+            if not lost:
+                await asyncio.sleep(SHARED_POLL_INTERVAL)
+
+
+async def _claimed_run(
+    key: str,
+    start: Callable[[], AsyncIterator[Dict[str, Any]]],
+    on_followed: Callable[[], None]
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Execute `start()` in the worker that claims `key` first; the others follow its events.
+
+    Without shared state this is just `start()`. `on_followed` is called once
+    another worker follows the run executing here.
+    """
+    shared = get_shared_state()
+    if shared is None:
+        async for event in start():
+            yield event
+        return
+
+    name = "run:" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+    owner = uuid.uuid4().hex
+    while True:
+        holder = await shared.claim(name, owner, _CLAIM_TTL)
+        if holder == owner:
+            break
+        if holder is None:
+            continue
+
+        logger.info("Following the council run of another worker")
+        followed = False
+        try:
+            async for event in _follow_remote(shared, name, holder):
+                followed = True
+                yield event
+            return
+        except _RunLost:
+            if followed:
+                raise RuntimeError("The council run in another worker was interrupted")
+            # Nothing was sent yet, so this worker can run the question itself
+
+    publisher = _RunPublisher(shared, name, owner, on_followed)
+    outcome: Dict[str, Any] = {"_outcome": "cancelled"}
+    try:
+        async for event in start():
+            publisher.events.append(event)
+            yield event
+        outcome = {"_outcome": "completed"}
+    except Exception as e:
+        outcome = {"_outcome": "error", "message": str(e)}
+        raise
+    finally:
+        # Not awaited: the run may be finishing because it was cancelled
+        in_background(publisher.close(outcome))
+
+
+# Runs currently executing in this worker, by run_key
+_in_flight: Dict[str, InFlightRun] = {}
+
+
+def coalesced_stream(
+    key: str,
+    start: Callable[[], AsyncIterator[Dict[str, Any]]]
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Join the in-flight run for `key`, or start one with `start()` if there is none.
+
+    When workers share state, a run of the same question in another worker
+    is joined too: its events are followed instead of executing `start()`.
+
+    Args:
+        key: Coalescing key from run_key
+        start: Factory returning the event stream to execute
+
+    Returns:
+        Async iterator over the run's events, starting from its first event
+    """
+    run = _in_flight.get(key)
+    if run is None or not run.joinable:
+        def followed() -> None:
+            # A subscriber in another worker, whose leaving this worker can't see: run to the end
+            run.subscribers += 1
+
+        run = InFlightRun(_claimed_run(key, start, followed))
+        _in_flight[key] = run
+
+        def forget(_task: asyncio.Task, run: InFlightRun = run) -> None:
+            if _in_flight.get(key) is run:
+                del _in_flight[key]
+
+        run.task.add_done_callback(forget)
+    else:
+        logger.info("Joining in-flight council run (%s subscribers, %s events so far)", run.subscribers, len(run.events))
+
+    return run.subscribe()
+
+
+def is_in_flight(key: str) -> bool:
+    """
+    Check whether a run with this key is currently executing.
+
+    Args:
+        key: Coalescing key from run_key
+
+    Returns:
+        True if a new request with this key would join an existing run
+    """
+    run = _in_flight.get(key)
+    return run is not None and run.joinable
+
+
+def in_flight_count() -> int:
+    """
+    Return the number of council runs currently executing.
+
+    Returns:
+        Number of in-flight runs
+    """
+    return len(_in_flight)
@@ -0,0 +1,289 @@
+"""Server-Sent Events transport: fast framing, event ids, heartbeats, delta coalescing and slow-client handling."""
+
+import asyncio
+import json
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from .config import (
+    SSE_HEARTBEAT_INTERVAL,
+    SSE_FLUSH_INTERVAL,
+    SSE_CLIENT_BUFFER,
+    SSE_SLOW_CLIENT_POLICY,
+)
+from .metrics import SSE_DELTAS_COALESCED, SSE_SLOW_CLIENTS
+
+try:
+    import orjson
+except ImportError:
+    # Optional: the stdlib encoder produces the same frames, only slower
+    orjson = None
+
+# Comment line: ignored by EventSource and fetch-based readers, but keeps proxies from timing out
+HEARTBEAT = b": keep-alive\n\n"
+
+# An event with the id it is sent under (None = no id line)
+Item = Tuple[Optional[int], Dict[str, Any]]
+
+_active_streams = 0
+
+# Streams waiting to write buffered deltas, by (loop, flush interval); one shared timer
+# wakes them all, instead of a timer per stream and chunk
+_flush_waiters: Dict[Tuple[asyncio.AbstractEventLoop, float], List[asyncio.Future]] = {}
+
+
+def dumps(event: Dict[str, Any]) -> bytes:
+    """
+    Encode an event as compact UTF-8 JSON.
+
+    Args:
+        event: JSON-serializable event
+
+    Returns:
+        Encoded event
+    """
+    if orjson is not None:
+        return orjson.dumps(event, default=str)
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def frame(event: Dict[str, Any], event_id: Optional[int] = None) -> bytes:
+    """
+    Format one event as an SSE frame.
+
+    Args:
+        event: JSON-serializable event
+        event_id: Id for the 'id:' line (None = no id line)
+
+    Returns:
+        The frame, ending with the blank line that dispatches it
+    """
+    if event_id is None:
+        return b"data: " + dumps(event) + b"\n\n"
+    return b"id: %d\ndata: %s\n\n" % (event_id, dumps(event))
+
+
+def _at_next_flush(loop: asyncio.AbstractEventLoop, interval: float, future: asyncio.Future) -> None:
+    """Resolve `future` at the next shared flush tick (at most `interval` seconds away)."""
+    key = (loop, interval)
+    waiters = _flush_waiters.get(key)
+    if waiters is None:
+        waiters = _flush_waiters[key] = []
+        loop.call_later(interval, _flush, key)
+    waiters.append(future)
+
+
+def _flush(key: Tuple[asyncio.AbstractEventLoop, float]) -> None:
+    for future in _flush_waiters.pop(key, ()):
+        if not future.done():
+            future.set_result(None)
+
+
+def _is_delta(event: Dict[str, Any]) -> bool:
+    return event.get("type") == "delta"
+
+
+def _coalesce(items: Deque[Item]) -> List[Item]:
+    """Merge runs of consecutive deltas from the same answer into one delta (under the last id)."""
+    merged: List[Item] = []
+    parts: List[Item] = []
+    for item in items:
+        event = item[1]
+        if parts and _is_delta(event):
+            first = parts[0][1]
+            if (first["stage"], first["model"], first.get("call")) == (event["stage"], event["model"], event.get("call")):
+                parts.append(item)
+                continue
+        if parts:
+            merged.append(_merge(parts))
+            parts = []
+        if _is_delta(event):
+            parts.append(item)
+        else:
+            merged.append(item)
+    if parts:
+        merged.append(_merge(parts))
+    return merged
+
+
+def _merge(parts: List[Item]) -> Item:
+    if len(parts) == 1:
+        return parts[0]
+    SSE_DELTAS_COALESCED.inc(len(parts) - 1)
+    return parts[-1][0], {**parts[0][1], "delta": "".join(event["delta"] for _, event in parts)}
+
+
+async def sse_stream(
+    events: AsyncIterator[Item],
+    heartbeat: float = SSE_HEARTBEAT_INTERVAL,
+    flush_interval: float = SSE_FLUSH_INTERVAL,
+    buffer_size: int = SSE_CLIENT_BUFFER,
+    policy: str = SSE_SLOW_CLIENT_POLICY
+) -> AsyncIterator[bytes]:
+    """
+    Turn an event stream into SSE response chunks.
+
+    Events are read in a task of their own into a per-client buffer, so a
+    client that reads slowly never holds up the run it follows. Whatever has
+    accumulated is written as one chunk: consecutive token deltas of the same
+    answer are merged into one event, and a chunk ending in a delta waits up to
+    `flush_interval` for more. A heartbeat comment is sent after `heartbeat`
+    seconds without events, so proxies don't close the stream during long
+    stages.
+
+    When a client falls `buffer_size` events behind, "drop_deltas" drops its
+    buffered token deltas (the complete answers that follow carry the same
+    text, and the gap in the event ids shows the client what it missed), while
+    "disconnect" sends an error event and ends the stream.
+
+    Closing the generator stops reading `events` (and closes it).
+
+    Args:
+        events: (event id or None, event) pairs
+        heartbeat: Seconds of silence before a heartbeat (0 = no heartbeats)
+        flush_interval: Seconds to collect deltas before writing them (0 = write at once)
+        buffer_size: Events a client may fall behind before `policy` applies
+        policy: "drop_deltas" or "disconnect"
+
+    Yields:
+        Chunks of one or more SSE frames, or heartbeat comments
+    """
+    global _active_streams
+    loop = asyncio.get_running_loop()
+    buffered: Deque[Item] = deque()
+    finished = False
+    overflowed = False
+    # Whether the client is being written to, i.e. whether a full buffer means it is slow
+    writing = False
+    # The writer waits on `waiter`: a delta resolves it at the next flush tick, anything else at once
+    waiter: Optional[asyncio.Future] = None
+    flush_pending = False
+    drained: Optional[asyncio.Future] = None
+    # One timer per stream, rescheduled from the last write, instead of a timeout per wait
+    last_sent = loop.time()
+    heartbeat_due = False
+    timer: Optional[asyncio.TimerHandle] = None
+
+    def wake(delta: bool = False) -> None:
+        nonlocal flush_pending
+        if waiter is None or waiter.done():
+            return
+        if not delta or not flush_interval:
+            waiter.set_result(None)
+        elif not flush_pending:
+            flush_pending = True
+            _at_next_flush(loop, flush_interval, waiter)
+
+    def beat() -> None:
+        nonlocal heartbeat_due, timer
+        idle = loop.time() - last_sent
+        if idle >= heartbeat:
+            heartbeat_due = True
+            wake()
+            idle = 0.0
+        timer = loop.call_later(heartbeat - idle, beat)
+
+    async def read() -> None:
+        nonlocal finished, overflowed, drained
+        try:
+            async for item in events:
+                delta = item[1].get("type") == "delta"
+                if len(buffered) >= buffer_size and not writing:
+                    # A burst (e.g. a replay) filled the buffer before the writer had a turn
+                    drained = loop.create_future()
+                    await drained
+                    drained = None
+                if len(buffered) >= buffer_size:
+                    if policy == "disconnect":
+                        SSE_SLOW_CLIENTS.inc(action="disconnect")
+                        overflowed = True
+                        return
+                    kept = [queued for queued in buffered if queued[1].get("type") != "delta"]
+                    if len(kept) < len(buffered):
+                        SSE_SLOW_CLIENTS.inc(action="drop_deltas")
+                        buffered.clear()
+                        buffered.extend(kept)
+                    if delta:
+                        continue
+                buffered.append(item)
+                wake(delta)
+        finally:
+            finished = True
+            wake()
+            await events.aclose()
+
+    _active_streams += 1
+    reader = asyncio.create_task(read())
+    if heartbeat:
+        timer = loop.call_later(heartbeat, beat)
+    try:
+        while not overflowed:
+            # A chunk ending in a delta waits for the flush tick, so more deltas of the answer join it
+            if not finished and not heartbeat_due and (not buffered or buffered[-1][1].get("type") == "delta"):
+                waiter = loop.create_future()
+                flush_pending = False
+                if buffered:
+                    wake(True)
+                await waiter
+                waiter = None
+                if overflowed:
+                    break
+
+            if buffered:
+                heartbeat_due = False
+                items = _coalesce(buffered)
+                buffered.clear()
+                if drained is not None and not drained.done():
+                    drained.set_result(None)
+                writing = True
+                yield b"".join(frame(event, event_id) for event_id, event in items)
+                writing = False
+                last_sent = loop.time()
+            elif heartbeat_due:
+                heartbeat_due = False
+                last_sent = loop.time()
+                yield HEARTBEAT
+            elif finished:
+                break
+
+        if overflowed:
+            yield frame({"stage": "error", "status": "slow_client", "message": "Client is reading too slowly"})
+        # Errors of the event source surface here, after everything it produced was sent
+        await reader
+    finally:
+        _active_streams -= 1
+        if timer is not None:
+            timer.cancel()
+        if not reader.done():
+            reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+
+
+async def numbered(events: AsyncIterator[Dict[str, Any]], start: int = 1) -> AsyncIterator[Item]:
+    """
+    Number the events of a stream for their SSE 'id:' lines.
+
+    Args:
+        events: Events to number
+        start: Id of the first event
+
+    Yields:
+        (id, event) pairs; closing the generator closes `events`
+    """
+    event_id = start
+    try:
+        async for event in events:
+            yield event_id, event
+            event_id += 1
+    finally:
+        await events.aclose()
+
+
+def sse_stats() -> Dict[str, Any]:
+    """
+    Return SSE transport statistics.
+
+    Returns:
+        Dict with the number of open streams and the encoder in use
+    """
+    return {"active_streams": _active_streams, "encoder": "orjson" if orjson is not None else "json"}
@@ -0,0 +1,205 @@
+"""Queue-backed logging, secret redaction and per-run JSONL traces."""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+from typing import Any, Optional, Tuple
+
+from .config import (
+    POLZAAI_API_KEY,
+    COUNCIL_WORKERS,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_QUEUE_SIZE,
+    TRACE_PATH,
+    TRACE_SAMPLE_RATE,
+    TRACE_MAX_BYTES,
+    TRACE_BACKUP_COUNT,
+)
+from .metrics import LOG_RECORDS_DROPPED
+
+# Logger whose records are trace dicts written to TRACE_PATH
+TRACE_LOGGER = "council.trace"
+
+# Run id of the request the current task serves, and whether the run is traced in full
+_run: ContextVar[Optional[Tuple[str, bool]]] = ContextVar("trace_run", default=None)
+
+_SECRET_PATTERNS = (
+    re.compile(r"(Bearer\s+)[A-Za-z0-9._~+/=-]+", re.IGNORECASE),
+    re.compile(r"""((?:api[_-]?key|authorization|token|secret)["']?\s*[:=]\s*["']?)[^"'\s,}]+""", re.IGNORECASE),
+)
+
+_trace_logger = logging.getLogger(TRACE_LOGGER)
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def redact(text: str) -> str:
+    """
+    Mask secrets in a log line: the PolzaAI API key, bearer tokens and key=value credentials.
+
+    Args:
+        text: Text to write to a log
+
+    Returns:
+        The text with secrets replaced by [REDACTED]
+    """
+    if POLZAAI_API_KEY:
+        text = text.replace(POLZAAI_API_KEY, "[REDACTED]")
+    for pattern in _SECRET_PATTERNS:
+        text = pattern.sub(r"\1[REDACTED]", text)
+    return text
+
+
+def bind_run(run_id: Optional[str] = None) -> str:
+    """
+    Assign a run id to the current task (inherited by the tasks it creates).
+
+    Whether the run is traced in full is derived from the id, so every
+    process and task handling the same run makes the same sampling decision.
+
+    Args:
+        run_id: Id to use (e.g. from the X-Run-ID request header); a new one if None
+
+    Returns:
+        The run id
+    """
+    run_id = run_id or uuid.uuid4().hex[:16]
+    sampled = zlib.crc32(run_id.encode("utf-8")) % 10000 < TRACE_SAMPLE_RATE * 10000
+    _run.set((run_id, sampled))
+    return run_id
+
+
+def current_run_id() -> Optional[str]:
+    """
+    Return the run id of the current task.
+
+    Returns:
+        Run id, or None outside a request
+    """
+    bound = _run.get()
+    return bound[0] if bound is not None else None
+
+
+def trace(event: str, **fields: Any) -> None:
+    """
+    Write one trace record for the current run.
+
+    Records of runs outside the sample are written only if their status is
+    "error" or "cancelled". Writing never blocks: the record is queued for the
+    logging thread, or dropped if the queue is full.
+
+    Args:
+        event: Event name, e.g. "stage.start", "stage.end", "upstream.request"
+        **fields: JSON-serializable event fields
+    """
+    bound = _run.get()
+    if bound is None:
+        run_id, sampled = None, random.random() < TRACE_SAMPLE_RATE
+    else:
+        run_id, sampled = bound
+    if not sampled and fields.get("status") not in ("error", "cancelled"):
+        return
+    _trace_logger.info({"ts": round(time.time(), 6), "run_id": run_id, "event": event, **fields})
+
+
+class _Formatter(logging.Formatter):
+    """Formats in the calling thread: trace dicts as JSON, log records as JSON or text, redacted."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if record.name == TRACE_LOGGER:
+            return redact(json.dumps(record.msg, ensure_ascii=False, default=str))
+
+        message = record.getMessage()
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+        run_id = getattr(record, "run_id", None)
+        if LOG_FORMAT == "json":
+            line = json.dumps({
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "logger": record.name,
+                "run_id": run_id,
+                "message": message,
+            }, ensure_ascii=False)
+        else:
+            line = "%s %s [%s] %s: %s" % (
+                self.formatTime(record), record.levelname, run_id or "-", record.name, message
+            )
+        return redact(line)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that tags records with the run id and drops them when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.run_id = current_run_id()
+        return super().prepare(record)
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(kind="trace" if record.name == TRACE_LOGGER else "log")
+
+
+def setup_logging() -> None:
+    """
+    Route the app's logs and traces through a bounded queue to a background thread.
+
+    Log records of the "services" and "main" loggers go to stdout, trace
+    records to the rotating TRACE_PATH file (one per worker process, suffixed
+    with its pid, when COUNCIL_WORKERS > 1). Only formatting happens in the
+    calling thread; the writes (and the supervisord log file behind stdout)
+    never block the event loop. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    records: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = _QueueHandler(records)
+    handler.setFormatter(_Formatter())
+
+    plain = logging.Formatter("%(message)s")
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(plain)
+    console.addFilter(lambda record: record.name != TRACE_LOGGER)
+    writers = [console]
+    if TRACE_PATH:
+        # Rotation isn't safe with several processes writing to one file
+        path = f"{TRACE_PATH}.{os.getpid()}" if COUNCIL_WORKERS > 1 else TRACE_PATH
+        trace_file = logging.handlers.RotatingFileHandler(
+            path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT, encoding="utf-8"
+        )
+        trace_file.setFormatter(plain)
+        trace_file.addFilter(lambda record: record.name == TRACE_LOGGER)
+        writers.append(trace_file)
+
+    for name in ("services", "main"):
+        logger = logging.getLogger(name)
+        logger.setLevel(LOG_LEVEL)
+        logger.addHandler(handler)
+        logger.propagate = False
+    _trace_logger.setLevel(logging.INFO if TRACE_PATH else logging.CRITICAL + 1)
+    _trace_logger.addHandler(handler)
+    _trace_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, *writers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Write out the queued records and stop the logging thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
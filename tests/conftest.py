@@ -0,0 +1,34 @@
+"""Shared setup for the unit tests: import the services from the repository root without network access."""
+
+import os
+import sys
+
+import pytest
+
+# Settings are read at import time; keep the tests off the upstream API, the trace file and shared state
+os.environ.setdefault("POLZAAI_API_KEY", "test")
+os.environ.setdefault("TRACE_PATH", "")
+os.environ.setdefault("SHARED_STATE_BACKEND", "none")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Clock:
+    """Stand-in for the time module whose time() only moves when told to."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall clock of the caches, shared state and conversation store, advanced by setting clock.now."""
+    from services import cache, conversations, shared
+
+    clock = Clock()
+    for module in (cache, conversations, shared):
+        monkeypatch.setattr(module, "time", clock)
+    return clock
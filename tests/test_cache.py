@@ -0,0 +1,83 @@
+import asyncio
+
+from services.cache import MemoryCache, SQLiteCache, normalize_query, stage_key
+
+
+def test_normalize_query_folds_case_width_and_whitespace():
+    assert normalize_query("  Столица\tФРАНЦИИ？ ") == normalize_query("столица франции?")
+
+
+def test_stage_key_depends_on_query_templates_and_upstream():
+    key = stage_key("stage2", "What is 2+2?", ["template"], [{"model": "a", "response": "4"}])
+
+    assert key == stage_key("stage2", "what is  2+2?", ["template"], [{"model": "a", "response": "4"}])
+    assert key != stage_key("stage3", "What is 2+2?", ["template"], [{"model": "a", "response": "4"}])
+    assert key != stage_key("stage2", "What is 2+2?", ["other template"], [{"model": "a", "response": "4"}])
+    assert key != stage_key("stage2", "What is 2+2?", ["template"], [{"model": "a", "response": "5"}])
+
+
+def test_memory_cache_evicts_least_recently_used(clock):
+    async def scenario():
+        store = MemoryCache(max_entries=2, ttl=60)
+        await store.set("a", 1)
+        await store.set("b", 2)
+        assert await store.get("a") == 1
+        await store.set("c", 3)
+        return store, [await store.get(key) for key in ("a", "b", "c")]
+
+    store, values = asyncio.run(scenario())
+    assert values == [1, None, 3]
+    assert store.stats()["evictions"] == 1
+    assert store.size() == 2
+
+
+def test_memory_cache_expires_entries(clock):
+    async def scenario():
+        store = MemoryCache(max_entries=10, ttl=60)
+        await store.set("a", {"x": 1})
+        clock.now += 30
+        fresh = await store.get("a")
+        clock.now += 31
+        return store, fresh, await store.get("a")
+
+    store, fresh, expired = asyncio.run(scenario())
+    assert fresh == {"x": 1}
+    assert expired is None
+    assert store.size() == 0
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_sqlite_cache_evicts_least_recently_used_and_survives_reopen(clock, tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def scenario():
+        store = SQLiteCache(path, max_entries=2, ttl=60)
+        await store.set("a", [1, "один"])
+        clock.now += 1
+        await store.set("b", 2)
+        clock.now += 1
+        assert await store.get("a") == [1, "один"]
+        clock.now += 1
+        await store.set("c", 3)
+        return store, [await store.get(key) for key in ("a", "b", "c")]
+
+    store, values = asyncio.run(scenario())
+    assert values == [[1, "один"], None, 3]
+    assert store.size() == 2
+
+    reopened = SQLiteCache(path, max_entries=2, ttl=60)
+    assert reopened.size() == 2
+    assert asyncio.run(reopened.get("c")) == 3
+
+
+def test_sqlite_cache_expires_entries(clock, tmp_path):
+    async def scenario():
+        store = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=10, ttl=60)
+        await store.set("a", 1)
+        clock.now += 61
+        return store, await store.get("a")
+
+    store, value = asyncio.run(scenario())
+    assert value is None
+    assert store.size() == 0
+    assert store.evictions == 1
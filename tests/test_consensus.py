@@ -0,0 +1,64 @@
+import pytest
+
+from services import consensus
+from services.consensus import check_consensus, similarity_matrix
+
+PARIS = "Столица Франции — Париж, крупнейший город страны."
+PARIS_AGAIN = "Столица Франции — Париж. Это крупнейший город страны."
+BERLIN = "Берлин — столица Германии и её крупнейший город."
+
+
+def _answers(*texts):
+    return [{"model": f"model-{i}", "response": text} for i, text in enumerate(texts)]
+
+
+def test_similarity_matrix_is_symmetric_with_unit_diagonal():
+    matrix = similarity_matrix([PARIS, PARIS_AGAIN, BERLIN])
+
+    for i in range(3):
+        assert matrix[i][i] == pytest.approx(1.0)
+        for j in range(3):
+            assert matrix[i][j] == pytest.approx(matrix[j][i])
+    assert matrix[0][1] > matrix[0][2]
+
+
+def test_python_fallback_gives_the_numpy_scores(monkeypatch):
+    pytest.importorskip("numpy")
+    texts = [PARIS, PARIS_AGAIN, BERLIN]
+    with_numpy = similarity_matrix(texts)
+
+    monkeypatch.setattr(consensus, "np", None)
+
+    assert similarity_matrix(texts) == [pytest.approx(row) for row in with_numpy]
+
+
+def test_check_consensus_agrees_on_near_identical_answers(monkeypatch):
+    monkeypatch.setattr(consensus, "CONSENSUS_THRESHOLD", 0.5)
+    monkeypatch.setattr(consensus, "CONSENSUS_ACTION", "skip")
+
+    decision = check_consensus(_answers(PARIS, PARIS_AGAIN, PARIS + " Да."))
+
+    assert decision["agreed"] is True
+    assert decision["action"] == "skip"
+    assert decision["score"] >= 0.5
+    # The first answer is the closest to both others
+    assert decision["representative"] == "model-0"
+
+
+def test_check_consensus_one_dissenting_answer_keeps_the_review(monkeypatch):
+    monkeypatch.setattr(consensus, "CONSENSUS_THRESHOLD", 0.5)
+    monkeypatch.setattr(consensus, "CONSENSUS_ACTION", "skip")
+
+    decision = check_consensus(_answers(PARIS, PARIS_AGAIN, BERLIN))
+
+    assert decision["agreed"] is False
+    assert decision["action"] == "none"
+    assert decision["score"] < 0.5
+    assert decision["score"] < decision["mean"]
+
+
+def test_check_consensus_needs_two_answers():
+    decision = check_consensus(_answers(PARIS))
+
+    assert decision["agreed"] is False
+    assert decision["score"] is None
@@ -0,0 +1,74 @@
+import asyncio
+
+from services.conversations import ConversationStore
+
+
+def _pages(store, limit):
+    """All conversation ids, walking the list page by page as the /conversations endpoint does."""
+    async def walk():
+        ids, cursor = [], None
+        while True:
+            page = await store.list(limit, cursor)
+            ids += [conversation["id"] for conversation in page]
+            if len(page) < limit:
+                return ids
+            cursor = (page[-1]["updated_at"], page[-1]["id"])
+
+    return asyncio.run(walk())
+
+
+def test_pagination_keeps_conversations_updated_at_the_same_time(tmp_path, clock):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite3"))
+    created = [asyncio.run(store.create())["id"] for _ in range(7)]
+
+    ids = _pages(store, 2)
+
+    assert sorted(ids) == sorted(created)
+    assert len(ids) == len(set(ids))
+
+
+def test_list_orders_by_last_update(tmp_path, clock):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite3"))
+
+    async def scenario():
+        first = await store.create()
+        clock.now += 1
+        second = await store.create()
+        clock.now += 1
+        turn = await store.append_turn(first["id"], "Вопрос?", {"stage3": {"response": "Ответ."}})
+        return first["id"], second["id"], turn, await store.list(10)
+
+    first, second, turn, listed = asyncio.run(scenario())
+    assert turn == 1
+    assert [conversation["id"] for conversation in listed] == [first, second]
+    assert listed[0]["turn_count"] == 1
+    assert _pages(store, 1) == [first, second]
+
+
+def test_cursor_without_id_lists_strictly_older_conversations(tmp_path, clock):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite3"))
+
+    async def scenario():
+        old = await store.create()
+        clock.now += 1
+        await store.create()
+        return old["id"], await store.list(10, (clock.now, ""))
+
+    old, listed = asyncio.run(scenario())
+    assert [conversation["id"] for conversation in listed] == [old]
+
+
+def test_turns_are_numbered_and_kept_in_order(tmp_path, clock):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite3"))
+
+    async def scenario():
+        conversation = await store.create()
+        for number in range(1, 3):
+            await store.append_turn(conversation["id"], f"Вопрос {number}", {"stage3": {"response": f"Ответ {number}"}})
+        missing = await store.append_turn("missing", "Вопрос", {})
+        return await store.get(conversation["id"]), missing
+
+    conversation, missing = asyncio.run(scenario())
+    assert missing is None
+    assert conversation["turn_count"] == 2
+    assert [turn["query"] for turn in conversation["turns"]] == ["Вопрос 1", "Вопрос 2"]
@@ -0,0 +1,60 @@
+from services.prompts import (
+    EXCERPT_MARKER,
+    estimate_tokens,
+    excerpt,
+    fit_to_budget,
+    new_prompt_report,
+    record_prompt,
+)
+
+LONG_TEXT = " ".join(f"word{i}" for i in range(400))
+
+
+def test_excerpt_keeps_text_that_fits():
+    assert excerpt("short answer", 100) == "short answer"
+
+
+def test_excerpt_strategies_keep_the_right_end():
+    head = excerpt(LONG_TEXT, 50, "head")
+    tail = excerpt(LONG_TEXT, 50, "tail")
+    both = excerpt(LONG_TEXT, 50, "head_tail")
+
+    assert head.startswith("word0 ") and head.endswith(EXCERPT_MARKER)
+    assert tail.startswith(EXCERPT_MARKER) and tail.endswith("word399")
+    assert both.startswith("word0 ") and both.endswith("word399") and EXCERPT_MARKER in both
+    for text in (head, tail, both):
+        assert estimate_tokens(text) <= 50 + 1
+
+
+def test_excerpt_cuts_at_word_boundaries():
+    head = excerpt(LONG_TEXT, 50, "head")[:-len(EXCERPT_MARKER)]
+    assert head.split(" ")[-1] in LONG_TEXT.split(" ")
+
+
+def test_fit_to_budget_shortens_only_the_longest_texts():
+    items = [("short", "head_tail"), (LONG_TEXT, "head_tail"), ("also short", "head_tail")]
+
+    texts, truncated = fit_to_budget(items, 400)
+
+    assert truncated == [1]
+    assert texts[0] == "short" and texts[2] == "also short"
+    assert EXCERPT_MARKER in texts[1]
+    assert sum(estimate_tokens(text) for text in texts) <= 400 + 1
+
+
+def test_fit_to_budget_without_budget_keeps_everything():
+    items = [(LONG_TEXT, "head_tail")] * 3
+    assert fit_to_budget(items, 0) == ([LONG_TEXT] * 3, [])
+
+
+def test_record_prompt_sums_prompts_of_a_stage():
+    report = new_prompt_report()
+
+    record_prompt("stage2", "a" * 400, 1000, 2, 1)
+    record_prompt("stage2", "a" * 800, 1000, 2, 0)
+    record_prompt("stage3", "a" * 40, 0, 5, 0)
+
+    assert report["stage2"] == {
+        "budget": 1000, "prompts": 2, "estimated_tokens": 200, "items": 4, "truncated": 1
+    }
+    assert report["stage3"]["prompts"] == 1
@@ -0,0 +1,62 @@
+from services.council import calculate_aggregate_rankings, parse_ranking_from_text
+
+
+def test_parse_numbered_ranking_after_header():
+    text = (
+        "Response A is thorough, Response B misses the point.\n\n"
+        "FINAL RANKING:\n1. Response C\n2. Response A\n3. Response B"
+    )
+    assert parse_ranking_from_text(text) == ["Response C", "Response A", "Response B"]
+
+
+def test_parse_russian_ranking_with_cyrillic_letters():
+    text = "Оценка ответов...\n\nФИНАЛЬНЫЙ РЕЙТИНГ:\n1. Ответ В\n2. Ответ А\n3. Ответ С"
+    assert parse_ranking_from_text(text) == ["Response B", "Response A", "Response C"]
+
+
+def test_parse_uses_last_header_and_drops_duplicates():
+    text = (
+        "FINAL RANKING: draft\n1. Response A\n\n"
+        "FINAL RANKING:\n1. Response B\n2. Response A\n3. Response B"
+    )
+    assert parse_ranking_from_text(text) == ["Response B", "Response A"]
+
+
+def test_parse_falls_back_to_mentions_without_numbers():
+    assert parse_ranking_from_text("FINAL RANKING: Response B, then Response A") == [
+        "Response B", "Response A"
+    ]
+
+
+def test_parse_ignores_lowercase_prose():
+    assert parse_ranking_from_text("Это хороший ответ в том смысле, что он полный.") == []
+
+
+def test_aggregate_rankings_orders_by_average_rank():
+    label_to_model = {"Response A": "alpha", "Response B": "beta", "Response C": "gamma"}
+    stage2_results = [
+        {"model": "alpha", "ranking": "FINAL RANKING:\n1. Response B\n2. Response A\n3. Response C"},
+        {"model": "beta", "ranking": "FINAL RANKING:\n1. Response B\n2. Response C\n3. Response A"},
+        {"model": "gamma", "ranking": "", "parsed_ranking": ["Response A", "Response B", "Response C"]},
+    ]
+
+    aggregate = calculate_aggregate_rankings(stage2_results, label_to_model)
+
+    assert [entry["model"] for entry in aggregate] == ["beta", "alpha", "gamma"]
+    beta, alpha, gamma = aggregate
+    assert beta["average_rank"] == 1.33
+    assert beta["rankings_count"] == 3
+    assert beta["borda_score"] == 5
+    assert beta["copeland_score"] == 2
+    assert beta["pairwise_wins"] == {"alpha": 2, "gamma": 3}
+    assert gamma["copeland_score"] == 0
+
+
+def test_aggregate_rankings_skips_unknown_labels_and_unranked_models():
+    label_to_model = {"Response A": "alpha", "Response B": "beta"}
+    stage2_results = [{"model": "alpha", "ranking": "FINAL RANKING:\n1. Response Z\n2. Response A"}]
+
+    aggregate = calculate_aggregate_rankings(stage2_results, label_to_model)
+
+    assert [entry["model"] for entry in aggregate] == ["alpha"]
+    assert aggregate[0]["average_rank"] == 1
@@ -0,0 +1,28 @@
+import pytest
+
+from services.review import tournament_pairs
+
+
+@pytest.mark.parametrize("count", [2, 3, 5, 8])
+def test_tournament_pairs_are_unique_and_ordered(count):
+    pairs = tournament_pairs(count, rounds=2)
+
+    assert len(pairs) == len(set(pairs))
+    assert all(0 <= a < b < count for a, b in pairs)
+
+
+def test_tournament_round_gives_every_answer_two_comparisons():
+    pairs = tournament_pairs(6, rounds=1)
+
+    assert len(pairs) == 6
+    for answer in range(6):
+        assert sum(answer in pair for pair in pairs) == 2
+
+
+def test_tournament_with_enough_rounds_plays_every_pair_once():
+    assert sorted(tournament_pairs(5, rounds=10)) == [(a, b) for a in range(5) for b in range(a + 1, 5)]
+
+
+def test_tournament_needs_two_answers():
+    assert tournament_pairs(1) == []
+    assert tournament_pairs(0) == []
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from services.shared import SQLiteSharedState
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SQLiteSharedState(str(tmp_path / "shared.sqlite3"))
+
+
+def test_admit_limits_concurrent_leases(shared, clock):
+    async def scenario():
+        first, _ = await shared.admit("model", 2, 0, 0, 60)
+        second, _ = await shared.admit("model", 2, 0, 0, 60)
+        refused, wait = await shared.admit("model", 2, 0, 0, 60)
+        await shared.release("model", first)
+        again, _ = await shared.admit("model", 2, 0, 0, 60)
+        return first, second, refused, wait, again
+
+    first, second, refused, wait, again = asyncio.run(scenario())
+    assert first and second and first != second
+    assert refused is None and wait > 0
+    assert again is not None
+
+
+def test_admit_expires_leases_that_were_not_released(shared, clock):
+    async def scenario():
+        await shared.admit("model", 1, 0, 0, 60)
+        refused, _ = await shared.admit("model", 1, 0, 0, 60)
+        clock.now += 61
+        admitted, _ = await shared.admit("model", 1, 0, 0, 60)
+        return refused, admitted
+
+    refused, admitted = asyncio.run(scenario())
+    assert refused is None
+    assert admitted is not None
+
+
+def test_admit_rate_limit_is_a_sliding_window(shared, clock):
+    async def scenario():
+        # Two admissions per second: a burst of 2 within any one-second window
+        leases = [(await shared.admit("model", 0, 2, 2, 60))[0] for _ in range(3)]
+        _, wait = await shared.admit("model", 0, 2, 2, 60)
+        clock.now += 1.01
+        admitted, _ = await shared.admit("model", 0, 2, 2, 60)
+        return leases, wait, admitted
+
+    leases, wait, admitted = asyncio.run(scenario())
+    assert leases[0] and leases[1] and leases[2] is None
+    assert wait == pytest.approx(1.0)
+    assert admitted is not None
+
+
+def test_block_refuses_admissions_until_it_ends(shared, clock):
+    async def scenario():
+        await shared.block("model", 5)
+        blocked = await shared.admit("model", 0, 0, 0, 60)
+        clock.now += 5.5
+        admitted, _ = await shared.admit("model", 0, 0, 0, 60)
+        return blocked, admitted
+
+    (lease, wait), admitted = asyncio.run(scenario())
+    assert lease is None and wait == pytest.approx(5)
+    assert admitted is not None
+
+
+def test_claim_is_held_by_the_first_owner_until_it_expires(shared, clock):
+    async def scenario():
+        first = await shared.claim("run", "a", 10)
+        contested = await shared.claim("run", "b", 10)
+        clock.now += 5
+        renewed = await shared.claim("run", "a", 10)
+        clock.now += 9
+        still_held = await shared.holder("run")
+        clock.now += 2
+        expired = await shared.holder("run")
+        taken_over = await shared.claim("run", "b", 10)
+        return first, contested, renewed, still_held, expired, taken_over
+
+    assert asyncio.run(scenario()) == ("a", "a", "a", "a", None, "b")
+
+
+def test_unclaim_only_drops_the_owners_claim(shared, clock):
+    async def scenario():
+        await shared.claim("run", "a", 10)
+        clock.now += 11
+        await shared.claim("run", "b", 10)
+        # The expired owner finishing late must not release the new owner's claim
+        await shared.unclaim("run", "a")
+        kept = await shared.holder("run")
+        await shared.unclaim("run", "b")
+        return kept, await shared.holder("run")
+
+    assert asyncio.run(scenario()) == ("b", None)
+
+
+def test_values_and_lists_expire(shared, clock):
+    async def scenario():
+        await shared.set("key", "value", 10)
+        await shared.append("events", ["1", "2"], 10)
+        await shared.append("events", ["3"], 10)
+        fresh = (await shared.get("key"), await shared.items("events"), await shared.items("events", 2))
+        clock.now += 11
+        return fresh, (await shared.get("key"), await shared.items("events"))
+
+    fresh, expired = asyncio.run(scenario())
+    assert fresh == ("value", ["1", "2", "3"], ["3"])
+    assert expired == (None, [])
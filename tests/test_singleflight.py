@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from services import singleflight
+from services.singleflight import InFlightRun, coalesced_stream, is_in_flight, run_key
+
+
+@pytest.fixture(autouse=True)
+def single_worker(monkeypatch):
+    # Coalesce within this process only
+    monkeypatch.setattr(singleflight, "get_shared_state", lambda: None)
+
+
+class Source:
+    """Council event stream whose events are released one at a time by the test."""
+
+    def __init__(self, count: int) -> None:
+        self.count = count
+        self.starts = 0
+        self.cancelled = False
+        self.step = asyncio.Semaphore(0)
+
+    async def events(self):
+        self.starts += 1
+        try:
+            for index in range(self.count):
+                await self.step.acquire()
+                yield {"stage": "stage1", "index": index}
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+    def release(self, count: int = 1) -> None:
+        for _ in range(count):
+            self.step.release()
+
+
+async def _collect(events):
+    return [event["index"] async for event in events]
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_run_key_normalizes_the_query():
+    assert run_key("What is  2+2?", ["stage1"]) == run_key("what is 2+2?", ["stage1"])
+    assert run_key("What is 2+2?", ["stage1"]) != run_key("What is 2+2?", [])
+
+
+def test_late_subscriber_replays_earlier_events():
+    async def scenario():
+        source = Source(3)
+        run = InFlightRun(source.events())
+        first = asyncio.create_task(_collect(run.subscribe()))
+        source.release()
+        await _settle()
+        second = asyncio.create_task(_collect(run.subscribe()))
+        source.release(2)
+        return await first, await second, source.starts
+
+    assert asyncio.run(scenario()) == ([0, 1, 2], [0, 1, 2], 1)
+
+
+def test_failure_reaches_every_subscriber():
+    async def failing():
+        yield {"stage": "stage1", "index": 0}
+        raise ValueError("upstream failed")
+
+    async def scenario():
+        run = InFlightRun(failing())
+        results = await asyncio.gather(
+            _collect(run.subscribe()), _collect(run.subscribe()), return_exceptions=True
+        )
+        return [str(result) for result in results]
+
+    assert asyncio.run(scenario()) == ["upstream failed", "upstream failed"]
+
+
+def test_run_is_cancelled_only_when_its_last_subscriber_leaves():
+    async def scenario():
+        source = Source(3)
+        run = InFlightRun(source.events())
+        first, second = run.subscribe(), run.subscribe()
+        source.release()
+        assert (await first.__anext__())["index"] == 0
+        assert (await second.__anext__())["index"] == 0
+
+        await first.aclose()
+        await _settle()
+        still_running = not source.cancelled and run.joinable
+
+        await second.aclose()
+        closing = run.joinable
+        await asyncio.gather(run.task, return_exceptions=True)
+        return still_running, closing, source.cancelled, run.done, type(run.error)
+
+    assert asyncio.run(scenario()) == (True, False, True, True, RuntimeError)
+
+
+def test_identical_requests_share_one_run():
+    async def scenario():
+        source = Source(2)
+        key = run_key("What is 2+2?")
+        first = asyncio.create_task(_collect(coalesced_stream(key, source.events)))
+        await _settle()
+        joined = is_in_flight(key)
+        second = asyncio.create_task(_collect(coalesced_stream(key, source.events)))
+        source.release(2)
+        results = (await first, await second)
+        await _settle()
+        return joined, results, source.starts, is_in_flight(key)
+
+    assert asyncio.run(scenario()) == (True, ([0, 1], [0, 1]), 1, False)
+
+
+def test_request_arriving_while_a_run_is_cancelled_starts_a_new_run():
+    async def scenario():
+        source = Source(2)
+        key = run_key("What is 2+2?")
+        leaving = coalesced_stream(key, source.events)
+        source.release()
+        assert (await leaving.__anext__())["index"] == 0
+
+        # The run is being cancelled but hasn't finished unwinding yet
+        await leaving.aclose()
+        assert not is_in_flight(key)
+        arriving = asyncio.create_task(_collect(coalesced_stream(key, source.events)))
+        source.release(2)
+        return await arriving, source.starts
+
+    assert asyncio.run(scenario()) == ([0, 1], 2)